@@ -0,0 +1,289 @@
+"""Benchmark suite for netcapanalysis.
+
+Each benchmark runs in a fresh interpreter so peak RSS is measured per
+benchmark. Results are written as JSON and can be compared against a
+stored baseline to flag regressions.
+
+    python benchmarks/bench.py run -n 100000 --files 4 -o results.json
+    python benchmarks/bench.py compare baseline.json results.json
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from synth import DEFAULT_MIX, generate
+
+BENCHMARKS = [
+    "analyze_pcap",
+    "analyze_multi_capture",
+    "generate_report",
+    "generate_timeline_report",
+    "length_chart",
+    "port_chart",
+    "chattiness_chart",
+    "cli_startup",
+]
+
+
+def _peak_rss_mb():
+    # ru_maxrss is KiB on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _run_one(name, pcaps, repeat):
+    """Run a single benchmark in this process and return its timings"""
+    from netcapanalysis.analyzer import analyze_pcap
+    from netcapanalysis.charts import (
+        generate_chattiness_chart,
+        generate_length_chart,
+        generate_port_chart,
+    )
+    from netcapanalysis.multianalyze import analyze_multi_capture
+    from netcapanalysis.report import generate_report, generate_timeline_report
+
+    workdir = Path(tempfile.mkdtemp(prefix="netcap_bench_"))
+    first = pcaps[0]
+
+    if name == "analyze_pcap":
+        inputs = [first]
+        target = lambda: analyze_pcap(first)
+    elif name == "analyze_multi_capture":
+        inputs = pcaps
+        target = lambda: analyze_multi_capture(pcaps)
+    elif name in ("generate_report", "length_chart", "port_chart"):
+        inputs = [first]
+        stats = analyze_pcap(first)
+        if name == "generate_report":
+            target = lambda: generate_report(
+                stats, first, str(workdir / "report.md"), generate_png=False
+            )
+        elif name == "length_chart":
+            target = lambda: generate_length_chart(stats, str(workdir / "length.png"))
+        else:
+            target = lambda: generate_port_chart(stats, str(workdir / "port.png"))
+    elif name in ("generate_timeline_report", "chattiness_chart"):
+        inputs = pcaps
+        timeline, _ = analyze_multi_capture(pcaps)
+        if name == "generate_timeline_report":
+            target = lambda: generate_timeline_report(
+                timeline, pcaps, str(workdir / "timeline.md"), generate_png=False
+            )
+        else:
+            target = lambda: generate_chattiness_chart(
+                timeline, str(workdir / "chattiness.png")
+            )
+    else:
+        raise ValueError(f"Unknown benchmark: {name}")
+
+    wall = []
+    cpu = []
+    for _ in range(repeat):
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        target()
+        wall.append(time.perf_counter() - start_wall)
+        cpu.append(time.process_time() - start_cpu)
+
+    return {
+        "wall_s": min(wall),
+        "cpu_s": min(cpu),
+        "inputs": [str(p) for p in inputs],
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def _cli_startup(repeat):
+    wall = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-m", "netcapanalysis.cli", "--help"],
+            check=True,
+            capture_output=True,
+        )
+        wall.append(time.perf_counter() - start)
+
+    return {"wall_s": min(wall), "cpu_s": None, "inputs": [], "peak_rss_mb": None}
+
+
+def _count_packets(pcaps):
+    # Raw records, never dissected, so scapy parsing is not charged to the
+    # harness; the package's reader handles pcapng, either byte order and
+    # compressed captures.
+    from netcapanalysis.pcapng import PcapngReader, open_records
+
+    total = 0
+    for pcap in pcaps:
+        with open_records(pcap) as reader:
+            records = reader.records() if isinstance(reader, PcapngReader) else reader
+            total += sum(1 for _ in records)
+    return total
+
+
+def run(args):
+    if args.inputs:
+        pcaps = [str(p) for p in args.inputs]
+    else:
+        data_dir = Path(args.data_dir or tempfile.mkdtemp(prefix="netcap_synth_"))
+        pcaps = [
+            str(p)
+            for p in generate(
+                data_dir, args.packets, args.flows, args.mix, args.files, args.seed
+            )
+        ]
+
+    names = args.bench or BENCHMARKS
+    packet_counts = {p: _count_packets([p]) for p in pcaps}
+    results = {
+        "meta": {
+            "python": sys.version.split()[0],
+            "platform": sys.platform,
+            "packets": sum(packet_counts.values()),
+            "files": len(pcaps),
+            "flows": args.flows,
+            "mix": args.mix,
+            "seed": args.seed,
+        },
+        "benchmarks": {},
+    }
+
+    for name in names:
+        if name == "cli_startup":
+            result = _cli_startup(args.repeat)
+        else:
+            proc = subprocess.run(
+                [
+                    sys.executable,
+                    __file__,
+                    "_one",
+                    name,
+                    "--repeat",
+                    str(args.repeat),
+                    *pcaps,
+                ],
+                check=True,
+                capture_output=True,
+                text=True,
+            )
+            result = json.loads(proc.stdout.strip().splitlines()[-1])
+
+        inputs = result.pop("inputs")
+        if inputs:
+            packets = sum(packet_counts[p] for p in inputs)
+            size = sum(os.path.getsize(p) for p in inputs)
+            result["packets_per_s"] = packets / result["wall_s"]
+            result["mb_per_s"] = size / (1024 * 1024) / result["wall_s"]
+
+        results["benchmarks"][name] = result
+        print(_format_result(name, result))
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+        print(f"Results saved: {args.output}")
+
+    if args.baseline:
+        return _report_regressions(
+            json.loads(Path(args.baseline).read_text()), results, args.threshold
+        )
+    return 0
+
+
+def _format_result(name, result):
+    line = f"{name:<26} {result['wall_s'] * 1000:>10.1f} ms"
+    if "packets_per_s" in result:
+        line += (
+            f" {result['packets_per_s']:>12,.0f} pkt/s {result['mb_per_s']:>8.1f} MB/s"
+        )
+    if result.get("peak_rss_mb"):
+        line += f" {result['peak_rss_mb']:>8.1f} MB RSS"
+    return line
+
+
+def _report_regressions(baseline, current, threshold):
+    """Print a comparison table and return 1 if anything regressed"""
+    regressed = False
+    print()
+    print(
+        f"{'benchmark':<26} {'metric':<12} {'baseline':>12} {'current':>12} {'change':>8}"
+    )
+
+    for name, result in current["benchmarks"].items():
+        base = baseline.get("benchmarks", {}).get(name)
+        if not base:
+            continue
+
+        for metric in ("wall_s", "peak_rss_mb"):
+            old = base.get(metric)
+            new = result.get(metric)
+            if not old or not new:
+                continue
+            change = (new - old) / old
+            flag = ""
+            if change > threshold:
+                flag = "  REGRESSION"
+                regressed = True
+            print(
+                f"{name:<26} {metric:<12} {old:>12.3f} {new:>12.3f} {change:>+7.1%}{flag}"
+            )
+
+    return 1 if regressed else 0
+
+
+def compare(args):
+    baseline = json.loads(Path(args.baseline).read_text())
+    current = json.loads(Path(args.current).read_text())
+    return _report_regressions(baseline, current, args.threshold)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="netcapanalysis benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_p = sub.add_parser("run", help="Run benchmarks")
+    run_p.add_argument("-n", "--packets", type=int, default=10000)
+    run_p.add_argument("--flows", type=int, default=500)
+    run_p.add_argument("--mix", default=DEFAULT_MIX)
+    run_p.add_argument("--files", type=int, default=1)
+    run_p.add_argument("--seed", type=int, default=1)
+    run_p.add_argument("--data-dir", help="Where to write synthetic pcaps")
+    run_p.add_argument(
+        "-i", "--inputs", nargs="+", help="Benchmark these pcaps instead"
+    )
+    run_p.add_argument("-b", "--bench", action="append", choices=BENCHMARKS)
+    run_p.add_argument("-r", "--repeat", type=int, default=3)
+    run_p.add_argument("-o", "--output", help="Write results JSON here")
+    run_p.add_argument("--baseline", help="Compare against this results JSON")
+    run_p.add_argument("--threshold", type=float, default=0.10)
+
+    cmp_p = sub.add_parser("compare", help="Compare two results files")
+    cmp_p.add_argument("baseline")
+    cmp_p.add_argument("current")
+    cmp_p.add_argument("--threshold", type=float, default=0.10)
+
+    one_p = sub.add_parser("_one")
+    one_p.add_argument("name")
+    one_p.add_argument("pcaps", nargs="+")
+    one_p.add_argument("--repeat", type=int, default=3)
+
+    args = parser.parse_args()
+
+    if args.command == "_one":
+        print(json.dumps(_run_one(args.name, args.pcaps, args.repeat)))
+        return 0
+    if args.command == "compare":
+        return compare(args)
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
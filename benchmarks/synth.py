@@ -0,0 +1,160 @@
+"""Deterministic synthetic pcap generator for benchmarks.
+
+Packets are written as raw pcap records (Ethernet/IPv4/TCP|UDP|ICMP) with
+``struct`` rather than scapy, so 10M packet captures take seconds to build.
+The same arguments and seed always produce byte-identical files.
+"""
+
+import argparse
+import random
+import struct
+from pathlib import Path
+
+PCAP_GLOBAL_HEADER = struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1)
+ETH_HEADER = b"\x00\x11\x22\x33\x44\x55\x66\x77\x88\x99\xaa\xbb\x08\x00"
+
+PROTO_NUMBERS = {"tcp": 6, "udp": 17, "icmp": 1}
+
+SERVER_PORTS = [22, 53, 80, 443, 3306, 5432, 6379, 8080, 8443, 27017]
+
+DEFAULT_MIX = "tcp=0.7,udp=0.25,icmp=0.05"
+
+
+def parse_mix(mix):
+    """Parse 'tcp=0.7,udp=0.25,icmp=0.05' into normalized weights"""
+    weights = {}
+    for part in mix.split(","):
+        name, _, value = part.partition("=")
+        name = name.strip().lower()
+        if name not in PROTO_NUMBERS:
+            raise ValueError(f"Unknown protocol in mix: {name}")
+        weights[name] = float(value)
+
+    total = sum(weights.values())
+    if total <= 0:
+        raise ValueError("Protocol mix weights must be positive")
+    return {name: w / total for name, w in weights.items()}
+
+
+def _make_flows(rng, flow_count, weights):
+    protos = list(weights)
+    cum = list(weights.values())
+    flows = []
+    for _ in range(flow_count):
+        proto = rng.choices(protos, cum)[0]
+        client = bytes(
+            [10, rng.randrange(256), rng.randrange(256), rng.randrange(1, 255)]
+        )
+        server = bytes([192, 168, rng.randrange(256), rng.randrange(1, 255)])
+        sport = rng.randrange(1024, 65535)
+        dport = rng.choice(SERVER_PORTS) if proto != "icmp" else 0
+        flows.append((proto, client, server, sport, dport))
+    return flows
+
+
+def _ip_checksum(header):
+    total = sum(struct.unpack("!10H", header))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def _build_frame(flow, reverse, payload_len, ip_id):
+    proto, client, server, sport, dport = flow
+    src, dst = (server, client) if reverse else (client, server)
+    sp, dp = (dport, sport) if reverse else (sport, dport)
+
+    if proto == "tcp":
+        l4 = struct.pack("!HHIIBBHHH", sp, dp, ip_id, 0, 0x50, 0x18, 65535, 0, 0)
+    elif proto == "udp":
+        l4 = struct.pack("!HHHH", sp, dp, 8 + payload_len, 0)
+    else:
+        l4 = struct.pack("!BBHHH", 0 if reverse else 8, 0, 0, ip_id & 0xFFFF, 0)
+
+    total_len = 20 + len(l4) + payload_len
+    ip = struct.pack(
+        "!BBHHHBBH4s4s",
+        0x45,
+        0,
+        total_len,
+        ip_id & 0xFFFF,
+        0,
+        64,
+        PROTO_NUMBERS[proto],
+        0,
+        src,
+        dst,
+    )
+    ip = ip[:10] + struct.pack("!H", _ip_checksum(ip)) + ip[12:]
+    return ETH_HEADER + ip + l4 + b"\x00" * payload_len
+
+
+def generate(
+    output_dir,
+    packets=10000,
+    flows=500,
+    mix=DEFAULT_MIX,
+    files=1,
+    seed=1,
+    prefix="synthetic",
+):
+    """Write ``files`` pcaps holding ``packets`` packets in total
+
+    Returns the list of written paths. Packets are split into consecutive
+    time ranges so the files form a timeline in order.
+    """
+    rng = random.Random(seed)
+    weights = parse_mix(mix)
+    flow_table = _make_flows(rng, max(1, flows), weights)
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    per_file = packets // files
+    paths = []
+    ts = 1_700_000_000.0
+    written = 0
+
+    for file_idx in range(files):
+        path = output_dir / f"{prefix}_{file_idx:03d}.pcap"
+        count = per_file if file_idx < files - 1 else packets - written
+        with open(path, "wb") as fh:
+            fh.write(PCAP_GLOBAL_HEADER)
+            for _ in range(count):
+                # Skewed flow popularity: a few flows carry most packets.
+                flow = flow_table[int(len(flow_table) * rng.random() ** 3)]
+                reverse = rng.random() < 0.45
+                payload_len = rng.choice((0, 0, 32, 64, 200, 512, 1200, 1400))
+                frame = _build_frame(flow, reverse, payload_len, written)
+                ts += rng.random() * 0.002
+                sec = int(ts)
+                usec = int((ts - sec) * 1_000_000)
+                fh.write(struct.pack("<IIII", sec, usec, len(frame), len(frame)))
+                fh.write(frame)
+                written += 1
+        paths.append(path)
+
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-o", "--output", required=True, help="Output directory")
+    parser.add_argument("-n", "--packets", type=int, default=10000)
+    parser.add_argument("--flows", type=int, default=500)
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--files", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--prefix", default="synthetic")
+    args = parser.parse_args()
+
+    for path in generate(
+        args.output,
+        args.packets,
+        args.flows,
+        args.mix,
+        args.files,
+        args.seed,
+        args.prefix,
+    ):
+        print(path)
@@ -1,106 +1,326 @@
 import sys
+from array import array
 from collections import defaultdict
 from pathlib import Path
 
-from scapy.all import rdpcap, IP, TCP, UDP, ICMP
-
-
-PORT_SERVICES = {
-    20: "FTP-DATA",
-    21: "FTP",
-    22: "SSH",
-    23: "TELNET",
-    25: "SMTP",
-    53: "DNS",
-    67: "DHCP",
-    68: "DHCP",
-    80: "HTTP",
-    110: "POP3",
-    143: "IMAP",
-    443: "HTTPS",
-    465: "SMTPS",
-    587: "SMTP",
-    993: "IMAPS",
-    995: "POP3S",
-    3306: "MySQL",
-    5432: "PostgreSQL",
-    6379: "Redis",
-    8080: "HTTP-ALT",
-    8443: "HTTPS-ALT",
-    27017: "MongoDB",
-}
-
-
-def get_service_name(port):
-    return PORT_SERVICES.get(port, "Unknown")
-
-
-def analyze_pcap(pcap_file):
-    """Analyze pcap file and return statistics"""
-    stats = {
+from .classify import AppClassifier, merge_app_flow
+from .flows import FlowTable
+from .pcapng import open_packets
+from .pipeline import PORT_SERVICES, Aggregator, Analyzer, get_service_name
+from .profiling import stage
+from .rollups import Rollups
+from .spill import SpillDir, SpillTable, SpilledMapping, budget_entries, external_sort
+
+
+def _new_conversation():
+    return {"packets": 0, "bytes": 0, "protocols": set()}
+
+
+def _merge_conversation(a, b):
+    a["packets"] += b["packets"]
+    a["bytes"] += b["bytes"]
+    a["protocols"] |= b["protocols"]
+    a["last_time"] = b["last_time"]
+    return a
+
+
+def conversation_table(max_entries, spill_dir):
+    """A SpillTable for a ConversationAggregator's conversations"""
+    return SpillTable(max_entries, _merge_conversation, spill_dir)
+
+
+def new_stats():
+    """Return an empty statistics dict for extract_packets()"""
+    return {
         "total_packets": 0,
         "total_bytes": 0,
+        "first_time": None,
+        "last_time": None,
         "protocols": defaultdict(int),
         "lengths": [],
         "port_stats": defaultdict(lambda: {"count": 0, "protocol": None}),
-        "conversations": defaultdict(
-            lambda: {"packets": 0, "bytes": 0, "protocols": set()}
-        ),
+        "conversations": defaultdict(_new_conversation),
+        "throughput": Rollups(),
+        "interfaces": defaultdict(lambda: {"packets": 0, "bytes": 0}),
+        "app_flows": {},
     }
 
-    try:
-        packets = rdpcap(str(pcap_file))
-    except Exception as e:
-        print(f"Error opening pcap file: {e}", file=sys.stderr)
-        sys.exit(1)
 
-    for packet in packets:
+class TotalsAggregator(Aggregator):
+    """Packet and byte totals, first/last time and per-interface counts
+
+    Like the other stats aggregators it keeps its state in the keys it owns
+    of a new_stats() dict, which stays the form that follow checkpoints and
+    distributed shards encode and merge.
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def update(self, info):
+        stats = self.stats
         stats["total_packets"] += 1
-        length = len(packet)
-        stats["total_bytes"] += length
-        stats["lengths"].append(length)
-
-        if IP in packet:
-            src_ip = packet[IP].src
-            dst_ip = packet[IP].dst
-
-            src_port = 0
-            dst_port = 0
-            protocol = "IP"
-
-            if TCP in packet:
-                src_port = packet[TCP].sport
-                dst_port = packet[TCP].dport
-                protocol = "TCP"
-            elif UDP in packet:
-                src_port = packet[UDP].sport
-                dst_port = packet[UDP].dport
-                protocol = "UDP"
-            elif ICMP in packet:
-                protocol = "ICMP"
-
-            stats["protocols"][protocol] += 1
-
-            if dst_port > 0:
-                stats["port_stats"][dst_port]["count"] += 1
-                stats["port_stats"][dst_port]["protocol"] = protocol
-
-            conv_key = f"{src_ip}:{src_port} <-> {dst_ip}:{dst_port}"
-            stats["conversations"][conv_key]["packets"] += 1
-            stats["conversations"][conv_key]["bytes"] += length
-            stats["conversations"][conv_key]["protocols"].add(protocol)
-            stats["conversations"][conv_key]["src"] = src_ip
-            stats["conversations"][conv_key]["dst"] = dst_ip
-            stats["conversations"][conv_key]["src_port"] = src_port
-            stats["conversations"][conv_key]["dst_port"] = dst_port
+        stats["total_bytes"] += info.length
+        if info.interface is not None:
+            interface = stats["interfaces"][info.interface]
+            interface["packets"] += 1
+            interface["bytes"] += info.length
+        if stats["first_time"] is None:
+            stats["first_time"] = info.time
+        stats["last_time"] = info.time
+
+    def merge(self, other):
+        stats, delta = self.stats, other.stats
+        stats["total_packets"] += delta["total_packets"]
+        stats["total_bytes"] += delta["total_bytes"]
+        if stats["first_time"] is None:
+            stats["first_time"] = delta["first_time"]
+        if delta["last_time"] is not None:
+            stats["last_time"] = delta["last_time"]
+        for name, data in delta["interfaces"].items():
+            current = stats["interfaces"].get(name)
+            if current is None:
+                stats["interfaces"][name] = dict(data)
+            else:
+                current["packets"] += data["packets"]
+                current["bytes"] += data["bytes"]
+
+    def finalize(self, result):
+        for key in ("total_packets", "total_bytes", "first_time", "last_time"):
+            result[key] = self.stats[key]
+        result["interfaces"] = dict(self.stats["interfaces"])
+
+
+class LengthAggregator(Aggregator):
+    """Every packet length, for the length distribution"""
+
+    def __init__(self, stats):
+        self.lengths = stats["lengths"]
+
+    def update(self, info):
+        self.lengths.append(info.length)
+
+    def merge(self, other):
+        self.lengths.extend(other.lengths)
+
+    def finalize(self, result):
+        result["lengths"] = self.lengths
+
+
+class ProtocolAggregator(Aggregator):
+    """Packets per protocol"""
+
+    def __init__(self, stats):
+        self.protocols = stats["protocols"]
+
+    def update(self, info):
+        self.protocols[info.protocol] += 1
+
+    def merge(self, other):
+        for protocol, count in other.protocols.items():
+            self.protocols[protocol] = self.protocols.get(protocol, 0) + count
+
+    def finalize(self, result):
+        result["protocols"] = dict(self.protocols)
+
+
+class ThroughputAggregator(Aggregator):
+    """Per-second rollups by protocol and source IP"""
+
+    def __init__(self, stats):
+        self.throughput = stats["throughput"]
+
+    def update(self, info):
+        self.throughput.add(info.time, info.length, info.protocol, info.src)
+
+    def merge(self, other):
+        self.throughput.merge(other.throughput)
+
+    def finalize(self, result):
+        result["throughput"] = self.throughput
+
+
+class PortAggregator(Aggregator):
+    """Packets per destination port, with the last protocol seen on it"""
+
+    def __init__(self, stats):
+        self.port_stats = stats["port_stats"]
+
+    def update(self, info):
+        if info.dst_port > 0:
+            entry = self.port_stats[info.dst_port]
+            entry["count"] += 1
+            entry["protocol"] = info.protocol
+
+    def merge(self, other):
+        for port, data in other.port_stats.items():
+            current = self.port_stats.get(port)
+            if current is None:
+                self.port_stats[port] = dict(data)
+            else:
+                current["count"] += data["count"]
+                current["protocol"] = data["protocol"]
+
+    def finalize(self, result):
+        result["port_stats"] = dict(self.port_stats)
+
+
+class ConversationAggregator(Aggregator):
+    """Conversations keyed by endpoints, in first-seen order
+
+    With a ``flow_table`` packets update bidirectional flows instead and the
+    result is its per-service rollup. With a ``spill_table`` conversations
+    spill to disk and the result is a SpilledMapping.
+    """
+
+    def __init__(self, stats, flow_table=None, spill_table=None):
+        self.stats = stats
+        self.conversations = stats["conversations"]
+        self.flow_table = flow_table
+        self.spill_table = spill_table
+
+    def update(self, info):
+        if info.src is None:
+            return
+        if self.flow_table is not None:
+            self.flow_table.update(
+                info.time,
+                info.protocol,
+                info.src,
+                info.src_port,
+                info.dst,
+                info.dst_port,
+                info.length,
+                info.tcp_flags,
+            )
+            return
+
+        conv_key = f"{info.src}:{info.src_port} <-> {info.dst}:{info.dst_port}"
+        spill_table = self.spill_table
+        if spill_table is not None:
+            conv = spill_table.live.get(conv_key)
+            if conv is None:
+                spill_table.check()
+                conv = spill_table.live[conv_key] = _new_conversation()
+                # First-seen position, to restore dict order on merge
+                conv["seq"] = self.stats["total_packets"]
         else:
-            stats["protocols"]["Non-IP"] = stats["protocols"].get("Non-IP", 0) + 1
+            conv = self.conversations[conv_key]
+        conv["packets"] += 1
+        conv["bytes"] += info.length
+        conv["protocols"].add(info.protocol)
+        conv["src"] = info.src
+        conv["dst"] = info.dst
+        conv["src_port"] = info.src_port
+        conv["dst_port"] = info.dst_port
+        conv.setdefault("first_time", info.time)
+        conv["last_time"] = info.time
+
+    def merge(self, other):
+        for key, conv in other.conversations.items():
+            current = self.conversations.get(key)
+            if current is None:
+                self.conversations[key] = conv
+            else:
+                _merge_conversation(current, conv)
+
+    def finalize(self, result):
+        if self.flow_table is not None:
+            self.flow_table.flush()
+            result["conversations"] = self.flow_table.conversations()
+            result["flows"] = dict(self.flow_table.counters)
+        elif self.spill_table is not None:
+            spill_dir = self.spill_table.spill_dir
+            ordered = external_sort(
+                self.spill_table.merged(),
+                key=lambda kv: kv[1]["seq"],
+                spill_dir=spill_dir,
+            )
+            result["conversations"] = SpilledMapping(ordered, spill_dir)
+        else:
+            result["conversations"] = dict(self.conversations)
+
+
+def stats_aggregators(
+    stats, flow_table=None, spill_table=None, app_table=None, classify=True
+):
+    """The aggregators that fill a new_stats() dict, in update order
+
+    With a ``spill_table`` for conversations, ``app_table`` is the
+    SpillTable the application classifier's per-flow entries spill to.
+    Without ``classify`` the classifier is left out, for packets that
+    carry no payload.
+    """
+    aggregators = [
+        TotalsAggregator(stats),
+        LengthAggregator(stats),
+        ProtocolAggregator(stats),
+        ThroughputAggregator(stats),
+        PortAggregator(stats),
+        ConversationAggregator(stats, flow_table, spill_table),
+    ]
+    if classify:
+        aggregators.append(
+            AppClassifier(stats, flow_table=flow_table, spill_table=app_table)
+        )
+    return aggregators
+
+
+def extract_packets(packets, stats, flow_table=None, spill_table=None, app_table=None):
+    """Fold packets into a new_stats() dict"""
+    aggregators = stats_aggregators(stats, flow_table, spill_table, app_table)
+    Analyzer(aggregators).feed(packets)
+
+
+def analyze_pcap(
+    pcap_file, flow_timeout=None, flow_spill=None, memory_budget=None, aggregators=()
+):
+    """Analyze pcap file and return statistics
+
+    Packets are streamed through the stats aggregators and any extra
+    ``aggregators``, which add their own results to the returned dict in
+    the same pass (e.g. a TimelineAggregator adds ``timeline``).
+
+    With ``flow_timeout`` (seconds) conversations are tracked as
+    bidirectional flows that expire when idle, and the conversation table
+    holds per-service rollups of the expired flows.
+
+    With ``memory_budget`` (MB) lengths are kept compactly and the
+    conversation table spills sorted runs to disk when it outgrows the
+    budget, as do the application classifier's per-flow entries. The
+    result is the same as without a budget, but ``conversations`` is a
+    read-only mapping backed by a temporary file.
+    """
+    flow_table = None
+    if flow_timeout is not None:
+        flow_table = FlowTable(idle_timeout=flow_timeout, spill_path=flow_spill)
+
+    spill_table = app_table = None
+    if memory_budget is not None:
+        # Conversations and classified flows share the budget
+        entries = budget_entries(memory_budget) // 2
+        spill_dir = SpillDir()
+        spill_table = conversation_table(entries, spill_dir)
+        app_table = SpillTable(entries, merge_app_flow, spill_dir)
+
+    stats = new_stats()
+    if spill_table is not None:
+        stats["lengths"] = array("I")
+    analyzer = Analyzer(stats_aggregators(stats, flow_table, spill_table, app_table))
+    for aggregator in aggregators:
+        analyzer.add(aggregator)
+
+    with stage("read"):
+        try:
+            packets = open_packets(pcap_file)
+        except Exception as e:
+            print(f"Error opening pcap file: {e}", file=sys.stderr)
+            sys.exit(1)
 
-    stats["protocols"] = dict(stats["protocols"])
-    stats["port_stats"] = dict(stats["port_stats"])
-    stats["conversations"] = dict(stats["conversations"])
+    with stage("extract", hot=True) as extract, packets:
+        extract.packets = analyzer.feed(packets, Path(pcap_file).name)
 
-    return stats
+    return analyzer.results()
 
 
 def get_length_distribution(stats):
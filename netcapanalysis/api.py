@@ -1,16 +1,189 @@
 import os
+import json
+import threading
+import time
 import uuid
 import shutil
 import subprocess
 from pathlib import Path
-from flask import Flask, request, jsonify, send_file, after_this_request
+from flask import Flask, Response, g, request, jsonify, send_file, after_this_request
 from flask_cors import CORS
 
+from . import metrics
+from .compressed import CAPTURE_NAMES
+from .flowstore import (
+    capture_id,
+    capture_summary,
+    page_conversations,
+    page_ports,
+    page_timeline_pairs,
+    query_flows,
+    timeline_id,
+    timeline_summary,
+)
+from .live import CaptureSession, EventStream
+from .rollups import rollup_path
+from .uploads import UploadStore
+
 app = Flask(__name__)
 CORS(app)
 
 UPLOAD_FOLDER = "/tmp/netcap_uploads"
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# 0 disables the quota or the TTL
+UPLOAD_QUOTA_MB = float(os.environ.get("NETCAP_UPLOAD_QUOTA_MB", 10240))
+UPLOAD_TTL_HOURS = float(os.environ.get("NETCAP_UPLOAD_TTL_HOURS", 168))
+_uploads = UploadStore(
+    UPLOAD_FOLDER,
+    quota=int(UPLOAD_QUOTA_MB * 1024 * 1024),
+    ttl=UPLOAD_TTL_HOURS * 3600,
+)
+CHART_TYPES = ("length", "port", "conversation", "throughput")
+
+FLOW_STORE = os.environ.get("NETCAP_FLOW_STORE", "/tmp/netcap_flows.db")
+
+MAX_PAGE_SIZE = 1000
+
+LIVE_PORT = int(os.environ.get("NETCAP_LIVE_PORT", 5001))
+MAX_LIVE_SESSIONS = int(os.environ.get("NETCAP_MAX_LIVE_SESSIONS", 4))
+# Seconds a finished session stays listed
+LIVE_SESSION_TTL = int(os.environ.get("NETCAP_LIVE_SESSION_TTL", 3600))
+_live_sessions = {}
+_live_lock = threading.Lock()
+_event_stream = EventStream(_live_sessions, "0.0.0.0", LIVE_PORT)
+
+MAX_ANALYSES = int(os.environ.get("NETCAP_MAX_ANALYSES", os.cpu_count() or 4))
+_analysis_slots = threading.BoundedSemaphore(MAX_ANALYSES)
+
+
+REQUEST_SECONDS = metrics.Histogram(
+    "netcap_http_request_duration_seconds",
+    "HTTP request latency by route",
+    labels=("route", "method", "status"),
+)
+ANALYSES_IN_FLIGHT = metrics.Gauge(
+    "netcap_analyses_in_flight", "Analysis subprocesses running", labels=("command",)
+)
+ANALYSES_QUEUED = metrics.Gauge(
+    "netcap_analyses_queued",
+    "Analyses waiting for a free slot (NETCAP_MAX_ANALYSES)",
+    labels=("command",),
+)
+SUBPROCESS_SECONDS = metrics.Histogram(
+    "netcap_subprocess_duration_seconds",
+    "Duration of netcapanalysis CLI subprocesses",
+    labels=("command", "result"),
+)
+BYTES_ANALYZED = metrics.Counter(
+    "netcap_analyzed_bytes_total", "Capture bytes analyzed", labels=("command",)
+)
+PACKETS_ANALYZED = metrics.Counter(
+    "netcap_analyzed_packets_total", "Packets analyzed", labels=("command",)
+)
+CACHE_HITS = metrics.Counter(
+    "netcap_cache_hits_total",
+    "Requests served from a cached artifact",
+    labels=("cache",),
+)
+CACHE_MISSES = metrics.Counter(
+    "netcap_cache_misses_total",
+    "Cache lookups that found no usable artifact",
+    labels=("cache",),
+)
+LIVE_SESSIONS = metrics.Gauge(
+    "netcap_live_sessions",
+    "Live capture sessions running",
+    callback=lambda: sum(
+        1 for session in list(_live_sessions.values()) if not session.finished.is_set()
+    ),
+)
+UPLOAD_FOLDER_BYTES = metrics.Gauge(
+    "netcap_upload_folder_bytes",
+    "Bytes of captures and derived artifacts in the upload store",
+    callback=_uploads.total_bytes,
+)
+
+
+def _profile_args():
+    """Return extra CLI args and the JSON path for a per-stage profile"""
+    profile_file = f"/tmp/netcap_profile_{uuid.uuid4()}.json"
+    return ["--profile-output", profile_file], profile_file
+
+
+def _read_profile(profile_file):
+    if not profile_file or not os.path.exists(profile_file):
+        return None
+    with open(profile_file, "r") as f:
+        profile = json.load(f)
+    os.remove(profile_file)
+    return profile
+
+
+def _run_cli(command, cmd, timeout, limited=True):
+    """Run a netcapanalysis subprocess, bounded by the analysis slots"""
+    if limited:
+        ANALYSES_QUEUED.inc(command=command)
+        _analysis_slots.acquire()
+        ANALYSES_QUEUED.dec(command=command)
+
+    ANALYSES_IN_FLIGHT.inc(command=command)
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+        outcome = "ok" if result.returncode == 0 else "failed"
+        return result
+    except subprocess.TimeoutExpired:
+        outcome = "timeout"
+        raise
+    finally:
+        SUBPROCESS_SECONDS.observe(
+            time.perf_counter() - start, command=command, result=outcome
+        )
+        ANALYSES_IN_FLIGHT.dec(command=command)
+        if limited:
+            _analysis_slots.release()
+
+
+def _record_analyzed(command, filepaths, profile):
+    BYTES_ANALYZED.inc(sum(os.path.getsize(fp) for fp in filepaths), command=command)
+    if profile:
+        packets = sum(
+            s["packets"] or 0
+            for s in profile["stages"]
+            if s["stage"].split(":")[0] == "extract"
+        )
+        PACKETS_ANALYZED.inc(packets, command=command)
+
+
+def _record_rollup(digest, filepath):
+    """Count the rollups the CLI saved next to a stored capture"""
+    path = rollup_path(filepath)
+    if digest and os.path.exists(path):
+        _uploads.add_artifact(digest, "rollup", path)
+
+
+@app.before_request
+def _start_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def _record_request(response):
+    start = g.get("request_start")
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - start,
+            route=route,
+            method=request.method,
+            status=response.status_code,
+        )
+    return response
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
 
 
 @app.route("/api/capture", methods=["POST"])
@@ -21,10 +194,12 @@ def capture():
     filter_expr = data.get("filter", "")
     duration = data.get("duration", 10)
 
-    filename = f"{uuid.uuid4()}.pcap"
-    filepath = os.path.join(UPLOAD_FOLDER, filename)
+    filename = f"capture_{time.strftime('%Y%m%d_%H%M%S')}.pcap"
+    filepath = str(_uploads.incoming / f"{uuid.uuid4()}.pcap")
 
+    profile_args, profile_file = _profile_args()
     cmd = ["netcapanalysis", "capture", "-o", filepath, "-d", str(duration)]
+    cmd.extend(profile_args)
 
     if interface:
         cmd.extend(["-i", interface])
@@ -35,23 +210,123 @@ def capture():
 
     try:
         timeout = duration + 10 if duration else 60
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+        result = _run_cli("capture", cmd, timeout, limited=False)
+
+        profile = _read_profile(profile_file)
 
         if result.returncode != 0:
             return jsonify({"error": result.stderr}), 400
 
-        return jsonify(
-            {
-                "filename": filename,
-                "filepath": filepath,
-                "message": "Capture completed",
-                "duration": duration,
-            }
-        )
+        entry = _uploads.add_file(filepath, filename)
+        response = {
+            "id": entry["id"],
+            "filename": filename,
+            "filepath": entry["filepath"],
+            "message": "Capture completed",
+            "duration": duration,
+        }
+        if data.get("profile"):
+            response["profile"] = profile
+        return jsonify(response)
     except subprocess.TimeoutExpired:
         return jsonify({"error": "Capture timed out"}), 408
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 413
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    finally:
+        if os.path.exists(filepath):
+            os.remove(filepath)
+
+
+def _store_live_capture(session):
+    entry = _uploads.add_file(session.output, session.name)
+    session.output = entry["filepath"]
+
+
+def _live_info(session):
+    return {
+        **session.info(),
+        "events_port": LIVE_PORT,
+        "events_path": f"/api/live/{session.id}/events",
+    }
+
+
+def _prune_live_sessions():
+    """Forget sessions that finished more than LIVE_SESSION_TTL seconds ago
+
+    Call with _live_lock held.
+    """
+    cutoff = time.time() - LIVE_SESSION_TTL
+    for session_id, session in list(_live_sessions.items()):
+        if session.finished.is_set() and session.stats.ended < cutoff:
+            del _live_sessions[session_id]
+
+
+@app.route("/api/live", methods=["POST"])
+def start_live_session():
+    data = request.json or {}
+    duration = data.get("duration", 3600)
+
+    with _live_lock:
+        _prune_live_sessions()
+        running = [s for s in _live_sessions.values() if not s.finished.is_set()]
+        if len(running) >= MAX_LIVE_SESSIONS:
+            return (
+                jsonify({"error": f"At most {MAX_LIVE_SESSIONS} live sessions"}),
+                429,
+            )
+
+        try:
+            _event_stream.start()
+        except OSError as e:
+            return jsonify({"error": f"Cannot serve live events: {e}"}), 500
+
+        session_id = str(uuid.uuid4())
+        filepath = str(_uploads.incoming / f"{session_id}.pcap")
+        cmd = ["netcapanalysis", "capture", "-o", filepath, "-d", str(duration)]
+        # -c 0 captures until the duration ends or the session is stopped
+        cmd.extend(["-c", str(data.get("count") or 0)])
+        if data.get("interface"):
+            cmd.extend(["-i", data["interface"]])
+        if data.get("filter"):
+            cmd.extend(["-f", data["filter"]])
+
+        session = CaptureSession(
+            session_id, cmd, filepath, on_finish=_store_live_capture
+        )
+        try:
+            session.start()
+        except OSError as e:
+            return jsonify({"error": str(e)}), 500
+        _live_sessions[session_id] = session
+
+    return jsonify(_live_info(session))
+
+
+@app.route("/api/live", methods=["GET"])
+def list_live_sessions():
+    with _live_lock:
+        _prune_live_sessions()
+        sessions = list(_live_sessions.values())
+    return jsonify({"sessions": [_live_info(s) for s in sessions]})
+
+
+@app.route("/api/live/<session_id>", methods=["GET"])
+def live_session(session_id):
+    session = _live_sessions.get(session_id)
+    if session is None:
+        return jsonify({"error": "Session not found"}), 404
+    return jsonify(_live_info(session))
+
+
+@app.route("/api/live/<session_id>/stop", methods=["POST"])
+def stop_live_session(session_id):
+    session = _live_sessions.get(session_id)
+    if session is None:
+        return jsonify({"error": "Session not found"}), 404
+    session.stop()
+    return jsonify(_live_info(session))
 
 
 @app.route("/api/upload", methods=["POST"])
@@ -63,15 +338,22 @@ def upload_pcap():
     if file.filename == "":
         return jsonify({"error": "No file selected"}), 400
 
-    if not file.filename.endswith((".pcap", ".pcapng", ".cap")):
+    if not file.filename.endswith(CAPTURE_NAMES):
         return jsonify({"error": "Invalid file type"}), 400
 
-    filename = f"{uuid.uuid4()}_{file.filename}"
-    filepath = os.path.join(UPLOAD_FOLDER, filename)
-    file.save(filepath)
+    try:
+        entry = _uploads.save_stream(file.stream, file.filename)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 413
 
     return jsonify(
-        {"filename": file.filename, "saved_as": filename, "filepath": filepath}
+        {
+            "id": entry["id"],
+            "filename": file.filename,
+            "saved_as": os.path.basename(entry["filepath"]),
+            "filepath": entry["filepath"],
+            "sha256": entry["sha256"],
+        }
     )
 
 
@@ -83,33 +365,70 @@ def analyze():
     if not filepath or not os.path.exists(filepath):
         return jsonify({"error": "File not found"}), 400
 
+    want_report = data.get("report", True)
+    digest = _uploads.lookup(filepath)
+    if digest and not data.get("profile"):
+        # Same content was analyzed before: the flow store and the cached
+        # report already hold the result.
+        cached = _uploads.find_artifact(digest, "report") if want_report else None
+        stored_id = capture_id(FLOW_STORE, filepath)
+        hit = stored_id is not None and (cached or not want_report)
+        if want_report:
+            (CACHE_HITS if hit else CACHE_MISSES).inc(cache="report")
+        if hit:
+            response = {"filepath": filepath, "capture_id": stored_id}
+            if cached:
+                with open(cached, "r") as f:
+                    response["report"] = f.read()
+            return jsonify(response)
+
     output_file = f"/tmp/netcap_{uuid.uuid4()}.md"
+    profile_args, profile_file = _profile_args()
 
     try:
-        result = subprocess.run(
-            [
-                "netcapanalysis",
+        with _uploads.pinned([digest]):
+            result = _run_cli(
                 "analyze",
-                "-i",
-                filepath,
-                "-o",
-                output_file,
-                "--no-png",
-            ],
-            capture_output=True,
-            text=True,
-            timeout=60,
-        )
-
-        if result.returncode != 0:
-            return jsonify({"error": result.stderr}), 400
-
-        with open(output_file, "r") as f:
-            report_content = f.read()
-
-        os.remove(output_file)
+                [
+                    "netcapanalysis",
+                    "analyze",
+                    "-i",
+                    filepath,
+                    "-o",
+                    output_file,
+                    "--no-png",
+                    "--store",
+                    FLOW_STORE,
+                    *profile_args,
+                ],
+                timeout=60,
+            )
 
-        return jsonify({"report": report_content, "filepath": filepath})
+            profile = _read_profile(profile_file)
+            if result.returncode != 0:
+                return jsonify({"error": result.stderr}), 400
+            _record_analyzed("analyze", [filepath], profile)
+
+            with open(output_file, "r") as f:
+                report_content = f.read()
+
+            if digest:
+                report_path = _uploads.artifact_path(digest, "report", ".md")
+                os.replace(output_file, report_path)
+                _uploads.add_artifact(digest, "report", report_path)
+                _record_rollup(digest, filepath)
+            else:
+                os.remove(output_file)
+
+        response = {
+            "filepath": filepath,
+            "capture_id": capture_id(FLOW_STORE, filepath),
+        }
+        if want_report:
+            response["report"] = report_content
+        if data.get("profile"):
+            response["profile"] = profile
+        return jsonify(response)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -129,25 +448,136 @@ def timeline():
     output_file = f"/tmp/netcap_{uuid.uuid4()}.md"
 
     try:
+        profile_args, profile_file = _profile_args()
         cmd = ["netcapanalysis", "timeline", "-o", output_file, "--no-png"]
+        cmd.extend(["--store", FLOW_STORE])
+        cmd.extend(profile_args)
         for fp in filepaths:
             cmd.extend(["-i", fp])
 
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
+        with _uploads.pinned([_uploads.lookup(fp) for fp in filepaths]):
+            result = _run_cli("timeline", cmd, timeout=120)
 
+        profile = _read_profile(profile_file)
         if result.returncode != 0:
             return jsonify({"error": result.stderr}), 400
+        _record_analyzed("timeline", filepaths, profile)
 
         with open(output_file, "r") as f:
             report_content = f.read()
 
         os.remove(output_file)
 
-        return jsonify({"report": report_content, "filepaths": filepaths})
+        response = {
+            "filepaths": filepaths,
+            "timeline_id": timeline_id(FLOW_STORE, filepaths),
+        }
+        if data.get("report", True):
+            response["report"] = report_content
+        if data.get("profile"):
+            response["profile"] = profile
+        return jsonify(response)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/api/query", methods=["GET"])
+def query():
+    args = request.args
+    if not os.path.exists(FLOW_STORE):
+        return jsonify({"results": []})
+
+    try:
+        results = query_flows(
+            FLOW_STORE,
+            ip=args.get("ip"),
+            port=args.get("port", type=int),
+            since=args.get("since"),
+            until=args.get("until"),
+            capture=args.get("capture"),
+            group_by="capture" if args.get("group_by") == "capture" else None,
+            limit=args.get("limit", 100, type=int),
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({"results": results})
+
+
+def _page_args():
+    args = request.args
+    limit = max(1, min(args.get("limit", 100, type=int), MAX_PAGE_SIZE))
+    return {
+        "order": "asc" if args.get("order") == "asc" else "desc",
+        "limit": limit,
+        "cursor": args.get("cursor"),
+    }
+
+
+@app.route("/api/captures/<int:capture>/summary", methods=["GET"])
+def capture_summary_endpoint(capture):
+    summary = capture_summary(FLOW_STORE, capture)
+    if summary is None:
+        return jsonify({"error": "Capture not found"}), 404
+    return jsonify(summary)
+
+
+@app.route("/api/captures/<int:capture>/conversations", methods=["GET"])
+def capture_conversations(capture):
+    args = request.args
+    try:
+        page = page_conversations(
+            FLOW_STORE,
+            capture,
+            sort=args.get("sort", "packets"),
+            ip=args.get("ip"),
+            port=args.get("port", type=int),
+            protocol=args.get("protocol"),
+            **_page_args(),
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(page)
+
+
+@app.route("/api/captures/<int:capture>/ports", methods=["GET"])
+def capture_ports(capture):
+    try:
+        page = page_ports(
+            FLOW_STORE, capture, sort=request.args.get("sort", "count"), **_page_args()
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(page)
+
+
+@app.route("/api/timelines/<int:timeline>/summary", methods=["GET"])
+def timeline_summary_endpoint(timeline):
+    summary = timeline_summary(FLOW_STORE, timeline)
+    if summary is None:
+        return jsonify({"error": "Timeline not found"}), 404
+    return jsonify(summary)
+
+
+@app.route("/api/timelines/<int:timeline>/pairs", methods=["GET"])
+def timeline_pairs(timeline):
+    args = request.args
+    page_args = _page_args()
+    if "order" not in args:
+        page_args["order"] = "asc"
+    try:
+        page = page_timeline_pairs(
+            FLOW_STORE,
+            timeline,
+            sort=args.get("sort", "first_time"),
+            ip=args.get("ip"),
+            **page_args,
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(page)
+
+
 @app.route("/api/chart", methods=["POST"])
 def chart():
     data = request.json
@@ -156,56 +586,66 @@ def chart():
 
     if not filepath or not os.path.exists(filepath):
         return jsonify({"error": "File not found"}), 400
-
-    filename = f"{uuid.uuid4()}.png"
-    output_path = os.path.join(UPLOAD_FOLDER, filename)
+    if chart_type not in CHART_TYPES:
+        return jsonify({"error": f"Unknown chart type: {chart_type}"}), 400
+
+    kind = f"chart-{chart_type}"
+    digest = _uploads.lookup(filepath)
+    if digest:
+        cached = _uploads.find_artifact(digest, kind)
+        if cached:
+            CACHE_HITS.inc(cache="chart")
+            return send_file(cached, mimetype="image/png")
+        CACHE_MISSES.inc(cache="chart")
+        output_path = str(_uploads.artifact_path(digest, kind, ".png"))
+    else:
+        output_path = f"/tmp/netcap_{uuid.uuid4()}.png"
+
+        @after_this_request
+        def _remove_chart(response):
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            return response
 
     try:
-        result = subprocess.run(
-            [
-                "netcapanalysis",
+        with _uploads.pinned([digest]):
+            result = _run_cli(
                 "chart",
-                "-i",
-                filepath,
-                "-o",
-                output_path,
-                "-t",
-                chart_type,
-            ],
-            capture_output=True,
-            text=True,
-            timeout=60,
-        )
+                [
+                    "netcapanalysis",
+                    "chart",
+                    "-i",
+                    filepath,
+                    "-o",
+                    output_path,
+                    "-t",
+                    chart_type,
+                ],
+                timeout=60,
+            )
 
-        if result.returncode != 0:
-            return jsonify({"error": result.stderr}), 400
+            if result.returncode != 0:
+                return jsonify({"error": result.stderr}), 400
 
-        return send_file(output_path, mimetype="image/png")
+            if digest:
+                _uploads.add_artifact(digest, kind, output_path)
+                _record_rollup(digest, filepath)
+            # Read before returning, so eviction cannot race the response.
+            with open(output_path, "rb") as f:
+                image = f.read()
+        return Response(image, mimetype="image/png")
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @app.route("/api/files", methods=["GET"])
 def list_files():
-    files = []
-    for f in os.listdir(UPLOAD_FOLDER):
-        if f.endswith((".pcap", ".pcapng", ".cap")):
-            filepath = os.path.join(UPLOAD_FOLDER, f)
-            files.append(
-                {
-                    "name": f,
-                    "size": os.path.getsize(filepath),
-                    "modified": os.path.getmtime(filepath),
-                }
-            )
-    return jsonify({"files": files})
+    return jsonify({"files": _uploads.list_files()})
 
 
-@app.route("/api/files/<path:filename>", methods=["DELETE"])
-def delete_file(filename):
-    filepath = os.path.join(UPLOAD_FOLDER, filename)
-    if os.path.exists(filepath):
-        os.remove(filepath)
+@app.route("/api/files/<file_id>", methods=["DELETE"])
+def delete_file(file_id):
+    if _uploads.delete_file(file_id):
         return jsonify({"message": "Deleted"})
     return jsonify({"error": "File not found"}), 404
 
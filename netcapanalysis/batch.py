@@ -0,0 +1,316 @@
+import glob
+import hashlib
+import json
+import os
+import sys
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+
+from .analyzer import analyze_pcap, get_service_name
+from .compressed import CAPTURE_NAMES
+from .profiling import Profiler, clear_profiler, current_profiler, stage
+from .report import generate_report
+
+MANIFEST_VERSION = 1
+
+
+def find_captures(target):
+    """Return the capture files in a directory, or matching a glob pattern"""
+    if os.path.isdir(target):
+        files = [
+            str(path)
+            for path in Path(target).iterdir()
+            if path.is_file() and path.name.endswith(CAPTURE_NAMES)
+        ]
+    else:
+        files = [
+            path for path in glob.glob(target, recursive=True) if os.path.isfile(path)
+        ]
+    return sorted(os.path.abspath(path) for path in files)
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(manifest_file):
+    path = Path(manifest_file)
+    if not path.exists():
+        return {"version": MANIFEST_VERSION, "files": {}}
+    try:
+        manifest = json.loads(path.read_text())
+    except ValueError as e:
+        print(f"Error reading manifest '{manifest_file}': {e}", file=sys.stderr)
+        sys.exit(1)
+    if manifest.get("version") != MANIFEST_VERSION:
+        print(
+            f"Error: unsupported manifest version in '{manifest_file}'",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+    return manifest
+
+
+def save_manifest(manifest_file, manifest):
+    path = Path(manifest_file)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(manifest, indent=2))
+    os.replace(tmp, path)
+
+
+def _summarize(stats):
+    """The per-capture numbers the rollup summary needs"""
+    return {
+        "total_packets": stats["total_packets"],
+        "total_bytes": stats["total_bytes"],
+        "first_time": stats["first_time"],
+        "last_time": stats["last_time"],
+        "conversations": len(stats["conversations"]),
+        "protocols": dict(stats["protocols"]),
+        "ports": {
+            str(port): data["count"] for port, data in stats["port_stats"].items()
+        },
+    }
+
+
+def _analyze_one(
+    path, size, mtime, known_hash, report_file, report_options, profile=False
+):
+    """Worker: hash a capture and analyze it unless its content is unchanged
+
+    Runs in a pool process, so library errors that exit are turned into an
+    error entry instead of taking the pool down. With ``profile`` (the
+    parent's dump directory, or True without one) the capture's stages are
+    timed on a Profiler of the worker's own, named ``<stage>:<report name>``,
+    and its summary() is returned under ``profile``.
+    """
+    if not profile:
+        return _analyze_capture(
+            path, size, mtime, known_hash, report_file, report_options
+        )
+    dump_dir = profile if profile is not True else None
+    with Profiler(dump_dir, f":{Path(report_file).stem}") as profiler:
+        result = _analyze_capture(
+            path, size, mtime, known_hash, report_file, report_options
+        )
+    result["profile"] = profiler.summary()
+    return result
+
+
+def _analyze_capture(path, size, mtime, known_hash, report_file, report_options):
+    """The work of _analyze_one(), returning its result entry"""
+    try:
+        digest = file_hash(path)
+        if digest == known_hash:
+            return {"path": path, "size": size, "mtime": mtime, "unchanged": True}
+        stats = analyze_pcap(path)
+        generate_report(stats, path, report_file, **report_options)
+    except SystemExit:
+        return {"path": path, "error": "analysis failed"}
+    except Exception as e:
+        return {"path": path, "error": str(e)}
+    return {
+        "path": path,
+        "size": size,
+        "mtime": mtime,
+        "sha256": digest,
+        "report": report_file,
+        "summary": _summarize(stats),
+    }
+
+
+def _report_names(files, base):
+    """Report file name per capture: its path below ``base``, / as _
+
+    Suffixes are kept, so a.pcap, a.pcap.gz and a.pcapng get their own
+    reports; names that still collide (a/b.pcap, a_b.pcap) get a short hash
+    of the path.
+    """
+    names = {}
+    for path in files:
+        names[path] = Path(os.path.relpath(path, base)).as_posix().replace("/", "_")
+    taken = defaultdict(int)
+    for name in names.values():
+        taken[name] += 1
+    for path, name in names.items():
+        if taken[name] > 1:
+            rel = Path(os.path.relpath(path, base)).as_posix()
+            name = f"{name}-{hashlib.sha256(rel.encode()).hexdigest()[:8]}"
+        names[path] = name + ".md"
+    return names
+
+
+def run_batch(
+    files,
+    output_dir,
+    manifest_file,
+    jobs=None,
+    force=False,
+    report_options=None,
+    progress=None,
+):
+    """Analyze captures in a process pool, skipping ones already in the manifest
+
+    A file whose size and mtime match its manifest entry is skipped without
+    being read; one whose size or mtime changed is hashed, and only analyzed
+    if its content changed too. Returns the updated manifest and counts of
+    analyzed, unchanged and failed files.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = load_manifest(manifest_file)
+    entries = manifest["files"]
+    base = os.path.commonpath([os.path.dirname(f) for f in files]) if files else ""
+
+    # Captures that are gone no longer count towards the rollup.
+    present = set(files)
+    for path in list(entries):
+        if path not in present:
+            del entries[path]
+
+    report_names = _report_names(files, base)
+    pending = []
+    for path in files:
+        st = os.stat(path)
+        entry = entries.get(path)
+        if (
+            not force
+            and entry is not None
+            and entry["size"] == st.st_size
+            and entry["mtime"] == st.st_mtime
+        ):
+            continue
+        known_hash = None if force or entry is None else entry["sha256"]
+        report_file = str(Path(output_dir) / report_names[path])
+        pending.append((path, st.st_size, st.st_mtime, known_hash, report_file))
+
+    counts = {"analyzed": 0, "unchanged": len(files) - len(pending), "failed": 0}
+    # Largest captures first, so one big file does not start last and leave
+    # the other workers idle.
+    pending.sort(key=lambda job: job[1], reverse=True)
+
+    # Workers profile their captures themselves and hand back the stages
+    profiler = current_profiler()
+    profile = profiler is not None and (profiler.dump_dir or True)
+    with stage("batch") as batch_stage:
+        batch_stage.packets = 0
+        try:
+            with ProcessPoolExecutor(
+                max_workers=jobs, initializer=clear_profiler
+            ) as pool:
+                futures = [
+                    pool.submit(_analyze_one, *job, report_options or {}, profile)
+                    for job in pending
+                ]
+                for future in as_completed(futures):
+                    result = future.result()
+                    if "profile" in result:
+                        profiler.merge(result.pop("profile"))
+                    path = result["path"]
+                    if "error" in result:
+                        counts["failed"] += 1
+                        entries.pop(path, None)
+                    elif result.get("unchanged"):
+                        counts["unchanged"] += 1
+                        entries[path]["size"] = result["size"]
+                        entries[path]["mtime"] = result["mtime"]
+                    else:
+                        counts["analyzed"] += 1
+                        entries[path] = {k: v for k, v in result.items() if k != "path"}
+                        batch_stage.packets += result["summary"]["total_packets"]
+                    if progress:
+                        progress(result)
+        finally:
+            # Keep what finished even if the run is interrupted.
+            save_manifest(manifest_file, manifest)
+
+    return manifest, counts
+
+
+def _format_time(ts):
+    if ts is None:
+        return "-"
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def write_summary(manifest, output_file):
+    """Write a markdown rollup across every capture in the manifest"""
+    entries = sorted(
+        manifest["files"].items(),
+        key=lambda item: (item[1]["summary"]["first_time"] or 0, item[0]),
+    )
+    total_packets = sum(e["summary"]["total_packets"] for _, e in entries)
+    total_bytes = sum(e["summary"]["total_bytes"] for _, e in entries)
+    firsts = [
+        e["summary"]["first_time"] for _, e in entries if e["summary"]["first_time"]
+    ]
+    lasts = [e["summary"]["last_time"] for _, e in entries if e["summary"]["last_time"]]
+
+    protocols = defaultdict(int)
+    ports = defaultdict(int)
+    for _, entry in entries:
+        for protocol, count in entry["summary"]["protocols"].items():
+            protocols[protocol] += count
+        for port, count in entry["summary"]["ports"].items():
+            ports[int(port)] += count
+
+    output_dir = Path(output_file).parent
+    with stage("report"), open(output_file, "w") as f:
+        f.write(f"""# Batch Analysis Summary
+
+## Summary Statistics
+
+| Metric | Value |
+|--------|-------|
+| Captures | {len(entries):,} |
+| Total Packets | {total_packets:,} |
+| Total Bytes | {total_bytes:,} |
+| First Packet | {_format_time(min(firsts) if firsts else None)} |
+| Last Packet | {_format_time(max(lasts) if lasts else None)} |
+
+---
+
+## Captures
+
+| Capture | Packets | Bytes | Conversations | First Packet | Last Packet |
+|---------|---------|-------|---------------|--------------|-------------|
+""")
+        for path, entry in entries:
+            s = entry["summary"]
+            report = os.path.relpath(entry["report"], output_dir)
+            f.write(
+                f"| [{Path(path).name}]({report}) | {s['total_packets']:,} "
+                f"| {s['total_bytes']:,} | {s['conversations']:,} "
+                f"| {_format_time(s['first_time'])} "
+                f"| {_format_time(s['last_time'])} |\n"
+            )
+
+        f.write("""
+---
+
+## Protocol Distribution
+
+| Protocol | Packet Count |
+|----------|---------------|
+""")
+        for protocol, count in sorted(
+            protocols.items(), key=lambda x: x[1], reverse=True
+        ):
+            f.write(f"| {protocol} | {count:,} |\n")
+
+        f.write("""
+---
+
+## Top Destination Ports
+
+| Port | Service | Count |
+|------|---------|-------|
+""")
+        top = sorted(ports.items(), key=lambda x: x[1], reverse=True)[:10]
+        for port, count in top:
+            f.write(f"| {port} | {get_service_name(port)} | {count:,} |\n")
@@ -3,10 +3,13 @@ import signal
 import subprocess
 import shutil
 import sys
+import threading
 import click
 from pathlib import Path
 
-from scapy.all import sniff, wrpcap
+from scapy.all import PcapWriter, sniff
+
+from .compressed import is_compressed_name, open_capture_output
 
 
 def capture_packets(interface, count, output, filter_expr, duration):
@@ -14,9 +17,12 @@ def capture_packets(interface, count, output, filter_expr, duration):
 
     duration = duration or 10
     tshark_path = shutil.which("tshark")
+    # Compressed output is written by us: tshark streams the pcap to stdout.
+    compressed = is_compressed_name(output)
 
     if tshark_path:
-        cmd = [tshark_path, "-w", output, "-F", "pcap", "-a", f"duration:{duration}"]
+        target = "-" if compressed else output
+        cmd = [tshark_path, "-w", target, "-F", "pcap", "-a", f"duration:{duration}"]
 
         if interface:
             cmd.extend(["-i", interface])
@@ -37,12 +43,28 @@ def capture_packets(interface, count, output, filter_expr, duration):
                 preexec_fn=os.setsid,
             )
 
+            copier = None
+            if compressed:
+                out = open_capture_output(output)
+                copier = threading.Thread(
+                    target=shutil.copyfileobj, args=(proc.stdout, out, 1 << 20)
+                )
+                copier.start()
+
             try:
                 proc.wait(timeout=duration + 5)
             except subprocess.TimeoutExpired:
                 os.killpg(os.getpgid(proc.pid), signal.SIGTERM)
                 proc.wait(timeout=2)
                 click.echo(f"Capture timed out after {duration}s", err=True)
+            except KeyboardInterrupt:
+                # Stopped early: let tshark finish writing the file
+                os.killpg(os.getpgid(proc.pid), signal.SIGINT)
+                proc.wait(timeout=5)
+            finally:
+                if copier is not None:
+                    copier.join()
+                    out.close()
 
             if proc.returncode == 0:
                 click.echo(f"Captured packets saved to: {output}")
@@ -87,12 +109,30 @@ def capture_packets(interface, count, output, filter_expr, duration):
         if filter_expr:
             kwargs["filter"] = filter_expr
 
-        packets = sniff(iface=iface, timeout=duration, **kwargs)
+        # Write each packet as it arrives so the file can be read while the
+        # capture is still running (live sessions tail it). A compressed
+        # stream cannot be tailed, so it is not flushed per packet.
+        captured = 0
+        if compressed:
+            writer = PcapWriter(open_capture_output(output))
+        else:
+            writer = PcapWriter(output, sync=True)
+
+        def write(packet):
+            nonlocal captured
+            writer.write(packet)
+            captured += 1
+
+        try:
+            sniff(iface=iface, timeout=duration, prn=write, store=False, **kwargs)
+        finally:
+            if not captured:
+                writer.write_header(None)
+            writer.close()
 
         signal.alarm(0)
 
-        wrpcap(output, packets)
-        click.echo(f"Captured {len(packets)} packets saved to: {output}")
+        click.echo(f"Captured {captured} packets saved to: {output}")
 
     except TimeoutError:
         click.echo(f"Capture timed out after {duration}s", err=True)
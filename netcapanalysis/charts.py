@@ -1,7 +1,11 @@
+import functools
+import heapq
+import ipaddress
 import subprocess
 import shutil
 import sys
 import tempfile
+from datetime import datetime
 from pathlib import Path
 
 import matplotlib.pyplot as plt
@@ -9,7 +13,16 @@ import matplotlib
 
 matplotlib.use("Agg")
 
-from .analyzer import get_length_distribution, get_top_ports, get_service_name
+from .analyzer import get_length_distribution, get_top_ports
+from .classify import port_applications, service_name
+from .profiling import stage
+from .rollups import choose_level, series_matrix
+
+# Timeline diagrams keep this many pairs and participants; the rest are
+# summed into one "Others" entry so mermaid-cli render time stays bounded
+DIAGRAM_MAX_PAIRS = 50
+DIAGRAM_MAX_PARTICIPANTS = 20
+DIAGRAM_OTHERS = "Others"
 
 
 def mermaid_to_png(mermaid_code, output_path):
@@ -17,33 +30,34 @@ def mermaid_to_png(mermaid_code, output_path):
     mmd_path = Path(output_path).with_suffix(".mmd")
     mmd_path.write_text(mermaid_code)
 
-    node_modules_mm = shutil.which("mmdc") or shutil.which("mermaid")
-
-    if not node_modules_mm:
-        try:
+    with stage(f"mermaid:{Path(output_path).name}"):
+        node_modules_mm = shutil.which("mmdc") or shutil.which("mermaid")
+
+        if not node_modules_mm:
+            try:
+                subprocess.run(
+                    [
+                        "npx",
+                        "-y",
+                        "@mermaid-js/mermaid-cli",
+                        "-i",
+                        str(mmd_path),
+                        "-o",
+                        str(output_path),
+                    ],
+                    check=True,
+                    capture_output=True,
+                    text=True,
+                )
+            except (subprocess.CalledProcessError, FileNotFoundError) as e:
+                print(f"Warning: Could not generate PNG: {e}", file=sys.stderr)
+                return False
+        else:
             subprocess.run(
-                [
-                    "npx",
-                    "-y",
-                    "@mermaid-js/mermaid-cli",
-                    "-i",
-                    str(mmd_path),
-                    "-o",
-                    str(output_path),
-                ],
+                [node_modules_mm, "-i", str(mmd_path), "-o", str(output_path)],
                 check=True,
                 capture_output=True,
-                text=True,
             )
-        except (subprocess.CalledProcessError, FileNotFoundError) as e:
-            print(f"Warning: Could not generate PNG: {e}", file=sys.stderr)
-            return False
-    else:
-        subprocess.run(
-            [node_modules_mm, "-i", str(mmd_path), "-o", str(output_path)],
-            check=True,
-            capture_output=True,
-        )
 
     return True
 
@@ -98,10 +112,11 @@ def generate_port_chart(stats, output):
     counts = []
     labels = []
 
+    port_apps = port_applications(stats)
     for port, data in top_ports:
         ports.append(port)
         counts.append(data["count"])
-        service = get_service_name(port)
+        service = service_name(port, port_apps)
         labels.append(f"{port}\n({service})")
 
     plt.figure(figsize=(12, 6))
@@ -135,9 +150,9 @@ def generate_conversation_diagram(stats, output):
     if not conversations:
         return "sequenceDiagram\n    note: No conversations found"
 
-    sorted_convs = sorted(
-        conversations.items(), key=lambda x: x[1]["packets"], reverse=True
-    )[:15]
+    sorted_convs = heapq.nlargest(
+        15, conversations.items(), key=lambda x: x[1]["packets"]
+    )
 
     lines = ["sequenceDiagram"]
 
@@ -192,30 +207,269 @@ def generate_port_mermaid(stats):
         return "pie title Port Distribution\n    No data: 0"
 
     lines = ["pie title Top Destination Ports"]
+    port_apps = port_applications(stats)
     for port, data in top_ports:
-        service = get_service_name(port)
+        service = service_name(port, port_apps)
         lines.append(f'    "Port {port} ({service})": {data["count"]}')
 
     return "\n".join(lines)
 
 
-def generate_timeline_chart(timeline, output):
-    """Generate timeline mermaid diagram for multi-capture analysis"""
-    lines = ["timeline"]
-    lines.append("    title Network Conversation Timeline")
-    lines.append("    section Past -> Present")
+def _throughput_series(pyramid, start, end, level, max_points):
+    """Pick a level and return bin times, series and their bytes/packets"""
+    if level is None:
+        level = choose_level(pyramid, start, end, max_points)
+    times, packets, nbytes = series_matrix(pyramid, level, start, end)
+    return level, times, packets, nbytes
+
+
+def generate_throughput_chart(
+    pyramid, output, start=None, end=None, level=None, max_points=2000
+):
+    """Generate bytes/s over time per protocol and per top talker
+
+    Rendered from the rollup pyramid at the finest level that fits
+    ``max_points`` bins, so the cost depends on the window, not the capture.
+    """
+    if pyramid["first"] is None:
+        print("No throughput data available")
+        return None
+
+    level, times, packets, nbytes = _throughput_series(
+        pyramid, start, end, level, max_points
+    )
+    if not len(times):
+        return None
+    x = [datetime.fromtimestamp(t) for t in times]
+    rates = nbytes / level
+    series = pyramid["series"]
+    protocols = [i for i, (kind, _) in enumerate(series) if kind == "protocol"]
+    talkers = [i for i, (kind, _) in enumerate(series) if kind == "talker"]
+
+    fig, axes = plt.subplots(2, 1, figsize=(12, 8), sharex=True)
+
+    axes[0].stackplot(
+        x, rates[protocols], labels=[series[i][1] for i in protocols], step="post"
+    )
+    axes[0].set_ylabel("Bytes/s")
+    axes[0].set_title(
+        f"Throughput by Protocol ({level}s bins)", fontsize=14, fontweight="bold"
+    )
+    axes[0].legend(loc="upper right", fontsize=8)
+
+    for i in talkers:
+        axes[1].step(x, rates[i], where="post", label=series[i][1], linewidth=1)
+    axes[1].set_ylabel("Bytes/s")
+    axes[1].set_title("Top Talkers (by source IP)", fontsize=12)
+    if talkers:
+        axes[1].legend(loc="upper right", fontsize=8)
+
+    fig.autofmt_xdate()
+    plt.tight_layout()
+    plt.savefig(output, dpi=150)
+    plt.close()
+    return level
+
+
+def generate_throughput_mermaid(pyramid, max_points=60):
+    """Generate a mermaid line chart of total bytes/s"""
+    if pyramid["first"] is None:
+        return "pie title Throughput\n    No data: 0"
 
+    level, times, packets, nbytes = _throughput_series(
+        pyramid, None, None, None, max_points
+    )
+    protocols = [
+        i for i, (kind, _) in enumerate(pyramid["series"]) if kind == "protocol"
+    ]
+    rates = nbytes[protocols].sum(axis=0) / level
+    labels = ", ".join(f'"{datetime.fromtimestamp(t):%H:%M:%S}"' for t in times)
+    values = ", ".join(f"{rate:.0f}" for rate in rates)
+
+    return "\n".join(
+        [
+            "xychart-beta",
+            f'    title "Throughput ({level}s bins)"',
+            f"    x-axis [{labels}]",
+            '    y-axis "Bytes/s"',
+            f"    line [{values}]",
+        ]
+    )
+
+
+def parse_group(spec):
+    """Parse a NAME=CIDR[,CIDR...] participant group"""
+    name, sep, cidrs = spec.partition("=")
+    if not sep or not name.strip() or not cidrs.strip():
+        raise ValueError(f"group must be NAME=CIDR[,CIDR...], got '{spec}'")
+    try:
+        networks = [
+            ipaddress.ip_network(c.strip(), strict=False) for c in cidrs.split(",")
+        ]
+    except ValueError as e:
+        raise ValueError(f"invalid group '{spec}': {e}") from None
+    return name.strip(), networks
+
+
+def participant_grouper(prefix=None, groups=()):
+    """Map an IP to its diagram participant
+
+    ``groups`` are (name, networks) pairs from parse_group(), checked first,
+    most specific network first. Other addresses collapse into their IPv4
+    /``prefix`` (IPv6: /64) when a prefix is given and stay as they are
+    otherwise.
+    """
+    networks = sorted(
+        ((network, name) for name, nets in groups for network in nets),
+        key=lambda x: x[0].prefixlen,
+        reverse=True,
+    )
+
+    @functools.lru_cache(maxsize=65536)
+    def group(ip):
+        if not networks and prefix is None:
+            return ip
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return ip
+        for network, name in networks:
+            if address in network:
+                return name
+        if prefix is None:
+            return ip
+        bits = prefix if address.version == 4 else 64
+        return str(ipaddress.ip_network(f"{ip}/{bits}", strict=False))
+
+    return group
+
+
+def diagram_edges(
+    timeline,
+    grouper=None,
+    max_pairs=DIAGRAM_MAX_PAIRS,
+    max_participants=DIAGRAM_MAX_PARTICIPANTS,
+):
+    """Fold timeline entries into at most ``max_pairs`` diagram edges
+
+    Entries are grouped by the participants ``grouper`` maps their src/dst
+    to, and the heaviest groups by bytes are kept while they fit within
+    ``max_participants``. Returns the kept edges in timeline order and an
+    edge totalling everything else (None if nothing was left out); edges
+    count the pairs folded in. The diagrams stay bounded in size, while the
+    report tables still list every pair.
+    """
+    grouper = grouper or (lambda ip: ip)
+    edges = {}
     for conv in timeline:
-        src = conv["src"]
-        dst = conv["dst"]
-        packets = conv["packet_count"]
-        turns = conv["turns"]
-        avg_size = conv["avg_packet_size"]
-        chattiness = conv["chattiness"]
+        key = (grouper(conv["src"]), grouper(conv["dst"]))
+        edge = edges.get(key)
+        if edge is None:
+            edge = edges[key] = {
+                "src": key[0],
+                "dst": key[1],
+                "order": len(edges),
+                "pairs": 0,
+                "packet_count": 0,
+                "total_bytes": 0,
+                "turns": 0,
+                "weighted_chattiness": 0.0,
+            }
+        _add_edge(edge, conv)
+
+    kept = []
+    participants = set()
+    others = None
+    for edge in sorted(edges.values(), key=lambda e: e["total_bytes"], reverse=True):
+        ends = {edge["src"], edge["dst"]}
+        if len(kept) < max_pairs and len(participants | ends) <= max_participants:
+            kept.append(edge)
+            participants |= ends
+            continue
+        if others is None:
+            others = {
+                "src": DIAGRAM_OTHERS,
+                "dst": DIAGRAM_OTHERS,
+                "pairs": 0,
+                "packet_count": 0,
+                "total_bytes": 0,
+                "turns": 0,
+                "weighted_chattiness": 0.0,
+            }
+        _add_edge(others, edge)
+
+    kept.sort(key=lambda e: e["order"])
+    for edge in kept + ([others] if others else []):
+        _finish_edge(edge)
+    return kept, others
+
+
+def _add_edge(edge, conv):
+    """Fold a timeline entry, or another edge, into ``edge``"""
+    edge["pairs"] += conv.get("pairs", 1)
+    edge["packet_count"] += conv["packet_count"]
+    edge["total_bytes"] += conv["total_bytes"]
+    edge["turns"] += conv["turns"]
+    edge["weighted_chattiness"] += conv.get(
+        "weighted_chattiness", conv.get("chattiness", 0) * conv["packet_count"]
+    )
 
-        label = f"{src} <-> {dst}"
-        event = f"{packets}pkts, {turns}turns, {avg_size:.0f}bytes avg, {chattiness:.1f}/turn"
 
+def _finish_edge(edge):
+    packets = edge["packet_count"]
+    edge["avg_packet_size"] = edge["total_bytes"] / packets if packets else 0
+    # Packet-weighted, so one busy pair outweighs many single-packet ones
+    edge["chattiness"] = edge["weighted_chattiness"] / packets if packets else 0
+
+
+def _participant_ids(edges):
+    """Mermaid participant ids, aliased when the label is not a plain name"""
+    labels = {label for edge in edges for label in (edge["src"], edge["dst"])}
+    ids = {}
+    aliases = 0
+    for label in sorted(labels):
+        if all(c.isalnum() or c in ".:-_" for c in label):
+            ids[label] = label
+            continue
+        aliases += 1
+        while f"p{aliases}" in labels:
+            aliases += 1
+        ids[label] = f"p{aliases}"
+    return ids
+
+
+def _edge_note(edge, sep=" "):
+    note = (
+        f"{edge['packet_count']}{sep}pkts, {edge['turns']}{sep}turns,"
+        f" {edge['avg_packet_size']:.0f}{sep}bytes avg"
+    )
+    if edge["pairs"] > 1:
+        return f"{edge['pairs']} pairs, {note}"
+    return note
+
+
+def generate_timeline_chart(
+    timeline,
+    output,
+    grouper=None,
+    max_pairs=DIAGRAM_MAX_PAIRS,
+    max_participants=DIAGRAM_MAX_PARTICIPANTS,
+):
+    """Generate timeline mermaid diagram for multi-capture analysis
+
+    Pairs are folded with diagram_edges(), so the diagram has at most
+    ``max_pairs`` events plus one for the rest.
+    """
+    edges, others = diagram_edges(timeline, grouper, max_pairs, max_participants)
+    lines = ["timeline"]
+    lines.append("    title Network Conversation Timeline")
+    lines.append("    section Past -> Present")
+
+    for edge in edges + ([others] if others else []):
+        label = f"{edge['src']} <-> {edge['dst']}"
+        if edge is others:
+            label = DIAGRAM_OTHERS
+        event = f"{_edge_note(edge, '')}, {edge['chattiness']:.1f}/turn"
         lines.append(f"        {label}: {event}")
 
     mermaid_code = "\n".join(lines)
@@ -229,30 +483,37 @@ def generate_timeline_chart(timeline, output):
     return mermaid_code
 
 
-def generate_timeline_sequence(timeline, output):
-    """Generate sequence diagram showing conversation flow"""
-    lines = ["sequenceDiagram"]
+def generate_timeline_sequence(
+    timeline,
+    output,
+    grouper=None,
+    max_pairs=DIAGRAM_MAX_PAIRS,
+    max_participants=DIAGRAM_MAX_PARTICIPANTS,
+):
+    """Generate sequence diagram showing conversation flow
 
-    participants = set()
-    for conv in timeline:
-        participants.add(conv["src"])
-        participants.add(conv["dst"])
+    Pairs are folded with diagram_edges(); pairs left out are summed in a
+    note over an "Others" participant.
+    """
+    edges, others = diagram_edges(timeline, grouper, max_pairs, max_participants)
+    lines = ["sequenceDiagram"]
 
-    for p in sorted(participants):
-        lines.append(f"    participant {p}")
+    ids = _participant_ids(edges)
+    for label in sorted(ids):
+        if ids[label] == label:
+            lines.append(f"    participant {label}")
+        else:
+            lines.append(f"    participant {ids[label]} as {label}")
+    if others:
+        lines.append(f"    participant {DIAGRAM_OTHERS}")
 
     lines.append("")
 
-    for conv in timeline:
-        src = conv["src"]
-        dst = conv["dst"]
-        packets = conv["packet_count"]
-        turns = conv["turns"]
-        avg_size = conv["avg_packet_size"]
-        chattiness = conv["chattiness"]
-
-        note = f"{packets} pkts, {turns} turns, {avg_size:.0f} bytes avg, {chattiness:.1f} pkt/turn"
-        lines.append(f"    {src}->>{dst}: {note}")
+    for edge in edges:
+        note = f"{_edge_note(edge)}, {edge['chattiness']:.1f} pkt/turn"
+        lines.append(f"    {ids[edge['src']]}->>{ids[edge['dst']]}: {note}")
+    if others:
+        lines.append(f"    Note over {DIAGRAM_OTHERS}: {_edge_note(others)}")
 
     mermaid_code = "\n".join(lines)
 
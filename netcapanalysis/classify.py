@@ -0,0 +1,351 @@
+import struct
+from collections import Counter, defaultdict
+
+from scapy.all import TCP, UDP, NoPayload, Padding, Raw
+
+from .flows import flow_key
+from .pipeline import Aggregator, get_service_name
+
+# Payload-carrying packets inspected per flow before giving up on it
+CLASSIFY_PACKETS = 4
+# Only this much of each inspected payload is looked at
+CLASSIFY_BYTES = 2048
+
+HTTP_METHODS = (
+    b"GET ",
+    b"POST ",
+    b"PUT ",
+    b"HEAD ",
+    b"DELETE ",
+    b"OPTIONS ",
+    b"PATCH ",
+    b"CONNECT ",
+    b"TRACE ",
+)
+DNS_LABEL_BYTES = frozenset(
+    b"abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789-_"
+)
+DNS_CLASSES = (1, 3, 4, 255)
+
+
+def _tls_client_hello(data):
+    """The SNI of a TLS ClientHello, "" without one, None if not a ClientHello
+
+    A ClientHello cut short by the segment boundary still counts as TLS.
+    """
+    if len(data) < 6 or data[0] != 0x16 or data[1] != 3 or data[5] != 1:
+        return None
+    try:
+        # Record header, handshake header, client version and random
+        pos = 5 + 4 + 2 + 32
+        pos += 1 + data[pos]
+        pos += 2 + struct.unpack_from("!H", data, pos)[0]
+        pos += 1 + data[pos]
+        (ext_len,) = struct.unpack_from("!H", data, pos)
+        pos += 2
+        end = min(pos + ext_len, len(data))
+        while pos + 4 <= end:
+            ext_type, size = struct.unpack_from("!HH", data, pos)
+            pos += 4
+            if ext_type == 0:
+                # server_name_list: list length, name type 0, name length
+                if data[pos + 2] != 0:
+                    return ""
+                (name_len,) = struct.unpack_from("!H", data, pos + 3)
+                name = data[pos + 5 : pos + 5 + name_len]
+                return name.decode("ascii", "replace")
+            pos += size
+    except (IndexError, struct.error):
+        pass
+    return ""
+
+
+def _http_host(data):
+    """Host (without port) of an HTTP/1.x request, "" for a response or no
+    Host, None for anything else"""
+    if data.startswith(b"HTTP/1."):
+        return ""
+    if not data.startswith(HTTP_METHODS):
+        return None
+    line_end = data.find(b"\r\n")
+    if line_end < 0 or b" HTTP/1." not in data[:line_end]:
+        return None
+    for line in data[line_end + 2 :].split(b"\r\n"):
+        if not line:
+            break
+        name, sep, value = line.partition(b":")
+        if sep and name.strip().lower() == b"host":
+            host = value.strip().decode("ascii", "replace")
+            # Drop the port, keeping bracketed IPv6 literals whole
+            if host.startswith("["):
+                return host.partition("]")[0] + "]"
+            return host.partition(":")[0]
+    return ""
+
+
+def _dns_query(data):
+    """(qname, is_response) of a well-formed DNS message, else None"""
+    if len(data) < 17:
+        return None
+    flags, qdcount = struct.unpack_from("!HH", data, 2)
+    if qdcount != 1 or (flags >> 11) & 0xF != 0:
+        return None
+    labels = []
+    pos = 12
+    while True:
+        if pos >= len(data):
+            return None
+        size = data[pos]
+        pos += 1
+        if size == 0:
+            break
+        label = data[pos : pos + size]
+        if size > 63 or len(label) < size or not DNS_LABEL_BYTES.issuperset(label):
+            return None
+        labels.append(label.decode())
+        pos += size
+    if pos + 4 > len(data):
+        return None
+    (qclass,) = struct.unpack_from("!H", data, pos + 2)
+    if qclass & 0x7FFF not in DNS_CLASSES:
+        return None
+    return ".".join(labels).lower() or ".", bool(flags & 0x8000)
+
+
+def classify_payload(data, protocol):
+    """Identify an application from the first bytes of one payload
+
+    Returns (application, name, sent_by_server) or None. ``name`` is the
+    TLS SNI, HTTP Host, DNS query name or SSH software, and may be "".
+    """
+    if protocol == "TCP":
+        sni = _tls_client_hello(data)
+        if sni is not None:
+            return "TLS", sni.lower(), False
+        host = _http_host(data)
+        if host is not None:
+            return "HTTP", host.lower(), not data.startswith(HTTP_METHODS)
+        if data.startswith(b"SSH-"):
+            banner = data.split(b"\r\n", 1)[0].split(b"\n", 1)[0]
+            software = banner.split(b"-", 2)[2] if banner.count(b"-") >= 2 else b""
+            return "SSH", software.decode("ascii", "replace"), None
+        # DNS over TCP has a two-byte length prefix
+        if len(data) > 2 and struct.unpack_from("!H", data)[0] == len(data) - 2:
+            data = data[2:]
+        else:
+            return None
+    query = _dns_query(data)
+    if query is not None:
+        return "DNS", query[0], query[1]
+    return None
+
+
+def _flow_key(info):
+    a = f"{info.src}:{info.src_port}"
+    b = f"{info.dst}:{info.dst_port}"
+    return f"{info.protocol} {a} {b}" if a <= b else f"{info.protocol} {b} {a}"
+
+
+def _new_flow():
+    return {
+        "inspected": 0,
+        "app": None,
+        "name": None,
+        "port": None,
+        "packets": 0,
+        "bytes": 0,
+    }
+
+
+def merge_app_flow(a, b, max_packets=CLASSIFY_PACKETS):
+    """Fold the entry ``b`` of a flow into ``a``, built from earlier packets
+
+    A verdict of ``b`` only counts if it came within the payloads ``a`` had
+    left to inspect, so merged partial entries match a single pass.
+    """
+    a["packets"] += b["packets"]
+    a["bytes"] += b["bytes"]
+    if "flows" in a:
+        a["flows"] += b["flows"]
+    if (
+        a["app"] is None
+        and b["app"] is not None
+        and a["inspected"] + b["inspected"] <= max_packets
+    ):
+        for field in ("app", "name", "port"):
+            a[field] = b[field]
+    a["inspected"] = min(a["inspected"] + b["inspected"], max_packets)
+    return a
+
+
+class AppClassifier(Aggregator):
+    """Classify TCP/UDP flows from their first payloads
+
+    Only the first ``max_packets`` payload-carrying packets of a flow have
+    their payload looked at; once a flow is classified, or has used up its
+    packets, later packets only add to its counters. Verdicts are cached
+    per flow in the ``app_flows`` key of a new_stats() dict.
+
+    With a ``flow_table`` a flow's entry is kept on its FlowTable record
+    instead, and with a ``spill_table`` entries spill to disk like the
+    conversations do. Either way ``app_flows`` then only holds classified
+    flows folded per application, name and server port (with a ``flows``
+    count), added as their flows are evicted or at the end. With ``fold``
+    the per-flow entries of ``app_flows`` are folded that way at the end.
+    """
+
+    def __init__(
+        self,
+        stats,
+        max_packets=CLASSIFY_PACKETS,
+        flow_table=None,
+        spill_table=None,
+        fold=False,
+    ):
+        self.flows = stats["app_flows"]
+        self.max_packets = max_packets
+        self.flow_table = flow_table
+        self.spill_table = spill_table
+        self.fold = fold
+        if flow_table is not None:
+            flow_table.on_evict = self._evicted
+
+    def _entry(self, info):
+        if self.flow_table is not None:
+            record = self.flow_table.flows.get(
+                flow_key(
+                    info.protocol, info.src, info.src_port, info.dst, info.dst_port
+                )
+            )
+            if record is None:
+                return None
+            flow = record.get("classify")
+            if flow is None:
+                flow = record["classify"] = _new_flow()
+            return flow
+
+        key = _flow_key(info)
+        spill_table = self.spill_table
+        if spill_table is None:
+            flow = self.flows.get(key)
+            if flow is None:
+                flow = self.flows[key] = _new_flow()
+            return flow
+        flow = spill_table.live.get(key)
+        if flow is None:
+            spill_table.check()
+            flow = spill_table.live[key] = _new_flow()
+        return flow
+
+    def update(self, info):
+        if info.protocol not in ("TCP", "UDP"):
+            return
+        flow = self._entry(info)
+        if flow is None:
+            return
+        flow["packets"] += 1
+        flow["bytes"] += info.length
+        if flow["app"] is not None or flow["inspected"] >= self.max_packets:
+            return
+
+        payload = info.packet[TCP if info.protocol == "TCP" else UDP].payload
+        if isinstance(payload, (NoPayload, Padding)):
+            return
+        data = payload.load if isinstance(payload, Raw) else bytes(payload)
+        if not data:
+            return
+        flow["inspected"] += 1
+        verdict = classify_payload(data[:CLASSIFY_BYTES], info.protocol)
+        if verdict is None:
+            return
+        flow["app"], flow["name"], by_server = verdict
+        if by_server is None:
+            # Either side may send an SSH banner first; take the lower port
+            by_server = info.src_port < info.dst_port
+        flow["port"] = info.src_port if by_server else info.dst_port
+
+    def _evicted(self, record):
+        flow = record.get("classify")
+        if flow is not None:
+            self._fold(flow)
+
+    def _fold(self, flow):
+        """Add a finished flow to the entry of its application, name and port"""
+        if flow["app"] is None:
+            return
+        key = f"{flow['app']} {flow['port']} {flow['name']}"
+        folded = self.flows.get(key)
+        if folded is None:
+            folded = self.flows[key] = {
+                **flow,
+                "inspected": self.max_packets,
+                "packets": 0,
+                "bytes": 0,
+                "flows": 0,
+            }
+        folded["packets"] += flow["packets"]
+        folded["bytes"] += flow["bytes"]
+        folded["flows"] += flow.get("flows", 1)
+
+    def merge(self, other):
+        for key, flow in other.flows.items():
+            current = self.flows.get(key)
+            if current is None:
+                self.flows[key] = dict(flow)
+            else:
+                merge_app_flow(current, flow, self.max_packets)
+
+    def finalize(self, result):
+        # The flow table was flushed, folding its flows in, when the
+        # ConversationAggregator before this one was finalized
+        if self.spill_table is not None:
+            for _, flow in self.spill_table.merged():
+                self._fold(flow)
+        elif self.fold and self.flow_table is None:
+            flows = list(self.flows.values())
+            self.flows.clear()
+            for flow in flows:
+                self._fold(flow)
+        result["app_flows"] = dict(self.flows)
+
+
+def application_summary(stats):
+    """Classified flows, packets and bytes per application, busiest first
+
+    Each row also counts the flows per name (SNI, Host, query name).
+    """
+    apps = defaultdict(
+        lambda: {"flows": 0, "packets": 0, "bytes": 0, "names": Counter()}
+    )
+    for flow in stats.get("app_flows", {}).values():
+        if flow["app"] is None:
+            continue
+        flows = flow.get("flows", 1)
+        app = apps[flow["app"]]
+        app["flows"] += flows
+        app["packets"] += flow["packets"]
+        app["bytes"] += flow["bytes"]
+        if flow["name"]:
+            app["names"][flow["name"]] += flows
+    return sorted(apps.items(), key=lambda x: (-x[1]["bytes"], x[0]))
+
+
+def port_applications(stats):
+    """Map server ports to the application most of their flows were"""
+    counts = defaultdict(Counter)
+    for flow in stats.get("app_flows", {}).values():
+        if flow["app"] is not None:
+            counts[flow["port"]][flow["app"]] += flow.get("flows", 1)
+    # Ties go to the first application by name, whatever order flows came in
+    return {
+        port: min(apps.items(), key=lambda x: (-x[1], x[0]))[0]
+        for port, apps in counts.items()
+    }
+
+
+def service_name(port, port_apps):
+    """Service for a port: the well-known name, else the classified one"""
+    service = get_service_name(port)
+    if service == "Unknown":
+        return port_apps.get(port, service)
+    return service
@@ -1,19 +1,104 @@
 import click
+import functools
+import json
 import sys
+import time
 from pathlib import Path
 
 from .capture import capture_packets
 from .analyzer import analyze_pcap
+from .batch import find_captures, run_batch, write_summary
 from .charts import (
+    DIAGRAM_MAX_PAIRS,
+    DIAGRAM_MAX_PARTICIPANTS,
     generate_length_chart,
     generate_port_chart,
     generate_conversation_diagram,
-    generate_timeline_chart,
-    generate_timeline_sequence,
-    generate_chattiness_chart,
+    generate_throughput_chart,
+    parse_group,
+    participant_grouper,
 )
-from .multianalyze import analyze_multi_capture, get_timeline_summary
-from .report import generate_report
+from .multianalyze import analyze_multi_capture, append_timeline
+from .export import (
+    FORMATS,
+    TABLES,
+    export_tables,
+    find_table,
+    is_export_dir,
+    load_stats,
+    load_timeline,
+)
+from .flowstore import parse_time, query_flows, store_capture, store_timeline
+from .dedup import Deduplicator
+from .diff import diff_captures
+from .distributed import (
+    DEFAULT_PORT,
+    MODES,
+    Coordinator,
+    merge_analyze,
+    merge_timeline,
+    parse_address,
+    plan_tasks,
+    run_worker,
+)
+from .follow import default_checkpoint, follow_pcap
+from .profiling import Profiler, stage
+from .rollups import LEVELS, load_pyramid, rollup_path, save_pyramid
+from .sampling import parse_sample, sample_pcap
+from .report import generate_diff_report, generate_report, generate_timeline_report
+
+
+def _load_stats(input_file, **kwargs):
+    """Analyze a pcap, or load its statistics from an export directory"""
+    if is_export_dir(input_file):
+        return load_stats(input_file)
+    return analyze_pcap(input_file, **kwargs)
+
+
+def _save_rollups(input_file, stats):
+    """Persist the throughput pyramid next to the capture, if there is one"""
+    if not stats.get("throughput") or is_export_dir(input_file):
+        return None
+    with stage("rollup"):
+        pyramid = stats["throughput"].pyramid()
+        try:
+            save_pyramid(rollup_path(input_file), pyramid, input_file)
+        except OSError as e:
+            click.echo(f"Warning: could not save rollups: {e}", err=True)
+    return pyramid
+
+
+def profiled(f):
+    """Add --profile options to a command and time it under a Profiler"""
+
+    @click.option(
+        "--profile", is_flag=True, help="Print per-stage timing and memory usage"
+    )
+    @click.option(
+        "--profile-dump",
+        default=None,
+        help="Directory for cProfile .pstats dumps of the hot loops",
+    )
+    @click.option(
+        "--profile-output", default=None, help="Write per-stage profile as JSON"
+    )
+    @functools.wraps(f)
+    def wrapper(*args, profile, profile_dump, profile_output, **kwargs):
+        if not (profile or profile_dump or profile_output):
+            return f(*args, **kwargs)
+
+        with Profiler(profile_dump) as profiler:
+            try:
+                return f(*args, **kwargs)
+            finally:
+                if profile or profile_dump:
+                    click.echo(profiler.format_table(), err=True)
+                if profile_output:
+                    Path(profile_output).write_text(
+                        json.dumps(profiler.summary(), indent=2)
+                    )
+
+    return wrapper
 
 
 @click.group()
@@ -33,25 +118,170 @@ def cli():
 @click.option(
     "-d", "--duration", default=None, type=int, help="Capture duration in seconds"
 )
+@profiled
 def capture(interface, count, output, filter, duration):
     """Capture network packets to a pcap file"""
-    capture_packets(interface, count, output, filter, duration)
+    with stage("capture"):
+        capture_packets(interface, count, output, filter, duration)
 
 
 @cli.command()
 @click.option("-i", "--input", "input_file", required=True, help="Input pcap file")
 @click.option("-o", "--output", default="report.md", help="Output markdown report")
 @click.option("--no-png", is_flag=True, help="Skip PNG generation")
-def analyze(input_file, output, no_png):
+@click.option(
+    "--max-rows",
+    default=20,
+    type=int,
+    help="Conversation rows written to the report itself",
+)
+@click.option(
+    "--page-size",
+    default=None,
+    type=int,
+    help="Write remaining conversation rows to linked part files of this size",
+)
+@click.option(
+    "--csv", "csv_out", is_flag=True, help="Also write all conversations as CSV"
+)
+@click.option(
+    "--store",
+    default=None,
+    envvar="NETCAP_FLOW_STORE",
+    help="SQLite flow store to record results in (env: NETCAP_FLOW_STORE)",
+)
+@click.option(
+    "--flow-timeout",
+    default=None,
+    type=float,
+    help="Track bidirectional flows, expiring them after this many idle seconds",
+)
+@click.option(
+    "--flow-spill",
+    default=None,
+    help="With --flow-timeout, write every expired flow to this CSV file",
+)
+@click.option(
+    "--memory-budget",
+    default=None,
+    type=float,
+    help="Stream packets and spill aggregation tables to disk beyond this many MB",
+)
+@click.option(
+    "--follow",
+    is_flag=True,
+    help="Only parse records appended since the last run, using a checkpoint",
+)
+@click.option(
+    "--checkpoint",
+    default=None,
+    help="Checkpoint file for --follow (default: <output>.follow.json)",
+)
+@click.option(
+    "--interval",
+    default=None,
+    type=float,
+    help="With --follow, keep running and re-check the file every N seconds",
+)
+@click.option(
+    "--sample",
+    default=None,
+    help="Approximate analysis of a sample: nth:N, flow:N or reservoir:N",
+)
+@click.option(
+    "--seed", default=0, type=int, help="Random seed for --sample reservoir:N"
+)
+@profiled
+def analyze(
+    input_file,
+    output,
+    no_png,
+    max_rows,
+    page_size,
+    csv_out,
+    store,
+    flow_timeout,
+    flow_spill,
+    memory_budget,
+    follow,
+    checkpoint,
+    interval,
+    sample,
+    seed,
+):
     """Analyze pcap file and generate report"""
     if not Path(input_file).exists():
         click.echo(f"Error: Input file '{input_file}' not found", err=True)
         sys.exit(1)
 
-    stats = analyze_pcap(input_file)
+    if flow_spill and flow_timeout is None:
+        click.echo("Error: --flow-spill requires --flow-timeout", err=True)
+        sys.exit(1)
 
-    generate_report(stats, input_file, output, not no_png)
-    click.echo(f"Report generated: {output}")
+    if follow and (flow_timeout is not None or memory_budget is not None):
+        click.echo(
+            "Error: --follow cannot be combined with --flow-timeout or --memory-budget",
+            err=True,
+        )
+        sys.exit(1)
+    if sample:
+        try:
+            sample_mode, sample_rate = parse_sample(sample)
+        except ValueError as e:
+            click.echo(f"Error: {e}", err=True)
+            sys.exit(1)
+        if follow or store or flow_timeout is not None or memory_budget is not None:
+            click.echo(
+                "Error: --sample cannot be combined with --follow, --store,"
+                " --flow-timeout or --memory-budget",
+                err=True,
+            )
+            sys.exit(1)
+
+    if interval is not None and not follow:
+        click.echo("Error: --interval requires --follow", err=True)
+        sys.exit(1)
+
+    while True:
+        if follow:
+            stats, new_packets = follow_pcap(
+                input_file, checkpoint or default_checkpoint(output)
+            )
+            click.echo(f"Processed {new_packets:,} new packets")
+        elif sample:
+            stats = sample_pcap(input_file, sample_mode, sample_rate, seed)
+        else:
+            stats = _load_stats(
+                input_file,
+                flow_timeout=flow_timeout,
+                flow_spill=flow_spill,
+                memory_budget=memory_budget,
+            )
+
+        if store:
+            with stage("store"):
+                store_capture(store, input_file, stats)
+
+        pyramid = _save_rollups(input_file, stats)
+
+        generate_report(
+            stats,
+            input_file,
+            output,
+            not no_png,
+            max_rows=max_rows,
+            page_size=page_size,
+            write_csv=csv_out,
+            pyramid=pyramid,
+        )
+        click.echo(f"Report generated: {output}")
+
+        if interval is None:
+            break
+        try:
+            time.sleep(interval)
+        except KeyboardInterrupt:
+            break
 
 
 @cli.command()
@@ -61,24 +291,65 @@ def analyze(input_file, output, no_png):
     "-t",
     "--type",
     "chart_type",
-    type=click.Choice(["length", "port", "conversation"]),
+    type=click.Choice(["length", "port", "conversation", "throughput"]),
     default="port",
     help="Chart type",
 )
-def chart(input_file, output, chart_type):
+@click.option(
+    "--start", default=None, help="Throughput window start (epoch or ISO-8601)"
+)
+@click.option("--end", default=None, help="Throughput window end (epoch or ISO-8601)")
+@click.option(
+    "--level",
+    default=None,
+    type=click.Choice([str(level) for level in LEVELS]),
+    help="Throughput bin width in seconds (default: chosen from the window)",
+)
+@profiled
+def chart(input_file, output, chart_type, start, end, level):
     """Generate chart from pcap file"""
     if not Path(input_file).exists():
         click.echo(f"Error: Input file '{input_file}' not found", err=True)
         sys.exit(1)
 
-    stats = analyze_pcap(input_file)
+    if chart_type == "throughput":
+        try:
+            start, end = parse_time(start), parse_time(end)
+        except ValueError as e:
+            click.echo(f"Error: {e}", err=True)
+            sys.exit(1)
+
+        if is_export_dir(input_file):
+            pyramid = load_stats(input_file)["throughput"].pyramid()
+        else:
+            with stage("rollup"):
+                pyramid = load_pyramid(rollup_path(input_file), input_file)
+            if pyramid is None:
+                pyramid = _save_rollups(input_file, analyze_pcap(input_file))
+
+        with stage("chart:throughput"):
+            used = generate_throughput_chart(
+                pyramid,
+                output,
+                start=start,
+                end=end,
+                level=int(level) if level else None,
+            )
+        if used is None:
+            click.echo("Error: No packets in the selected window", err=True)
+            sys.exit(1)
+        click.echo(f"Chart generated: {output} ({used}s bins)")
+        return
 
-    if chart_type == "length":
-        generate_length_chart(stats, output)
-    elif chart_type == "port":
-        generate_port_chart(stats, output)
-    elif chart_type == "conversation":
-        generate_conversation_diagram(stats, output)
+    stats = _load_stats(input_file)
+
+    with stage(f"chart:{chart_type}"):
+        if chart_type == "length":
+            generate_length_chart(stats, output)
+        elif chart_type == "port":
+            generate_port_chart(stats, output)
+        elif chart_type == "conversation":
+            generate_conversation_diagram(stats, output)
 
     click.echo(f"Chart generated: {output}")
 
@@ -86,13 +357,14 @@ def chart(input_file, output, chart_type):
 @cli.command()
 @click.option("-i", "input_file", required=True, help="Input pcap file")
 @click.option("-o", "--output", required=True, help="Output mermaid file")
+@profiled
 def mermaid(input_file, output):
     """Generate mermaid diagrams from pcap file"""
     if not Path(input_file).exists():
         click.echo(f"Error: Input file '{input_file}' not found", err=True)
         sys.exit(1)
 
-    stats = analyze_pcap(input_file)
+    stats = _load_stats(input_file)
 
     mermaid_code = generate_conversation_diagram(stats, None)
 
@@ -105,104 +377,489 @@ def mermaid(input_file, output):
     "-i",
     "--inputs",
     "input_files",
-    required=True,
     multiple=True,
     help="Input pcap files (can specify multiple)",
 )
 @click.option("-o", "--output", default="timeline.md", help="Output markdown report")
 @click.option("--no-png", is_flag=True, help="Skip PNG generation")
-def timeline(input_files, output, no_png):
+@click.option(
+    "--max-rows",
+    default=None,
+    type=int,
+    help="Conversation rows written to the report itself (default: all)",
+)
+@click.option(
+    "--page-size",
+    default=None,
+    type=int,
+    help="Write remaining conversation rows to linked part files of this size",
+)
+@click.option(
+    "--csv", "csv_out", is_flag=True, help="Also write all conversations as CSV"
+)
+@click.option(
+    "--store",
+    default=None,
+    envvar="NETCAP_FLOW_STORE",
+    help="SQLite flow store to record results in (env: NETCAP_FLOW_STORE)",
+)
+@click.option(
+    "--memory-budget",
+    default=None,
+    type=float,
+    help="Stream packets and spill aggregation tables to disk beyond this many MB",
+)
+@click.option(
+    "--state",
+    "state_file",
+    default=None,
+    help="Timeline state file; with -i it is rebuilt from those captures",
+)
+@click.option(
+    "--append",
+    "append_files",
+    multiple=True,
+    help="Fold this capture into the --state timeline (can specify multiple)",
+)
+@click.option(
+    "--dedup-window",
+    default=None,
+    type=float,
+    help="Drop packets seen in another capture within this many seconds",
+)
+@click.option(
+    "-j",
+    "--jobs",
+    default=None,
+    type=click.IntRange(1),
+    help="Analyze captures in this many processes",
+)
+@click.option(
+    "--subnet",
+    default=None,
+    type=click.IntRange(1, 32),
+    help="Collapse diagram participants into IPv4 subnets of this prefix length",
+)
+@click.option(
+    "--group",
+    "groups",
+    multiple=True,
+    help="Diagram participant group NAME=CIDR[,CIDR...] (can specify multiple)",
+)
+@click.option(
+    "--diagram-pairs",
+    default=DIAGRAM_MAX_PAIRS,
+    type=click.IntRange(1),
+    help="Pairs drawn in the diagrams; the rest are summed as Others",
+)
+@click.option(
+    "--diagram-participants",
+    default=DIAGRAM_MAX_PARTICIPANTS,
+    type=click.IntRange(2),
+    help="Participants drawn in the diagrams",
+)
+@profiled
+def timeline(
+    input_files,
+    output,
+    no_png,
+    max_rows,
+    page_size,
+    csv_out,
+    store,
+    memory_budget,
+    state_file,
+    append_files,
+    dedup_window,
+    jobs,
+    subnet,
+    groups,
+    diagram_pairs,
+    diagram_participants,
+):
     """Analyze multiple pcap files and show timeline of conversations"""
-    for f in input_files:
+    try:
+        groups = [parse_group(spec) for spec in groups]
+    except ValueError as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+
+    if append_files and not state_file:
+        click.echo("Error: --append requires --state", err=True)
+        sys.exit(1)
+    if not input_files and not append_files:
+        click.echo("Error: specify input files with -i or --append", err=True)
+        sys.exit(1)
+
+    if dedup_window is not None and state_file:
+        click.echo("Error: --dedup-window cannot be combined with --state", err=True)
+        sys.exit(1)
+    if jobs is not None and (
+        state_file or memory_budget is not None or dedup_window is not None
+    ):
+        click.echo(
+            "Error: --jobs cannot be combined with --state, --memory-budget"
+            " or --dedup-window",
+            err=True,
+        )
+        sys.exit(1)
+
+    for f in input_files + append_files:
         if not Path(f).exists():
             click.echo(f"Error: Input file '{f}' not found", err=True)
             sys.exit(1)
 
-    timeline_data, all_packets = analyze_multi_capture(list(input_files))
-    summary = get_timeline_summary(timeline_data)
-
-    output_path = Path(output)
-    output_dir = output_path.parent
-    base_name = output_path.stem
-
-    if not no_png:
-        generate_chattiness_chart(
-            timeline_data, str(output_dir / f"{base_name}_chattiness.png")
+    if state_file:
+        timeline_data, input_files = append_timeline(
+            state_file,
+            list(input_files + append_files),
+            reset=bool(input_files),
+            memory_budget=memory_budget,
         )
-        generate_timeline_chart(
-            timeline_data, str(output_dir / f"{base_name}_timeline.png")
+    elif len(input_files) == 1 and find_table(input_files[0], "timeline"):
+        timeline_data = load_timeline(input_files[0])
+    else:
+        dedup = Deduplicator(dedup_window) if dedup_window is not None else None
+        timeline_data, all_packets = analyze_multi_capture(
+            list(input_files), memory_budget=memory_budget, dedup=dedup, jobs=jobs
         )
-        generate_timeline_sequence(
-            timeline_data, str(output_dir / f"{base_name}_sequence.png")
-        )
-
-    mermaid_timeline = generate_timeline_chart(timeline_data, None)
-    mermaid_sequence = generate_timeline_sequence(timeline_data, None)
-
-    markdown = f"""# Multi-Capture Timeline Analysis
-
-**Input Files**: {", ".join(input_files)}
-**Generated**: {Path(output).name}
+        if dedup is not None:
+            click.echo(f"Dropped {dedup.dropped:,} duplicate packets")
+
+    if store:
+        with stage("store"):
+            store_timeline(store, input_files, timeline_data)
+
+    generate_timeline_report(
+        timeline_data,
+        input_files,
+        output,
+        not no_png,
+        max_rows=max_rows,
+        page_size=page_size,
+        write_csv=csv_out,
+        grouper=participant_grouper(subnet, groups),
+        max_pairs=diagram_pairs,
+        max_participants=diagram_participants,
+    )
+    click.echo(f"Timeline analysis generated: {output}")
 
----
 
-## Summary
+@cli.command()
+@click.option(
+    "-a", "--base", "base_file", required=True, help="Baseline pcap or export directory"
+)
+@click.option(
+    "-b", "--new", "new_file", required=True, help="Pcap or export directory to compare"
+)
+@click.option("-o", "--output", default="diff.md", help="Output markdown report")
+@click.option(
+    "--max-rows",
+    default=20,
+    type=int,
+    help="Rows per port, conversation and IP pair table",
+)
+@click.option(
+    "--store",
+    default=None,
+    envvar="NETCAP_FLOW_STORE",
+    help="SQLite flow store to reuse and record results in (env: NETCAP_FLOW_STORE)",
+)
+@profiled
+def diff(base_file, new_file, output, max_rows, store):
+    """Compare two captures and report what changed"""
+    for f in (base_file, new_file):
+        if not Path(f).exists():
+            click.echo(f"Error: Input file '{f}' not found", err=True)
+            sys.exit(1)
 
-| Metric | Value |
-|--------|-------|
-| Total Conversations | {summary["total_conversations"]:,} |
-| Total Packets | {summary["total_packets"]:,} |
-| Total Bytes | {summary["total_bytes"]:,} |
-| Total Turns | {summary["total_turns"]:,} |
-| Avg Packets/Conversation | {summary["avg_packets_per_convo"]:.1f} |
-| Avg Turns/Conversation | {summary["avg_turns_per_convo"]:.1f} |
+    result = diff_captures(base_file, new_file, store=store)
+    generate_diff_report(result, base_file, new_file, output, max_rows=max_rows)
+    click.echo(f"Diff report generated: {output}")
 
----
 
-## Timeline Chart (Past -> Present)
+@cli.command()
+@click.argument("target")
+@click.option("-o", "--output", required=True, help="Output directory for reports")
+@click.option(
+    "-j",
+    "--jobs",
+    default=None,
+    type=click.IntRange(1),
+    help="Worker processes (default: CPU count)",
+)
+@click.option(
+    "--manifest",
+    default=None,
+    help="Manifest of analyzed captures (default: OUTPUT/manifest.json)",
+)
+@click.option("--force", is_flag=True, help="Re-analyze captures even if unchanged")
+@click.option("--no-png", is_flag=True, help="Skip PNG generation")
+@click.option(
+    "--max-rows",
+    default=20,
+    type=int,
+    help="Conversation rows written to each report",
+)
+@profiled
+def batch(target, output, jobs, manifest, force, no_png, max_rows):
+    """Analyze every capture in a directory or glob in parallel"""
+    files = find_captures(target)
+    if not files:
+        click.echo(f"Error: No capture files found in '{target}'", err=True)
+        sys.exit(1)
 
-![Timeline]({base_name}_timeline.png)
+    def progress(result):
+        name = Path(result["path"]).name
+        if "error" in result:
+            click.echo(f"Failed: {name} ({result['error']})", err=True)
+        elif result.get("unchanged"):
+            click.echo(f"Unchanged: {name}")
+        else:
+            click.echo(f"Analyzed: {name}")
+
+    manifest_data, counts = run_batch(
+        files,
+        output,
+        manifest or str(Path(output) / "manifest.json"),
+        jobs=jobs,
+        force=force,
+        report_options={"generate_png": not no_png, "max_rows": max_rows},
+        progress=progress,
+    )
+
+    summary_file = str(Path(output) / "summary.md")
+    write_summary(manifest_data, summary_file)
+    click.echo(
+        f"{counts['analyzed']:,} analyzed, {counts['unchanged']:,} unchanged, "
+        f"{counts['failed']:,} failed"
+    )
+    click.echo(f"Summary written to: {summary_file}")
+    if counts["failed"]:
+        sys.exit(1)
 
-```mermaid
-{mermaid_timeline}
-```
 
----
+@cli.command()
+@click.option(
+    "-i",
+    "--inputs",
+    "input_files",
+    required=True,
+    multiple=True,
+    help="Input pcap files (can specify multiple)",
+)
+@click.option("-o", "--output", default="report.md", help="Output markdown report")
+@click.option(
+    "--mode",
+    type=click.Choice(MODES),
+    default="analyze",
+    help="Merge into one analyze report or a multi-capture timeline",
+)
+@click.option(
+    "--listen",
+    default=f"127.0.0.1:{DEFAULT_PORT}",
+    help="Address workers connect to (HOST:PORT); workers are not authenticated",
+)
+@click.option(
+    "--shard-size",
+    default=256,
+    type=float,
+    help="Split pcap files larger than this many MB into shards (0: whole files)",
+)
+@click.option(
+    "--retries", default=3, type=int, help="Times a failed shard is reassigned"
+)
+@click.option("--no-png", is_flag=True, help="Skip PNG generation")
+@click.option(
+    "--max-rows",
+    default=None,
+    type=int,
+    help="Conversation rows written to the report itself",
+)
+@profiled
+def coordinator(
+    input_files, output, mode, listen, shard_size, retries, no_png, max_rows
+):
+    """Distribute analysis of captures to worker processes"""
+    for f in input_files:
+        if not Path(f).exists():
+            click.echo(f"Error: Input file '{f}' not found", err=True)
+            sys.exit(1)
+    try:
+        host, port = parse_address(listen)
+    except ValueError as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
 
-## Conversation Flow Sequence
+    with stage("plan"):
+        tasks = plan_tasks(input_files, mode, int(shard_size * 1024 * 1024))
+    click.echo(f"{len(tasks):,} shards from {len(input_files):,} captures")
+
+    coord = Coordinator(
+        tasks, host, port, retries, log=lambda message: click.echo(message, err=True)
+    )
+    try:
+        with stage("distribute"):
+            results = coord.run()
+    except (OSError, RuntimeError) as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
 
-![Sequence]({base_name}_sequence.png)
+    with stage("merge"):
+        if mode == "analyze":
+            stats = merge_analyze(results)
+        else:
+            timeline = merge_timeline(results)
+
+    if mode == "analyze":
+        generate_report(
+            stats,
+            ", ".join(input_files),
+            output,
+            not no_png,
+            max_rows=20 if max_rows is None else max_rows,
+        )
+    else:
+        generate_timeline_report(
+            timeline, list(input_files), output, not no_png, max_rows=max_rows
+        )
+    click.echo(f"Report generated: {output}")
 
-```mermaid
-{mermaid_sequence}
-```
 
----
+@cli.command()
+@click.option(
+    "--connect",
+    required=True,
+    help=f"Coordinator address (HOST:PORT, default port {DEFAULT_PORT})",
+)
+@click.option("--name", default=None, help="Worker name (default: HOST:PID)")
+@click.option(
+    "--connect-timeout",
+    default=30,
+    type=int,
+    help="Seconds to keep retrying the initial connection",
+)
+@profiled
+def worker(connect, name, connect_timeout):
+    """Analyze shards handed out by a coordinator"""
+    if ":" not in connect:
+        connect = f"{connect}:{DEFAULT_PORT}"
+    try:
+        host, port = parse_address(connect)
+        processed = run_worker(
+            host,
+            port,
+            name,
+            connect_timeout,
+            log=lambda message: click.echo(message, err=True),
+        )
+    except (OSError, ValueError) as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+    click.echo(f"Processed {processed:,} shards")
 
-## Chattiness Analysis
 
-![Chattiness]({base_name}_chattiness.png)
+@cli.command()
+@click.option(
+    "-i",
+    "--inputs",
+    "input_files",
+    required=True,
+    multiple=True,
+    help="Input pcap files (can specify multiple)",
+)
+@click.option("-o", "--output", required=True, help="Output directory")
+@click.option(
+    "-f",
+    "--format",
+    "fmt",
+    type=click.Choice(list(FORMATS)),
+    default="parquet",
+    help="Output file format",
+)
+@click.option(
+    "-t",
+    "--table",
+    "tables",
+    type=click.Choice(TABLES),
+    multiple=True,
+    help="Tables to export (default: all)",
+)
+@click.option(
+    "--row-group-size",
+    default=65536,
+    type=int,
+    help="Rows buffered in memory per written row group",
+)
+@profiled
+def export(input_files, output, fmt, tables, row_group_size):
+    """Export packet, conversation and timeline tables as columnar files"""
+    for f in input_files:
+        if not Path(f).exists():
+            click.echo(f"Error: Input file '{f}' not found", err=True)
+            sys.exit(1)
 
----
+    counts = export_tables(
+        list(input_files), output, fmt, list(tables) or None, row_group_size
+    )
 
-## Conversation Details
+    for table, rows in counts.items():
+        click.echo(f"{table}: {rows:,} rows")
+    click.echo(f"Export written to: {output}")
 
-| Source IP | Dest IP | Packets | Bytes | Avg Size | Turns | Chattiness |
-|-----------|---------|---------|-------|----------|-------|------------|
-"""
 
-    for conv in timeline_data:
-        markdown += f"| {conv['src']} | {conv['dst']} | {conv['packet_count']:,} | {conv['total_bytes']:,} | {conv['avg_packet_size']:.1f} | {conv['turns']} | {conv['chattiness']:.2f} |\n"
+@cli.command()
+@click.option(
+    "--store",
+    required=True,
+    envvar="NETCAP_FLOW_STORE",
+    help="SQLite flow store (env: NETCAP_FLOW_STORE)",
+)
+@click.option("--ip", default=None, help="IP address on either side")
+@click.option("--port", default=None, type=int, help="Port on either side")
+@click.option("--since", default=None, help="Start time (epoch or ISO-8601)")
+@click.option("--until", default=None, help="End time (epoch or ISO-8601)")
+@click.option("--capture", default=None, help="Capture file name or path")
+@click.option(
+    "--captures", "by_capture", is_flag=True, help="List matching captures only"
+)
+@click.option("--limit", default=100, type=int, help="Maximum rows (0 for all)")
+@click.option("--json", "as_json", is_flag=True, help="Print results as JSON")
+@profiled
+def query(store, ip, port, since, until, capture, by_capture, limit, as_json):
+    """Query stored conversations without re-reading captures"""
+    if not Path(store).exists():
+        click.echo(f"Error: Flow store '{store}' not found", err=True)
+        sys.exit(1)
 
-    markdown += """
+    try:
+        with stage("query"):
+            rows = query_flows(
+                store,
+                ip=ip,
+                port=port,
+                since=since,
+                until=until,
+                capture=capture,
+                group_by="capture" if by_capture else None,
+                limit=limit,
+            )
+    except ValueError as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
 
----
+    if as_json:
+        click.echo(json.dumps(rows, indent=2))
+        return
 
-*Timeline generated by NetCap Analysis Tool*
-"""
+    if not rows:
+        click.echo("No matching conversations")
+        return
 
-    Path(output).write_text(markdown)
-    click.echo(f"Timeline analysis generated: {output}")
+    columns = list(rows[0].keys())
+    click.echo("\t".join(columns))
+    for row in rows:
+        click.echo("\t".join("" if row[c] is None else str(row[c]) for c in columns))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,202 @@
+import fcntl
+import os
+import shutil
+import tempfile
+import weakref
+
+import numpy as np
+
+# tmpfs, so table files live in shared memory rather than on disk
+SHM_DIR = "/dev/shm"
+PREFIX = "netcap_shm_"
+# Columns start on cache-line boundaries
+ALIGN = 64
+# Held locked by the owner of a table directory for as long as it lives
+LOCK_NAME = ".owner.lock"
+
+
+def _sweep_stale(base):
+    """Remove table directories left behind by processes that were killed
+
+    The kernel drops a directory's owner lock when its process dies, so a
+    lock that can be taken marks a stale directory. Unlike a PID check this
+    holds across PID namespaces, e.g. containers sharing /dev/shm. A
+    directory without a lock file is left alone.
+    """
+    try:
+        names = os.listdir(base)
+    except OSError:
+        return
+    for name in names:
+        if not name.startswith(PREFIX):
+            continue
+        path = os.path.join(base, name)
+        try:
+            fd = os.open(os.path.join(path, LOCK_NAME), os.O_RDONLY)
+        except OSError:
+            continue
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            continue
+        shutil.rmtree(path, True)
+        os.close(fd)
+
+
+def _lock_owner(path):
+    """Create the owner lock of ``path``, already locked; return its fd
+
+    The lock is taken on a temporary name and renamed into place, so a
+    sweep never finds the lock file before it is held.
+    """
+    pending = os.path.join(path, LOCK_NAME + ".new")
+    fd = os.open(pending, os.O_RDWR | os.O_CREAT, 0o600)
+    fcntl.flock(fd, fcntl.LOCK_EX)
+    os.rename(pending, os.path.join(path, LOCK_NAME))
+    return fd
+
+
+def _remove(path, fd):
+    shutil.rmtree(path, True)
+    os.close(fd)
+
+
+class SharedDir:
+    """Directory for the table files of one parent process, removed on close
+
+    It lives in shared memory (/dev/shm) where available. Workers write
+    into it and the parent owns it, holding a lock file in it while open, so
+    a worker that dies leaves nothing behind once the parent closes it;
+    directories whose owner was killed outright, and so no longer holds the
+    lock, are swept when the next one is created.
+    """
+
+    def __init__(self, tmpdir=None):
+        if tmpdir is None and os.path.isdir(SHM_DIR) and os.access(SHM_DIR, os.W_OK):
+            tmpdir = SHM_DIR
+        _sweep_stale(tmpdir or tempfile.gettempdir())
+        self.path = tempfile.mkdtemp(prefix=f"{PREFIX}{os.getpid()}_", dir=tmpdir)
+        self._cleanup = weakref.finalize(
+            self, _remove, self.path, _lock_owner(self.path)
+        )
+
+    def close(self):
+        self._cleanup()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _aligned(offset):
+    return -(-offset // ALIGN) * ALIGN
+
+
+def write_table(directory, name, columns):
+    """Write columns to one file in ``directory`` and return its descriptor
+
+    ``columns`` maps column names to (dtype, values); dtype "string" columns
+    are dictionary-encoded against a string pool shared by the table. The
+    descriptor is a small dict of offsets that SharedTable maps in place.
+    """
+    pool = {}
+    arrays = []
+    for column, (dtype, values) in columns.items():
+        if dtype == "string":
+            for value in dict.fromkeys(values):
+                if value not in pool:
+                    pool[value] = len(pool)
+            codes = list(map(pool.__getitem__, values))
+            arrays.append((column, "string", np.asarray(codes, dtype=np.int32)))
+        else:
+            arrays.append((column, dtype, np.asarray(values, dtype=dtype)))
+
+    encoded = [value.encode() for value in pool]
+    blob = b"".join(encoded)
+    ends = np.cumsum([len(value) for value in encoded], dtype=np.int64)
+
+    path = os.path.join(directory, f"{name}.col")
+    descriptor = {"path": path, "rows": 0, "columns": []}
+    offset = 0
+    with open(path, "wb") as fh:
+
+        def put(data):
+            nonlocal offset
+            start = _aligned(offset)
+            fh.write(b"\0" * (start - offset))
+            fh.write(data)
+            offset = start + len(data)
+            return start
+
+        for column, dtype, array in arrays:
+            descriptor["columns"].append((column, dtype, put(array.tobytes())))
+            descriptor["rows"] = len(array)
+        descriptor["pool"] = (put(ends.tobytes()), len(encoded), put(blob), len(blob))
+    return descriptor
+
+
+class SharedTable:
+    """Read a table written by write_table() in place, without copying
+
+    Numeric columns are numpy arrays over a read-only memory map of the
+    file; string columns are decoded once per distinct value.
+    """
+
+    def __init__(self, descriptor):
+        self.descriptor = descriptor
+        self.rows = descriptor["rows"]
+        self._map = None
+        if os.path.getsize(descriptor["path"]):
+            self._map = np.memmap(descriptor["path"], dtype=np.uint8, mode="r")
+        self._pool = None
+
+    def __len__(self):
+        return self.rows
+
+    def _array(self, dtype, offset, count):
+        if not count:
+            return np.empty(0, dtype=dtype)
+        return np.frombuffer(self._map, dtype=dtype, count=count, offset=offset)
+
+    def strings(self):
+        """The table's string pool, in code order"""
+        if self._pool is None:
+            ends_at, count, blob_at, blob_len = self.descriptor["pool"]
+            ends = self._array(np.int64, ends_at, count).tolist()
+            blob = bytes(self._map[blob_at : blob_at + blob_len]) if blob_len else b""
+            self._pool = [
+                blob[start:end].decode() for start, end in zip([0] + ends, ends)
+            ]
+        return self._pool
+
+    def column(self, name, start=0, stop=None):
+        """Rows ``start:stop`` of a numeric column as an array view of the
+        map, or of a string column as a list
+        """
+        for column, dtype, offset in self.descriptor["columns"]:
+            if column != name:
+                continue
+            if dtype == "string":
+                pool = self.strings()
+                codes = self._array(np.int32, offset, self.rows)[start:stop]
+                return [pool[code] for code in codes.tolist()]
+            return self._array(np.dtype(dtype), offset, self.rows)[start:stop]
+        raise KeyError(name)
+
+    def close(self, unlink=True):
+        """Drop the mapping and, by default, the file"""
+        self._map = None
+        if unlink:
+            try:
+                os.unlink(self.descriptor["path"])
+            except FileNotFoundError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
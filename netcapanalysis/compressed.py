@@ -0,0 +1,154 @@
+import gzip
+import io
+import queue
+import sys
+import threading
+
+CAPTURE_SUFFIXES = (".pcap", ".pcapng", ".cap")
+COMPRESSED_SUFFIXES = (".gz", ".zst")
+# Every capture name accepted, compressed or not
+CAPTURE_NAMES = CAPTURE_SUFFIXES + tuple(
+    suffix + compressed
+    for suffix in CAPTURE_SUFFIXES
+    for compressed in COMPRESSED_SUFFIXES
+)
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+CHUNK_SIZE = 1 << 20
+# Decompressed chunks kept ready ahead of the parser
+PREFETCH_CHUNKS = 8
+
+
+def _require_zstandard():
+    try:
+        import zstandard
+
+        return zstandard
+    except ImportError:
+        print(
+            "Error: .zst captures require zstandard (pip install zstandard)",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
+
+def compression_of(path):
+    """'gzip', 'zstd' or None, from the file's magic bytes"""
+    with open(path, "rb") as f:
+        magic = f.read(4)
+    if magic.startswith(GZIP_MAGIC):
+        return "gzip"
+    if magic == ZSTD_MAGIC:
+        return "zstd"
+    return None
+
+
+def strip_compression(name):
+    """A capture name without its .gz/.zst suffix"""
+    for suffix in COMPRESSED_SUFFIXES:
+        if name.endswith(suffix):
+            return name[: -len(suffix)]
+    return name
+
+
+class PrefetchReader(io.RawIOBase):
+    """Read a decompressing stream on a background thread
+
+    zlib and zstd release the GIL, so decompressing the next chunks
+    overlaps with the caller parsing the current one. At most
+    PREFETCH_CHUNKS decompressed chunks are buffered.
+    """
+
+    def __init__(self, source, name):
+        super().__init__()
+        self.name = name
+        self._source = source
+        self._queue = queue.Queue(PREFETCH_CHUNKS)
+        self._stop = threading.Event()
+        self._chunk = b""
+        self._pos = 0
+        self._eof = False
+        self._thread = threading.Thread(target=self._fill, daemon=True)
+        self._thread.start()
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _fill(self):
+        try:
+            while True:
+                chunk = self._source.read(CHUNK_SIZE)
+                if not self._put(chunk) or not chunk:
+                    return
+        except Exception as e:
+            self._put(e)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while self._pos >= len(self._chunk):
+            if self._eof:
+                return 0
+            item = self._queue.get()
+            if isinstance(item, Exception):
+                raise item
+            if not item:
+                self._eof = True
+                return 0
+            self._chunk, self._pos = item, 0
+        size = min(len(buffer), len(self._chunk) - self._pos)
+        buffer[:size] = self._chunk[self._pos : self._pos + size]
+        self._pos += size
+        return size
+
+    def close(self):
+        if not self.closed:
+            self._stop.set()
+            self._thread.join()
+            self._source.close()
+        super().close()
+
+
+def open_capture(path):
+    """Open a capture for reading, decompressing .gz/.zst as a stream
+
+    Compression is detected from the magic bytes, so a renamed file still
+    reads. Plain captures are returned as an ordinary file.
+    """
+    path = str(path)
+    compression = compression_of(path)
+    if compression is None:
+        return open(path, "rb")
+    if compression == "gzip":
+        source = gzip.open(path, "rb")
+    else:
+        zstandard = _require_zstandard()
+        source = zstandard.ZstdDecompressor().stream_reader(
+            open(path, "rb"), read_across_frames=True, closefd=True
+        )
+    return io.BufferedReader(PrefetchReader(source, path), CHUNK_SIZE)
+
+
+def open_capture_output(path):
+    """Open a capture for writing, compressing by the .gz/.zst suffix"""
+    path = str(path)
+    if path.endswith(".gz"):
+        return gzip.open(path, "wb", compresslevel=6)
+    if path.endswith(".zst"):
+        zstandard = _require_zstandard()
+        return zstandard.ZstdCompressor(level=3).stream_writer(
+            open(path, "wb"), closefd=True
+        )
+    return open(path, "wb")
+
+
+def is_compressed_name(path):
+    return str(path).endswith(COMPRESSED_SUFFIXES)
@@ -0,0 +1,57 @@
+from collections import deque
+
+from scapy.all import IP
+
+
+def dedup_key(packet):
+    """Return the parts of an IP packet that do not change between taps
+
+    TTL and the IP header checksum change at every hop and are left out.
+    """
+    ip = packet[IP]
+    l4 = ip.payload
+    return (
+        ip.src,
+        ip.dst,
+        ip.id,
+        ip.proto,
+        ip.len,
+        getattr(l4, "sport", 0),
+        getattr(l4, "dport", 0),
+        getattr(l4, "chksum", None),
+    )
+
+
+class Deduplicator:
+    """Drop packets already seen in another capture within a time window
+
+    Packets must be offered in time order. Keys older than ``window``
+    seconds are forgotten, so memory is bounded by the packet rate times
+    the window rather than by the capture size.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.seen = {}
+        self._order = deque()
+        self.dropped = 0
+        self.peak_keys = 0
+
+    def is_duplicate(self, key, ts, source):
+        cutoff = ts - self.window
+        while self._order and self._order[0][0] < cutoff:
+            old_ts, old_key = self._order.popleft()
+            entry = self.seen.get(old_key)
+            if entry is not None and entry[0] == old_ts:
+                del self.seen[old_key]
+
+        entry = self.seen.get(key)
+        if entry is not None and entry[1] != source:
+            self.dropped += 1
+            return True
+
+        self.seen[key] = (ts, source)
+        self._order.append((ts, key))
+        if len(self.seen) > self.peak_keys:
+            self.peak_keys = len(self.seen)
+        return False
@@ -0,0 +1,193 @@
+import math
+
+from .analyzer import analyze_pcap
+from .classify import port_applications, service_name
+from .export import find_table, is_export_dir, load_stats, load_timeline
+from .flowstore import (
+    load_capture,
+    load_timeline as load_stored_timeline,
+    store_capture,
+    store_timeline,
+)
+from .multianalyze import TimelineAggregator
+from .profiling import stage
+
+# Timeline entry fields compared per IP pair
+PAIR_FIELDS = ("packet_count", "total_bytes", "turns", "chattiness")
+
+
+def capture_tables(pcap_file, store=None):
+    """Aggregate tables of one capture, from the cheapest source available
+
+    An export directory is read as is. Otherwise the stats and single-capture
+    timeline kept in the flow store ``store`` are reused while the file is
+    unchanged; failing that the capture is analyzed in one pass and, with a
+    store, recorded there for the next diff. Returns (stats, timeline,
+    source), where timeline is None for an export without a timeline table.
+    """
+    if is_export_dir(pcap_file):
+        timeline = None
+        if find_table(pcap_file, "timeline"):
+            timeline = load_timeline(pcap_file)
+        return load_stats(pcap_file), timeline, "export"
+
+    if store:
+        with stage("load"):
+            stats = load_capture(store, pcap_file)
+            timeline = load_stored_timeline(store, [pcap_file])
+        if stats is not None and timeline is not None:
+            return stats, timeline, "store"
+
+    stats = analyze_pcap(pcap_file, aggregators=[TimelineAggregator()])
+    timeline = stats.pop("timeline")
+    if store:
+        with stage("store"):
+            store_capture(store, pcap_file, stats)
+            store_timeline(store, [pcap_file], timeline)
+    return stats, timeline, "analyzed"
+
+
+def _join(base, new):
+    """Full outer hash join of two dicts: (key, base value, new value)
+
+    A side missing the key gets None. Keys come in base order, then the
+    keys only in ``new`` in their order.
+    """
+    for key, a in base.items():
+        yield key, a, new.get(key)
+    for key, b in new.items():
+        if key not in base:
+            yield key, None, b
+
+
+def _share(count, total):
+    return count / total if total else 0.0
+
+
+def _log_ratio(a, b):
+    """How far b is from a, symmetric for growth and shrinkage"""
+    return abs(math.log((b + 1) / (a + 1)))
+
+
+def _mix(base, new, base_total, new_total):
+    """Join two count tables into rows ordered by share shift"""
+    rows = []
+    for key, a, b in _join(base, new):
+        a, b = a or 0, b or 0
+        shift = _share(b, new_total) - _share(a, base_total)
+        rows.append(
+            {
+                "key": key,
+                "base": a,
+                "new": b,
+                "base_share": _share(a, base_total),
+                "new_share": _share(b, new_total),
+                "shift": shift,
+            }
+        )
+    rows.sort(key=lambda r: abs(r["shift"]), reverse=True)
+    return rows
+
+
+def _conversation_changes(base, new):
+    added, vanished, changed = [], [], []
+    for key, a, b in _join(base, new):
+        if a is None:
+            added.append(b)
+        elif b is None:
+            vanished.append(a)
+        elif (a["packets"], a["bytes"]) != (b["packets"], b["bytes"]):
+            changed.append({"base": a, "new": b})
+    added.sort(key=lambda c: c["bytes"], reverse=True)
+    vanished.sort(key=lambda c: c["bytes"], reverse=True)
+    changed.sort(
+        key=lambda c: _log_ratio(c["base"]["bytes"], c["new"]["bytes"]), reverse=True
+    )
+    return added, vanished, changed
+
+
+def _pair_changes(base, new):
+    """Per IP pair joins of two timelines, largest behaviour change first"""
+    rows = []
+    base = {entry["ip_pair"]: entry for entry in base}
+    new = {entry["ip_pair"]: entry for entry in new}
+    for pair, a, b in _join(base, new):
+        if a is not None and b is not None:
+            if all(a[field] == b[field] for field in PAIR_FIELDS):
+                continue
+            score = _log_ratio(a["turns"], b["turns"]) + _log_ratio(
+                a["total_bytes"], b["total_bytes"]
+            )
+        else:
+            score = math.inf
+        rows.append({"ip_pair": pair, "base": a, "new": b, "score": score})
+    rows.sort(
+        key=lambda r: (r["score"], (r["new"] or r["base"])["total_bytes"]),
+        reverse=True,
+    )
+    return rows
+
+
+def diff_tables(base, new, base_timeline=None, new_timeline=None):
+    """Deltas between the stats (and optionally timelines) of two captures
+
+    Each table is joined on its key: protocols by name, ports by number,
+    conversations by endpoints and timeline entries by IP pair. Returns a
+    dict of totals, protocol and port mix rows, new/vanished/changed
+    conversations and pair rows (None without both timelines).
+    """
+    with stage("diff"):
+        totals = [
+            ("Packets", base["total_packets"], new["total_packets"]),
+            ("Bytes", base["total_bytes"], new["total_bytes"]),
+            ("Conversations", len(base["conversations"]), len(new["conversations"])),
+            ("Destination Ports", len(base["port_stats"]), len(new["port_stats"])),
+        ]
+        if base_timeline is not None and new_timeline is not None:
+            totals.append(("IP Pairs", len(base_timeline), len(new_timeline)))
+
+        ports = _mix(
+            {port: data["count"] for port, data in base["port_stats"].items()},
+            {port: data["count"] for port, data in new["port_stats"].items()},
+            base["total_packets"],
+            new["total_packets"],
+        )
+        # The new capture's classification wins for ports both classified
+        port_apps = {**port_applications(base), **port_applications(new)}
+        for row in ports:
+            row["service"] = service_name(row["key"], port_apps)
+
+        added, vanished, changed = _conversation_changes(
+            base["conversations"], new["conversations"]
+        )
+        pairs = None
+        if base_timeline is not None and new_timeline is not None:
+            pairs = _pair_changes(base_timeline, new_timeline)
+
+        return {
+            "totals": totals,
+            "protocols": _mix(
+                base["protocols"],
+                new["protocols"],
+                base["total_packets"],
+                new["total_packets"],
+            ),
+            "ports": ports,
+            "new_conversations": added,
+            "vanished_conversations": vanished,
+            "changed_conversations": changed,
+            "pairs": pairs,
+        }
+
+
+def diff_captures(base_file, new_file, store=None):
+    """Load both captures' tables (see capture_tables) and diff them
+
+    The result of diff_tables() also has ``sources``: where each side's
+    tables came from.
+    """
+    base, base_timeline, base_source = capture_tables(base_file, store)
+    new, new_timeline, new_source = capture_tables(new_file, store)
+    diff = diff_tables(base, new, base_timeline, new_timeline)
+    diff["sources"] = (base_source, new_source)
+    return diff
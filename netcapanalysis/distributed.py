@@ -0,0 +1,396 @@
+import json
+import os
+import socket
+import struct
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+from .analyzer import extract_packets, new_stats
+from .follow import (
+    PCAP_HEADER_LEN,
+    RECORD_HEADER_LEN,
+    AppendedRecords,
+    decode_stats,
+    encode_stats,
+    merge_stats,
+)
+from .multianalyze import TimelineAggregator, finish_pair, merge_pair
+from .pcapng import open_packets
+from .pipeline import Analyzer
+from .profiling import stage
+
+DEFAULT_PORT = 7878
+MODES = ("analyze", "timeline")
+# Workers send a heartbeat this often while working on a shard; a worker
+# silent for HEARTBEAT_TIMEOUT is treated as lost and its shard reassigned.
+HEARTBEAT_INTERVAL = 5
+HEARTBEAT_TIMEOUT = 30
+# Largest message accepted: hello, task, heartbeat and done messages are
+# small, shard results can be large. Anything bigger drops the connection.
+MAX_CONTROL_MESSAGE = 64 * 1024
+MAX_RESULT_MESSAGE = 1024 * 1024 * 1024
+
+PCAP_MAGIC = {
+    b"\xa1\xb2\xc3\xd4": ">",
+    b"\xd4\xc3\xb2\xa1": "<",
+    b"\xa1\xb2\x3c\x4d": ">",
+    b"\x4d\x3c\xb2\xa1": "<",
+}
+
+
+def parse_address(address, default_host="127.0.0.1"):
+    """Split ``host:port`` (or just ``port``) into a (host, port) tuple"""
+    host, sep, port = address.rpartition(":")
+    try:
+        return (host if sep else default_host), int(port)
+    except ValueError:
+        raise ValueError(f"invalid address '{address}', expected HOST:PORT") from None
+
+
+def send_message(sock, message):
+    """Send one length-prefixed JSON message"""
+    data = json.dumps(message).encode()
+    sock.sendall(struct.pack("!I", len(data)) + data)
+
+
+def _recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError("connection closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def recv_message(sock, max_size=MAX_CONTROL_MESSAGE):
+    """Receive one length-prefixed JSON message of at most ``max_size`` bytes"""
+    (size,) = struct.unpack("!I", _recv_exact(sock, 4))
+    if size > max_size:
+        raise ValueError(f"message of {size:,} bytes exceeds {max_size:,}")
+    return json.loads(_recv_exact(sock, size))
+
+
+def shard_ranges(pcap_file, shard_bytes):
+    """Split a classic pcap into record-aligned (start, end) byte ranges
+
+    Only record headers are read. Files no larger than ``shard_bytes``, and
+    pcapng or compressed files, are one shard covering the whole file:
+    ``(None, None)``.
+    """
+    size = os.path.getsize(pcap_file)
+    if not shard_bytes or size <= shard_bytes:
+        return [(None, None)]
+
+    with open(pcap_file, "rb") as f:
+        endian = PCAP_MAGIC.get(f.read(4))
+        if endian is None:
+            return [(None, None)]
+
+        ranges = []
+        start = offset = PCAP_HEADER_LEN
+        while offset + RECORD_HEADER_LEN <= size:
+            if offset - start >= shard_bytes:
+                ranges.append((start, offset))
+                start = offset
+            f.seek(offset)
+            caplen = struct.unpack(endian + "IIII", f.read(RECORD_HEADER_LEN))[2]
+            offset += RECORD_HEADER_LEN + caplen
+        ranges.append((start, min(offset, size)))
+    return ranges
+
+
+def plan_tasks(pcap_files, mode, shard_bytes=None):
+    """One task per shard of every capture, in capture order"""
+    tasks = []
+    for pcap_file in pcap_files:
+        path = os.path.abspath(pcap_file)
+        for start, end in shard_ranges(path, shard_bytes):
+            tasks.append(
+                {
+                    "id": len(tasks),
+                    "mode": mode,
+                    "path": path,
+                    "size": os.path.getsize(path),
+                    "start": start,
+                    "end": end,
+                }
+            )
+    return tasks
+
+
+def _check_capture(task):
+    """Fail unless this host sees the coordinator's capture at its path"""
+    path = task["path"]
+    try:
+        size = os.path.getsize(path)
+    except FileNotFoundError:
+        raise FileNotFoundError(
+            f"{path} not found; workers need the captures at the coordinator's"
+            " paths (e.g. a shared mount)"
+        ) from None
+    if size != task["size"]:
+        raise ValueError(
+            f"{path} is {size:,} bytes here but {task['size']:,} on the coordinator"
+        )
+
+
+def run_task(task):
+    """Analyze one shard and return its mergeable partial result
+
+    The capture is read from ``task["path"]``, so coordinator and workers
+    must share a filesystem; a missing or different file is an error.
+    """
+    _check_capture(task)
+    path = task["path"]
+    reader = open_packets(path)
+    with reader:
+        if task["start"] is None:
+            packets = reader
+        else:
+            packets = AppendedRecords(reader, task["start"], task["end"])
+
+        if task["mode"] == "analyze":
+            stats = new_stats()
+            extract_packets(packets, stats)
+            return encode_stats(stats)
+
+        timeline = TimelineAggregator()
+        Analyzer([timeline]).feed(packets, Path(path).name)
+        return {
+            "count": timeline.count,
+            "pairs": [
+                {"ip_pair": list(key), **data, "files": sorted(data["files"])}
+                for key, data in timeline.pairs.merged()
+            ],
+        }
+
+
+def merge_analyze(results):
+    """Merge partial stats, in capture order, into one analyze_pcap() result"""
+    stats = decode_stats(results[0])
+    for partial in results[1:]:
+        merge_stats(stats, decode_stats(partial))
+    return stats
+
+
+def merge_timeline(results):
+    """Merge partial pair tables, in capture order, into a timeline
+
+    Each shard numbers its packets from 1, so indices are shifted by the
+    number of IP packets in the shards before it.
+    """
+    pairs = {}
+    next_idx = 0
+    for partial in results:
+        for entry in partial["pairs"]:
+            data = dict(entry)
+            key = tuple(data.pop("ip_pair"))
+            data["files"] = set(data["files"])
+            data["first_idx"] += next_idx
+            data["last_idx"] += next_idx
+            pairs[key] = merge_pair(pairs[key], data) if key in pairs else data
+        next_idx += partial["count"]
+
+    timeline = [finish_pair(key, data) for key, data in pairs.items()]
+    timeline.sort(key=lambda x: x["first_idx"])
+    return timeline
+
+
+def _describe(task):
+    name = Path(task["path"]).name
+    if task["start"] is None:
+        return name
+    return f"{name}[{task['start']}:{task['end']}]"
+
+
+class Coordinator:
+    """Hand shards to workers over TCP and collect their partial results
+
+    Each worker connection is served by its own thread. A shard whose
+    worker disconnects, stops sending heartbeats, sends a malformed message
+    or reports an error goes back to the queue, preferring a different
+    worker, and the run fails once a shard has been retried ``retries``
+    times.
+    """
+
+    def __init__(self, tasks, host, port, retries=3, log=None):
+        self.tasks = tasks
+        self.host = host
+        self.port = port
+        self.retries = retries
+        self.log = log or (lambda message: None)
+        self.results = [None] * len(tasks)
+        self.pending = deque(range(len(tasks)))
+        self.attempts = [0] * len(tasks)
+        self.failed_on = [set() for _ in tasks]
+        self.workers = set()
+        self.completed = 0
+        self.error = None
+        self.cond = threading.Condition()
+
+    def _finished(self):
+        return self.error is not None or self.completed == len(self.tasks)
+
+    def run(self):
+        """Serve workers until every shard has a result; return the results"""
+        server = socket.create_server((self.host, self.port))
+        server.settimeout(0.5)
+        self.port = server.getsockname()[1]
+        self.log(f"Coordinator listening on {self.host}:{self.port}")
+        handlers = []
+        try:
+            while True:
+                with self.cond:
+                    if self._finished():
+                        break
+                try:
+                    conn, _ = server.accept()
+                except socket.timeout:
+                    continue
+                handler = threading.Thread(
+                    target=self._serve, args=(conn,), daemon=True
+                )
+                handler.start()
+                handlers.append(handler)
+        finally:
+            server.close()
+            with self.cond:
+                self.cond.notify_all()
+            # Let idle workers receive "done" before the caller moves on.
+            for handler in handlers:
+                handler.join(timeout=5)
+
+        if self.error:
+            raise RuntimeError(self.error)
+        return self.results
+
+    def _next_task(self, worker):
+        with self.cond:
+            while not self._finished():
+                # Prefer shards this worker has not failed; hand one back to
+                # it only if every connected worker has failed that shard.
+                for i, task_id in enumerate(self.pending):
+                    if worker not in self.failed_on[task_id]:
+                        del self.pending[i]
+                        return task_id
+                for i, task_id in enumerate(self.pending):
+                    if self.workers <= self.failed_on[task_id]:
+                        del self.pending[i]
+                        return task_id
+                self.cond.wait(1)
+            return None
+
+    def _complete(self, task_id, result):
+        with self.cond:
+            self.results[task_id] = result
+            self.completed += 1
+            self.cond.notify_all()
+
+    def _fail(self, task_id, worker, reason):
+        with self.cond:
+            self.attempts[task_id] += 1
+            self.failed_on[task_id].add(worker)
+            description = _describe(self.tasks[task_id])
+            if self.attempts[task_id] > self.retries:
+                self.error = (
+                    f"{description} failed after {self.retries} retries: {reason}"
+                )
+            else:
+                self.log(f"Retrying {description} ({worker}: {reason})")
+                self.pending.appendleft(task_id)
+            self.cond.notify_all()
+
+    def _serve(self, conn):
+        worker = None
+        task_id = None
+        conn.settimeout(HEARTBEAT_TIMEOUT)
+        try:
+            hello = recv_message(conn)
+            worker = hello.get("worker", "worker")
+            with self.cond:
+                self.workers.add(worker)
+                self.cond.notify_all()
+            self.log(f"Worker connected: {worker}")
+
+            while True:
+                task_id = self._next_task(worker)
+                if task_id is None:
+                    send_message(conn, {"type": "done"})
+                    return
+                send_message(conn, {"type": "task", **self.tasks[task_id]})
+                message = recv_message(conn, MAX_RESULT_MESSAGE)
+                while message["type"] == "heartbeat":
+                    message = recv_message(conn, MAX_RESULT_MESSAGE)
+                if message["type"] == "result":
+                    self._complete(task_id, message["result"])
+                else:
+                    self._fail(task_id, worker, message.get("error", "unknown error"))
+                task_id = None
+        except Exception as e:
+            # Anything from a dead socket to a malformed message: requeue the
+            # shard and drop the connection
+            reason = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+            if task_id is not None:
+                self._fail(task_id, worker, f"worker lost ({reason})")
+            else:
+                self.log(f"Dropped {worker or 'connection'} ({reason})")
+        finally:
+            conn.close()
+            if worker is not None:
+                with self.cond:
+                    self.workers.discard(worker)
+                    self.cond.notify_all()
+
+
+def run_worker(host, port, name=None, connect_timeout=30, log=None):
+    """Process shards from a coordinator until it has none left
+
+    Returns the number of shards processed.
+    """
+    log = log or (lambda message: None)
+    name = name or f"{socket.gethostname()}:{os.getpid()}"
+    deadline = time.monotonic() + connect_timeout
+    while True:
+        try:
+            sock = socket.create_connection((host, port))
+            break
+        except OSError:
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(1)
+
+    send_lock = threading.Lock()
+    processed = 0
+    with sock:
+        send_message(sock, {"type": "hello", "worker": name})
+        while True:
+            message = recv_message(sock)
+            if message["type"] == "done":
+                return processed
+
+            stop = threading.Event()
+
+            def heartbeat():
+                while not stop.wait(HEARTBEAT_INTERVAL):
+                    with send_lock:
+                        send_message(sock, {"type": "heartbeat"})
+
+            beat = threading.Thread(target=heartbeat, daemon=True)
+            beat.start()
+            try:
+                with stage(f"shard:{_describe(message)}", hot=True):
+                    reply = {"type": "result", "result": run_task(message)}
+                log(f"Processed {_describe(message)}")
+            except Exception as e:
+                reply = {"type": "error", "error": str(e) or type(e).__name__}
+                log(f"Failed {_describe(message)}: {reply['error']}")
+            finally:
+                stop.set()
+                beat.join()
+            with send_lock:
+                send_message(sock, reply)
+            processed += 1
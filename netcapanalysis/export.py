@@ -0,0 +1,586 @@
+import csv
+import sys
+from array import array
+from pathlib import Path
+
+from .analyzer import (
+    ConversationAggregator,
+    conversation_table,
+    new_stats,
+    stats_aggregators,
+)
+from .classify import CLASSIFY_PACKETS, AppClassifier
+from .multianalyze import TimelineAggregator
+from .pipeline import Aggregator, Analyzer, PacketInfo
+from .profiling import stage
+from .spill import SpillDir, budget_entries
+
+FORMATS = {"parquet": ".parquet", "arrow": ".arrow", "csv": ".csv"}
+
+TABLES = ["packets", "conversations", "timeline", "applications"]
+
+# Conversations of a capture held in memory before they spill to disk
+CONVERSATION_BUDGET_MB = 256
+
+PACKET_COLUMNS = [
+    ("idx", "int64"),
+    ("file", "string"),
+    ("time", "float64"),
+    ("src", "string"),
+    ("dst", "string"),
+    ("src_port", "int32"),
+    ("dst_port", "int32"),
+    ("protocol", "string"),
+    ("length", "int32"),
+    ("interface", "string"),
+]
+
+CONVERSATION_COLUMNS = [
+    ("file", "string"),
+    ("key", "string"),
+    ("src", "string"),
+    ("src_port", "int32"),
+    ("dst", "string"),
+    ("dst_port", "int32"),
+    ("packets", "int64"),
+    ("bytes", "int64"),
+    ("protocols", "string"),
+]
+
+TIMELINE_COLUMNS = [
+    ("src", "string"),
+    ("dst", "string"),
+    ("ip_a", "string"),
+    ("ip_b", "string"),
+    ("packet_count", "int64"),
+    ("total_bytes", "int64"),
+    ("avg_packet_size", "float64"),
+    ("turns", "int64"),
+    ("chattiness", "float64"),
+    ("first_idx", "int64"),
+    ("last_idx", "int64"),
+    ("files", "string"),
+]
+
+APPLICATION_COLUMNS = [
+    ("app", "string"),
+    ("name", "string"),
+    ("port", "int32"),
+    ("flows", "int64"),
+    ("packets", "int64"),
+    ("bytes", "int64"),
+]
+
+SCHEMAS = {
+    "packets": PACKET_COLUMNS,
+    "conversations": CONVERSATION_COLUMNS,
+    "timeline": TIMELINE_COLUMNS,
+    "applications": APPLICATION_COLUMNS,
+}
+
+_CSV_TYPES = {"int32": int, "int64": int, "float64": float, "string": str}
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+
+        return pyarrow
+    except ImportError:
+        print(
+            "Error: parquet/arrow export requires pyarrow (pip install pyarrow)",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
+
+def _arrow_schema(pa, columns):
+    types = {
+        "int32": pa.int32(),
+        "int64": pa.int64(),
+        "float64": pa.float64(),
+        "string": pa.string(),
+    }
+    return pa.schema([(name, types[kind]) for name, kind in columns])
+
+
+class TableWriter:
+    """Write rows to a columnar file in bounded row groups"""
+
+    def __init__(self, path, fmt, columns, row_group_size=65536):
+        self.path = Path(path)
+        self.fmt = fmt
+        self.columns = columns
+        self.names = [name for name, _ in columns]
+        self.row_group_size = row_group_size
+        self.rows_written = 0
+        self._buffer = []
+
+        if fmt == "csv":
+            self._fh = open(self.path, "w", newline="")
+            self._writer = csv.writer(self._fh)
+            self._writer.writerow(self.names)
+            return
+
+        pa = _require_pyarrow()
+        self._pa = pa
+        self._schema = _arrow_schema(pa, columns)
+        if fmt == "parquet":
+            import pyarrow.parquet as pq
+
+            self._writer = pq.ParquetWriter(str(self.path), self._schema)
+        else:
+            import pyarrow.ipc as ipc
+
+            self._fh = pa.OSFile(str(self.path), "wb")
+            self._writer = ipc.new_file(self._fh, self._schema)
+
+    def write(self, row):
+        """Buffer one row (a tuple in column order)"""
+        self._buffer.append(row)
+        if len(self._buffer) >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+
+        if self.fmt == "csv":
+            self._writer.writerows(self._buffer)
+        else:
+            columns = list(zip(*self._buffer))
+            batch = self._pa.record_batch(
+                [
+                    self._pa.array(col, type=field.type)
+                    for col, field in zip(columns, self._schema)
+                ],
+                schema=self._schema,
+            )
+            self._writer.write_batch(batch)
+
+        self.rows_written += len(self._buffer)
+        self._buffer = []
+
+    def close(self):
+        self.flush()
+        if self.fmt != "csv":
+            self._writer.close()
+        if self.fmt != "parquet":
+            self._fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def read_table(path, columns=None):
+    """Read an exported table back as a dict of column lists"""
+    path = Path(path)
+    suffix = path.suffix
+
+    if suffix == ".csv":
+        table_name = path.stem
+        kinds = dict(SCHEMAS.get(table_name, []))
+        with open(path, newline="") as fh:
+            reader = csv.reader(fh)
+            names = next(reader)
+            wanted = columns or names
+            positions = [names.index(c) for c in wanted]
+            convert = [_CSV_TYPES[kinds.get(c, "string")] for c in wanted]
+            data = {c: [] for c in wanted}
+            for row in reader:
+                for c, pos, conv in zip(wanted, positions, convert):
+                    value = row[pos]
+                    if conv is not str:
+                        value = conv(value) if value != "" else None
+                    data[c].append(value)
+        return data
+
+    pa = _require_pyarrow()
+    if suffix == ".parquet":
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(str(path), columns=columns)
+    else:
+        import pyarrow.ipc as ipc
+
+        with pa.memory_map(str(path), "r") as source:
+            table = ipc.open_file(source).read_all()
+        if columns:
+            table = table.select(columns)
+
+    return table.to_pydict()
+
+
+def iter_table(path, columns, rows=65536):
+    """Read an exported table a row group at a time, as dicts of column lists
+
+    CSV files are read ``rows`` rows at a time. Columns the file lacks,
+    e.g. ``interface`` in exports written before it was added, are None.
+    """
+    path = Path(path)
+    suffix = path.suffix
+
+    if suffix == ".csv":
+        kinds = dict(SCHEMAS.get(path.stem, []))
+        with open(path, newline="") as fh:
+            reader = csv.reader(fh)
+            names = next(reader)
+            positions = [names.index(c) if c in names else None for c in columns]
+            convert = [_CSV_TYPES[kinds.get(c, "string")] for c in columns]
+            while True:
+                group = [row for _, row in zip(range(rows), reader)]
+                if not group:
+                    return
+                data = {}
+                for c, pos, conv in zip(columns, positions, convert):
+                    if pos is None:
+                        data[c] = [None] * len(group)
+                    elif conv is str:
+                        data[c] = [row[pos] for row in group]
+                    else:
+                        data[c] = [
+                            conv(row[pos]) if row[pos] != "" else None for row in group
+                        ]
+                yield data
+
+    pa = _require_pyarrow()
+    if suffix == ".parquet":
+        import pyarrow.parquet as pq
+
+        source = pq.ParquetFile(str(path))
+        names = source.schema_arrow.names
+        present = [c for c in columns if c in names]
+        groups = (
+            source.read_row_group(i, columns=present)
+            for i in range(source.num_row_groups)
+        )
+    else:
+        import pyarrow.ipc as ipc
+
+        source = ipc.open_file(pa.memory_map(str(path), "r"))
+        names = source.schema.names
+        present = [c for c in columns if c in names]
+        groups = (
+            source.get_batch(i).select(present)
+            for i in range(source.num_record_batches)
+        )
+
+    for group in groups:
+        data = group.to_pydict()
+        for c in columns:
+            if c not in data:
+                data[c] = [None] * group.num_rows
+        yield data
+
+
+def find_table(export_dir, table):
+    """Return the path of an exported table in any supported format"""
+    for suffix in FORMATS.values():
+        path = Path(export_dir) / f"{table}{suffix}"
+        if path.exists():
+            return path
+    return None
+
+
+def is_export_dir(path):
+    """Check whether a path is a directory written by export_tables"""
+    path = Path(path)
+    return path.is_dir() and find_table(path, "packets") is not None
+
+
+class ExportedPacket(PacketInfo):
+    """A packets-table row as the PacketInfo the stats aggregators read
+
+    Payloads are not exported, so ``packet`` is None and the application
+    classifier cannot run on these; neither are TCP flags.
+    """
+
+    __slots__ = ()
+
+    def __init__(
+        self, file, time, src, dst, src_port, dst_port, protocol, length, interface
+    ):
+        self.packet = None
+        self.file = file
+        self.time = time
+        self.length = length
+        self.interface = interface or None
+        # Non-IP packets have no source: null in parquet/arrow, empty in CSV.
+        self.src = src or None
+        self.dst = dst or None
+        self.src_port = src_port or 0
+        self.dst_port = dst_port or 0
+        self.protocol = protocol
+        self.tcp_flags = 0
+
+
+class PacketRowAggregator(Aggregator):
+    """Write one packets-table row per packet"""
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.idx = 0
+
+    def update(self, info):
+        self.idx += 1
+        self.writer.write(
+            (
+                self.idx,
+                info.file,
+                info.time,
+                info.src,
+                info.dst,
+                info.src_port,
+                info.dst_port,
+                info.protocol,
+                info.length,
+                info.interface,
+            )
+        )
+
+    def finalize(self, result):
+        self.writer.close()
+        result["packets"] = self.writer.rows_written
+
+
+class ApplicationRowAggregator(Aggregator):
+    """Write applications-table rows: classified flows per application, name
+    and server port, as analyze reports them
+    """
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.classifier = AppClassifier({"app_flows": {}}, fold=True)
+
+    def update(self, info):
+        self.classifier.update(info)
+
+    def finalize(self, result):
+        folded = {}
+        self.classifier.finalize(folded)
+        for flow in folded["app_flows"].values():
+            self.writer.write(
+                (
+                    flow["app"],
+                    flow["name"] or "",
+                    flow["port"],
+                    flow["flows"],
+                    flow["packets"],
+                    flow["bytes"],
+                )
+            )
+        self.writer.close()
+        result["applications"] = self.writer.rows_written
+
+
+class ConversationRowAggregator(Aggregator):
+    """Write conversations-table rows, per capture, when each capture ends
+
+    Each capture's conversations are kept by a ConversationAggregator, as in
+    analyze --memory-budget, whose table spills to disk past
+    ``max_entries``.
+    """
+
+    def __init__(self, writer, max_entries=None):
+        self.writer = writer
+        self.max_entries = max_entries or budget_entries(CONVERSATION_BUDGET_MB)
+        self.file = None
+        self.stats = None
+        self.conversations = None
+        self.spill_dir = None
+
+    def update(self, info):
+        if info.file != self.file:
+            self._flush()
+            self.file = info.file
+            self.stats = {"conversations": {}, "total_packets": 0}
+            self.spill_dir = SpillDir()
+            self.conversations = ConversationAggregator(
+                self.stats,
+                spill_table=conversation_table(self.max_entries, self.spill_dir),
+            )
+        # Orders conversations by first packet, as TotalsAggregator does
+        self.stats["total_packets"] += 1
+        self.conversations.update(info)
+
+    def _flush(self):
+        if self.conversations is None:
+            return
+        result = {}
+        self.conversations.finalize(result)
+        for key, conv in result["conversations"].items():
+            self.writer.write(
+                (
+                    self.file,
+                    key,
+                    conv["src"],
+                    conv["src_port"],
+                    conv["dst"],
+                    conv["dst_port"],
+                    conv["packets"],
+                    conv["bytes"],
+                    ", ".join(sorted(conv["protocols"])),
+                )
+            )
+        self.spill_dir.close()
+        self.conversations = None
+
+    def finalize(self, result):
+        self._flush()
+        self.writer.close()
+        result["conversations"] = self.writer.rows_written
+
+
+def export_tables(
+    pcap_files, output_dir, fmt="parquet", tables=None, row_group_size=65536
+):
+    """Export packet, conversation and timeline tables for pcap files
+
+    Every table is filled from one streaming pass over the captures, and
+    rows are written in row groups of ``row_group_size`` rows. Returns a
+    dict of table name to row count.
+    """
+    tables = tables or TABLES
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    suffix = FORMATS[fmt]
+
+    analyzer = Analyzer()
+    if "packets" in tables:
+        analyzer.add(
+            PacketRowAggregator(
+                TableWriter(
+                    output_dir / f"packets{suffix}", fmt, PACKET_COLUMNS, row_group_size
+                )
+            )
+        )
+    if "conversations" in tables:
+        analyzer.add(
+            ConversationRowAggregator(
+                TableWriter(
+                    output_dir / f"conversations{suffix}",
+                    fmt,
+                    CONVERSATION_COLUMNS,
+                    row_group_size,
+                )
+            )
+        )
+    if "timeline" in tables:
+        analyzer.add(TimelineAggregator())
+    if "applications" in tables:
+        analyzer.add(
+            ApplicationRowAggregator(
+                TableWriter(
+                    output_dir / f"applications{suffix}",
+                    fmt,
+                    APPLICATION_COLUMNS,
+                    row_group_size,
+                )
+            )
+        )
+
+    result = analyzer.run(pcap_files)
+    counts = {
+        table: result[table]
+        for table in ("packets", "conversations", "applications")
+        if table in tables
+    }
+
+    if "timeline" in tables:
+        with TableWriter(
+            output_dir / f"timeline{suffix}", fmt, TIMELINE_COLUMNS, row_group_size
+        ) as writer:
+            for conv in result["timeline"]:
+                writer.write(
+                    (
+                        conv["src"],
+                        conv["dst"],
+                        conv["ip_pair"][0],
+                        conv["ip_pair"][1],
+                        conv["packet_count"],
+                        conv["total_bytes"],
+                        conv["avg_packet_size"],
+                        conv["turns"],
+                        conv["chattiness"],
+                        conv["first_idx"],
+                        conv["last_idx"],
+                        ";".join(sorted(conv["files"])),
+                    )
+                )
+        counts["timeline"] = writer.rows_written
+
+    return counts
+
+
+def load_stats(export_dir):
+    """Rebuild the analyze_pcap statistics dict from an export directory
+
+    The packets table is read a row group at a time through the same stats
+    aggregators analyze_pcap runs, so the report matches one made from the
+    captures. Application verdicts come from the applications table, as
+    payloads are not exported.
+    """
+    stats = new_stats()
+    stats["lengths"] = array("I")
+    analyzer = Analyzer(stats_aggregators(stats, classify=False))
+    columns = [name for name, _ in PACKET_COLUMNS if name != "idx"]
+    with stage("extract", hot=True) as extract:
+        for group in iter_table(find_table(export_dir, "packets"), columns):
+            analyzer.feed_decoded(
+                map(ExportedPacket, *(group[name] for name in columns))
+            )
+        extract.packets = analyzer.packets
+    result = analyzer.results()
+
+    app_flows = result["app_flows"] = {}
+    path = find_table(export_dir, "applications")
+    if path:
+        columns = [name for name, _ in APPLICATION_COLUMNS]
+        for group in iter_table(path, columns):
+            for app, name, port, flows, packets, bytes_ in zip(
+                *(group[c] for c in columns)
+            ):
+                app_flows[f"{app} {port} {name or None}"] = {
+                    "inspected": CLASSIFY_PACKETS,
+                    "app": app,
+                    "name": name or None,
+                    "port": port,
+                    "packets": packets,
+                    "bytes": bytes_,
+                    "flows": flows,
+                }
+    return result
+
+
+def load_timeline(export_dir):
+    """Rebuild the analyze_multi_capture timeline list from an export directory"""
+    path = find_table(export_dir, "timeline")
+    if path is None:
+        print(f"Error: no timeline table in '{export_dir}'", file=sys.stderr)
+        sys.exit(1)
+
+    table = read_table(path)
+    timeline = []
+    for i in range(len(table["src"])):
+        timeline.append(
+            {
+                "ip_pair": (table["ip_a"][i], table["ip_b"][i]),
+                "src": table["src"][i],
+                "dst": table["dst"][i],
+                "packet_count": table["packet_count"][i],
+                "total_bytes": table["total_bytes"][i],
+                "avg_packet_size": table["avg_packet_size"][i],
+                "turns": table["turns"][i],
+                "chattiness": table["chattiness"][i],
+                "first_idx": table["first_idx"][i],
+                "last_idx": table["last_idx"][i],
+                "packets": [],
+                "files": table["files"][i].split(";") if table["files"][i] else [],
+            }
+        )
+
+    timeline.sort(key=lambda x: x["first_idx"])
+    return timeline
@@ -0,0 +1,242 @@
+import csv
+from collections import OrderedDict, deque
+
+from .pipeline import PORT_SERVICES
+
+TCP_FIN = 0x01
+TCP_SYN = 0x02
+TCP_RST = 0x04
+TCP_ACK = 0x10
+
+SPILL_COLUMNS = [
+    "src",
+    "src_port",
+    "dst",
+    "dst_port",
+    "protocol",
+    "first_time",
+    "last_time",
+    "packets",
+    "bytes",
+    "packets_fwd",
+    "packets_rev",
+    "bytes_fwd",
+    "bytes_rev",
+    "end_reason",
+]
+
+
+def flow_key(protocol, src, src_port, dst, dst_port):
+    """Return a direction-independent 5-tuple key"""
+    if (src, src_port) <= (dst, dst_port):
+        return (protocol, src, src_port, dst, dst_port)
+    return (protocol, dst, dst_port, src, src_port)
+
+
+def _server_port(port, other):
+    """Whether ``port`` looks like the service side of a flow with ``other``
+
+    A well-known port wins; otherwise the lower port does.
+    """
+    if (port in PORT_SERVICES) != (other in PORT_SERVICES):
+        return port in PORT_SERVICES
+    return port <= other
+
+
+def _swap(flow):
+    """Turn a flow around, so its responder becomes its initiator"""
+    for a, b in (
+        ("src", "dst"),
+        ("src_port", "dst_port"),
+        ("packets_fwd", "packets_rev"),
+        ("bytes_fwd", "bytes_rev"),
+        ("fin_fwd", "fin_rev"),
+    ):
+        flow[a], flow[b] = flow[b], flow[a]
+
+
+class FlowTable:
+    """Live bidirectional flow table with idle-timeout eviction
+
+    Flows are kept in least-recently-active order, so idle flows are found
+    at the front without scanning the table. TCP flows are closed early
+    once both sides sent FIN or either side sent RST, after ``close_linger``
+    seconds to absorb trailing ACKs.
+
+    The initiator is the sender of a SYN without ACK when one is seen, so a
+    flow first seen mid-stream, or from the server, is turned around then.
+    Until then the side with the well-known, else the lower, port is taken
+    as the responder.
+
+    Evicted flows are folded into ``rollups`` keyed by initiator, responder,
+    responder port and protocol, and optionally written to a CSV spill file.
+    ``on_evict``, if set, is called with each evicted flow record.
+    """
+
+    def __init__(self, idle_timeout=60.0, close_linger=2.0, spill_path=None):
+        self.idle_timeout = idle_timeout
+        self.close_linger = close_linger
+        self.flows = OrderedDict()
+        self.rollups = {}
+        self.counters = {
+            "flows": 0,
+            "expired_idle": 0,
+            "closed": 0,
+            "flushed": 0,
+            "peak_live": 0,
+        }
+        self._closing = deque()
+        self.on_evict = None
+        self._spill_fh = None
+        self._spill = None
+        if spill_path:
+            self._spill_fh = open(spill_path, "w", newline="")
+            self._spill = csv.writer(self._spill_fh)
+            self._spill.writerow(SPILL_COLUMNS)
+
+    def update(self, ts, protocol, src, src_port, dst, dst_port, length, tcp_flags=0):
+        key = flow_key(protocol, src, src_port, dst, dst_port)
+        flow = self.flows.get(key)
+
+        syn = tcp_flags & (TCP_SYN | TCP_ACK) == TCP_SYN
+        if flow is None:
+            if tcp_flags & TCP_SYN:
+                # A SYN-ACK comes from the responder
+                initiator = syn
+            else:
+                initiator = _server_port(dst_port, src_port)
+            client, client_port, server, server_port = (
+                (src, src_port, dst, dst_port)
+                if initiator
+                else (dst, dst_port, src, src_port)
+            )
+            flow = {
+                "src": client,
+                "src_port": client_port,
+                "dst": server,
+                "dst_port": server_port,
+                "protocol": protocol,
+                "first_time": ts,
+                "last_time": ts,
+                "packets_fwd": 0,
+                "packets_rev": 0,
+                "bytes_fwd": 0,
+                "bytes_rev": 0,
+                "fin_fwd": False,
+                "fin_rev": False,
+                "closed_at": None,
+            }
+            self.flows[key] = flow
+            self.counters["flows"] += 1
+            if len(self.flows) > self.counters["peak_live"]:
+                self.counters["peak_live"] = len(self.flows)
+        else:
+            self.flows.move_to_end(key)
+
+        forward = src == flow["src"] and src_port == flow["src_port"]
+        if syn and not forward:
+            _swap(flow)
+            forward = True
+        if forward:
+            flow["packets_fwd"] += 1
+            flow["bytes_fwd"] += length
+        else:
+            flow["packets_rev"] += 1
+            flow["bytes_rev"] += length
+        flow["last_time"] = ts
+
+        if tcp_flags and flow["closed_at"] is None:
+            if tcp_flags & TCP_FIN:
+                flow["fin_fwd" if forward else "fin_rev"] = True
+            if tcp_flags & TCP_RST or (flow["fin_fwd"] and flow["fin_rev"]):
+                flow["closed_at"] = ts
+                self._closing.append((ts + self.close_linger, key, ts))
+
+        self.expire(ts)
+
+    def expire(self, now):
+        """Evict flows idle for longer than the timeout and closed flows"""
+        while self._closing and self._closing[0][0] <= now:
+            _, key, closed_at = self._closing.popleft()
+            flow = self.flows.get(key)
+            # A flow that reused the key of an evicted one has its own entry
+            if flow is not None and flow["closed_at"] == closed_at:
+                del self.flows[key]
+                self._evict(flow, "closed")
+
+        cutoff = now - self.idle_timeout
+        while self.flows:
+            key, flow = next(iter(self.flows.items()))
+            if flow["last_time"] > cutoff:
+                break
+            del self.flows[key]
+            self._evict(flow, "expired_idle")
+
+    def flush(self):
+        """Evict every remaining flow, e.g. at end of capture"""
+        while self.flows:
+            _, flow = self.flows.popitem(last=False)
+            self._evict(flow, "flushed")
+        self._closing.clear()
+        if self._spill_fh:
+            self._spill_fh.close()
+            self._spill_fh = None
+            self._spill = None
+
+    def _evict(self, flow, reason):
+        self.counters[reason] += 1
+        if self.on_evict is not None:
+            self.on_evict(flow)
+        packets = flow["packets_fwd"] + flow["packets_rev"]
+        bytes_ = flow["bytes_fwd"] + flow["bytes_rev"]
+
+        rollup_key = (flow["src"], flow["dst"], flow["dst_port"], flow["protocol"])
+        rollup = self.rollups.get(rollup_key)
+        if rollup is None:
+            rollup = self.rollups[rollup_key] = {
+                "src": flow["src"],
+                "dst": flow["dst"],
+                # Initiator ports are collapsed; reports show them as *
+                "src_port": 0,
+                "any_src_port": True,
+                "dst_port": flow["dst_port"],
+                "protocols": {flow["protocol"]},
+                "packets": 0,
+                "bytes": 0,
+                "flows": 0,
+                "first_time": flow["first_time"],
+                "last_time": flow["last_time"],
+            }
+        rollup["packets"] += packets
+        rollup["bytes"] += bytes_
+        rollup["flows"] += 1
+        rollup["first_time"] = min(rollup["first_time"], flow["first_time"])
+        rollup["last_time"] = max(rollup["last_time"], flow["last_time"])
+
+        if self._spill:
+            self._spill.writerow(
+                [
+                    flow["src"],
+                    flow["src_port"],
+                    flow["dst"],
+                    flow["dst_port"],
+                    flow["protocol"],
+                    flow["first_time"],
+                    flow["last_time"],
+                    packets,
+                    bytes_,
+                    flow["packets_fwd"],
+                    flow["packets_rev"],
+                    flow["bytes_fwd"],
+                    flow["bytes_rev"],
+                    reason,
+                ]
+            )
+
+    def conversations(self):
+        """Return rollups in the analyze_pcap conversation format"""
+        result = {}
+        for (src, dst, dst_port, protocol), rollup in self.rollups.items():
+            key = f"{src}:* <-> {dst}:{dst_port} ({protocol})"
+            result[key] = rollup
+        return result
@@ -0,0 +1,650 @@
+import base64
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime
+from pathlib import Path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS captures (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    size INTEGER,
+    mtime REAL,
+    first_time REAL,
+    last_time REAL,
+    total_packets INTEGER,
+    total_bytes INTEGER,
+    analyzed_at REAL
+);
+
+CREATE TABLE IF NOT EXISTS conversations (
+    capture_id INTEGER NOT NULL REFERENCES captures(id) ON DELETE CASCADE,
+    src TEXT NOT NULL,
+    src_port INTEGER NOT NULL,
+    dst TEXT NOT NULL,
+    dst_port INTEGER NOT NULL,
+    packets INTEGER NOT NULL,
+    bytes INTEGER NOT NULL,
+    protocols TEXT,
+    first_time REAL,
+    last_time REAL
+);
+CREATE INDEX IF NOT EXISTS idx_conv_src ON conversations(src, src_port);
+CREATE INDEX IF NOT EXISTS idx_conv_dst ON conversations(dst, dst_port);
+CREATE INDEX IF NOT EXISTS idx_conv_src_port ON conversations(src_port);
+CREATE INDEX IF NOT EXISTS idx_conv_dst_port ON conversations(dst_port);
+CREATE INDEX IF NOT EXISTS idx_conv_time ON conversations(first_time, last_time);
+CREATE INDEX IF NOT EXISTS idx_conv_capture ON conversations(capture_id);
+CREATE INDEX IF NOT EXISTS idx_conv_capture_packets ON conversations(capture_id, packets);
+CREATE INDEX IF NOT EXISTS idx_conv_capture_bytes ON conversations(capture_id, bytes);
+
+CREATE TABLE IF NOT EXISTS protocols (
+    capture_id INTEGER NOT NULL REFERENCES captures(id) ON DELETE CASCADE,
+    protocol TEXT NOT NULL,
+    count INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_protocols_capture ON protocols(capture_id);
+
+CREATE TABLE IF NOT EXISTS ports (
+    capture_id INTEGER NOT NULL REFERENCES captures(id) ON DELETE CASCADE,
+    port INTEGER NOT NULL,
+    protocol TEXT,
+    count INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_ports_port ON ports(port);
+CREATE INDEX IF NOT EXISTS idx_ports_capture ON ports(capture_id);
+
+CREATE TABLE IF NOT EXISTS timelines (
+    id INTEGER PRIMARY KEY,
+    files TEXT NOT NULL,
+    created_at REAL
+);
+
+CREATE TABLE IF NOT EXISTS timeline_pairs (
+    timeline_id INTEGER NOT NULL REFERENCES timelines(id) ON DELETE CASCADE,
+    ip_a TEXT NOT NULL,
+    ip_b TEXT NOT NULL,
+    src TEXT,
+    dst TEXT,
+    packet_count INTEGER,
+    total_bytes INTEGER,
+    avg_packet_size REAL,
+    turns INTEGER,
+    chattiness REAL,
+    first_time REAL,
+    last_time REAL,
+    files TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_pairs_a ON timeline_pairs(ip_a);
+CREATE INDEX IF NOT EXISTS idx_pairs_b ON timeline_pairs(ip_b);
+CREATE INDEX IF NOT EXISTS idx_pairs_time ON timeline_pairs(first_time, last_time);
+CREATE INDEX IF NOT EXISTS idx_pairs_timeline ON timeline_pairs(timeline_id);
+CREATE INDEX IF NOT EXISTS idx_pairs_timeline_packets ON timeline_pairs(timeline_id, packet_count);
+"""
+
+
+def connect(db_path):
+    """Open the flow store, creating the schema on first use"""
+    conn = sqlite3.connect(str(db_path), timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _capture_row(conn, pcap_file, stats):
+    path = str(Path(pcap_file).resolve())
+    try:
+        st = os.stat(path)
+        size, mtime = st.st_size, st.st_mtime
+    except OSError:
+        size, mtime = None, None
+
+    # Re-analyzing a capture replaces its rows.
+    conn.execute("DELETE FROM captures WHERE path = ?", (path,))
+    cur = conn.execute(
+        "INSERT INTO captures (path, name, size, mtime, first_time, last_time,"
+        " total_packets, total_bytes, analyzed_at)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            path,
+            Path(pcap_file).name,
+            size,
+            mtime,
+            stats.get("first_time"),
+            stats.get("last_time"),
+            stats.get("total_packets", 0),
+            stats.get("total_bytes", 0),
+            time.time(),
+        ),
+    )
+    return cur.lastrowid
+
+
+def store_capture(db_path, pcap_file, stats):
+    """Write the conversation table and port stats of one capture"""
+    conn = connect(db_path)
+    try:
+        with conn:
+            capture_id = _capture_row(conn, pcap_file, stats)
+            conn.executemany(
+                "INSERT INTO conversations (capture_id, src, src_port, dst, dst_port,"
+                " packets, bytes, protocols, first_time, last_time)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (
+                        capture_id,
+                        conv["src"],
+                        conv.get("src_port", 0),
+                        conv["dst"],
+                        conv.get("dst_port", 0),
+                        conv["packets"],
+                        conv["bytes"],
+                        ", ".join(sorted(conv.get("protocols", ()))),
+                        conv.get("first_time"),
+                        conv.get("last_time"),
+                    )
+                    for conv in stats.get("conversations", {}).values()
+                ),
+            )
+            conn.executemany(
+                "INSERT INTO protocols (capture_id, protocol, count) VALUES (?, ?, ?)",
+                (
+                    (capture_id, protocol, count)
+                    for protocol, count in stats.get("protocols", {}).items()
+                ),
+            )
+            conn.executemany(
+                "INSERT INTO ports (capture_id, port, protocol, count)"
+                " VALUES (?, ?, ?, ?)",
+                (
+                    (capture_id, port, data.get("protocol"), data["count"])
+                    for port, data in stats.get("port_stats", {}).items()
+                ),
+            )
+        return capture_id
+    finally:
+        conn.close()
+
+
+def store_timeline(db_path, pcap_files, timeline):
+    """Write the per-pair metrics of a multi-capture timeline"""
+    conn = connect(db_path)
+    try:
+        with conn:
+            files = ";".join(str(Path(f).resolve()) for f in pcap_files)
+            conn.execute("DELETE FROM timelines WHERE files = ?", (files,))
+            timeline_id = conn.execute(
+                "INSERT INTO timelines (files, created_at) VALUES (?, ?)",
+                (files, time.time()),
+            ).lastrowid
+            conn.executemany(
+                "INSERT INTO timeline_pairs (timeline_id, ip_a, ip_b, src, dst,"
+                " packet_count, total_bytes, avg_packet_size, turns, chattiness,"
+                " first_time, last_time, files)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (
+                        timeline_id,
+                        conv["ip_pair"][0],
+                        conv["ip_pair"][1],
+                        conv["src"],
+                        conv["dst"],
+                        conv["packet_count"],
+                        conv["total_bytes"],
+                        conv["avg_packet_size"],
+                        conv["turns"],
+                        conv["chattiness"],
+                        conv.get("first_time"),
+                        conv.get("last_time"),
+                        ";".join(sorted(conv["files"])),
+                    )
+                    for conv in timeline
+                ),
+            )
+        return timeline_id
+    finally:
+        conn.close()
+
+
+def load_capture(db_path, pcap_file):
+    """Rebuild the stats stored for a capture
+
+    Returns totals, protocols, port stats and conversations (in first-seen
+    order) as analyze_pcap() would, or None if the capture is not stored or
+    its file changed since.
+    """
+    path = Path(pcap_file).resolve()
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    conn = connect(db_path)
+    try:
+        row = conn.execute(
+            "SELECT id, size, mtime, first_time, last_time, total_packets,"
+            " total_bytes FROM captures WHERE path = ?",
+            (str(path),),
+        ).fetchone()
+        if row is None or (row["size"], row["mtime"]) != (st.st_size, st.st_mtime):
+            return None
+
+        stats = {
+            "total_packets": row["total_packets"],
+            "total_bytes": row["total_bytes"],
+            "first_time": row["first_time"],
+            "last_time": row["last_time"],
+            "protocols": {
+                r["protocol"]: r["count"]
+                for r in conn.execute(
+                    "SELECT protocol, count FROM protocols WHERE capture_id = ?"
+                    " ORDER BY rowid",
+                    (row["id"],),
+                )
+            },
+            "port_stats": {
+                r["port"]: {"count": r["count"], "protocol": r["protocol"]}
+                for r in conn.execute(
+                    "SELECT port, protocol, count FROM ports WHERE capture_id = ?"
+                    " ORDER BY rowid",
+                    (row["id"],),
+                )
+            },
+            "conversations": {},
+        }
+        conversations = stats["conversations"]
+        for r in conn.execute(
+            "SELECT src, src_port, dst, dst_port, packets, bytes, protocols,"
+            " first_time, last_time FROM conversations WHERE capture_id = ?"
+            " ORDER BY rowid",
+            (row["id"],),
+        ):
+            conv = dict(r)
+            conv["protocols"] = set(conv["protocols"].split(", "))
+            key = (
+                f"{conv['src']}:{conv['src_port']} <-> {conv['dst']}:{conv['dst_port']}"
+            )
+            conversations[key] = conv
+        return stats
+    finally:
+        conn.close()
+
+
+def load_timeline(db_path, pcap_files):
+    """Rebuild the timeline stored for these captures
+
+    Entries carry no per-packet list or packet indices. Returns None if no
+    timeline is stored for exactly these files or one changed since.
+    """
+    try:
+        mtime = max(os.stat(Path(f).resolve()).st_mtime for f in pcap_files)
+    except OSError:
+        return None
+    timeline = timeline_id(db_path, pcap_files)
+    conn = connect(db_path)
+    try:
+        row = conn.execute(
+            "SELECT created_at FROM timelines WHERE id = ?", (timeline,)
+        ).fetchone()
+        if row is None or row["created_at"] < mtime:
+            return None
+        return [
+            {
+                "ip_pair": (r["ip_a"], r["ip_b"]),
+                "src": r["src"],
+                "dst": r["dst"],
+                "packet_count": r["packet_count"],
+                "total_bytes": r["total_bytes"],
+                "avg_packet_size": r["avg_packet_size"],
+                "turns": r["turns"],
+                "chattiness": r["chattiness"],
+                "first_time": r["first_time"],
+                "last_time": r["last_time"],
+                "packets": [],
+                "files": r["files"].split(";") if r["files"] else [],
+            }
+            for r in conn.execute(
+                "SELECT * FROM timeline_pairs WHERE timeline_id = ? ORDER BY rowid",
+                (timeline,),
+            )
+        ]
+    finally:
+        conn.close()
+
+
+def parse_time(value):
+    """Parse an epoch number or ISO-8601 date/datetime into epoch seconds"""
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return datetime.fromisoformat(str(value)).timestamp()
+
+
+def query_flows(
+    db_path,
+    ip=None,
+    port=None,
+    since=None,
+    until=None,
+    capture=None,
+    group_by=None,
+    limit=100,
+):
+    """Query stored conversations
+
+    ``ip`` and ``port`` match either side of a conversation. ``since`` and
+    ``until`` select conversations active in that window. With
+    ``group_by="capture"`` one row per matching capture is returned.
+    """
+    where = []
+    params = []
+
+    if ip:
+        where.append("(c.src = ? OR c.dst = ?)")
+        params.extend([ip, ip])
+    if port is not None:
+        where.append("(c.src_port = ? OR c.dst_port = ?)")
+        params.extend([int(port), int(port)])
+    since = parse_time(since)
+    if since is not None:
+        where.append("c.last_time >= ?")
+        params.append(since)
+    until = parse_time(until)
+    if until is not None:
+        where.append("c.first_time <= ?")
+        params.append(until)
+    if capture:
+        where.append("(k.name = ? OR k.path = ?)")
+        params.extend([capture, capture])
+
+    clause = f" WHERE {' AND '.join(where)}" if where else ""
+
+    if group_by == "capture":
+        sql = (
+            "SELECT k.path AS capture, k.first_time AS capture_start,"
+            " k.last_time AS capture_end, COUNT(*) AS conversations,"
+            " SUM(c.packets) AS packets, SUM(c.bytes) AS bytes"
+            " FROM conversations c JOIN captures k ON k.id = c.capture_id"
+            f"{clause} GROUP BY k.id ORDER BY k.first_time"
+        )
+    else:
+        sql = (
+            "SELECT k.path AS capture, c.src, c.src_port, c.dst, c.dst_port,"
+            " c.packets, c.bytes, c.protocols, c.first_time, c.last_time"
+            " FROM conversations c JOIN captures k ON k.id = c.capture_id"
+            f"{clause} ORDER BY c.bytes DESC"
+        )
+
+    if limit:
+        sql += " LIMIT ?"
+        params.append(int(limit))
+
+    conn = connect(db_path)
+    try:
+        return [dict(row) for row in conn.execute(sql, params)]
+    finally:
+        conn.close()
+
+
+# Sortable columns per paged table; anything else is rejected.
+CONVERSATION_SORTS = (
+    "packets",
+    "bytes",
+    "src",
+    "dst",
+    "src_port",
+    "dst_port",
+    "first_time",
+)
+PORT_SORTS = ("count", "port")
+PAIR_SORTS = (
+    "first_time",
+    "packet_count",
+    "total_bytes",
+    "turns",
+    "chattiness",
+    "avg_packet_size",
+)
+
+
+def _encode_cursor(value, rowid):
+    return base64.urlsafe_b64encode(json.dumps([value, rowid]).encode()).decode()
+
+
+def _decode_cursor(cursor):
+    try:
+        value, rowid = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("invalid cursor") from None
+    return value, rowid
+
+
+def _page(conn, table, columns, where, params, sort, order, limit, cursor):
+    """Keyset-paginate ``table`` by (sort, rowid)
+
+    Returns the rows of this page, the cursor of the next page (None on the
+    last page) and the total number of matching rows.
+    """
+    desc = order != "asc"
+    clause = " AND ".join(where)
+    total = conn.execute(f"SELECT COUNT(*) FROM {table} WHERE {clause}", params)
+    total = total.fetchone()[0]
+
+    page_where = list(where)
+    page_params = list(params)
+    if cursor:
+        value, rowid = _decode_cursor(cursor)
+        op = "<" if desc else ">"
+        page_where.append(f"({sort}, rowid) {op} (?, ?)")
+        page_params.extend([value, rowid])
+
+    direction = "DESC" if desc else "ASC"
+    rows = conn.execute(
+        f"SELECT rowid AS _rowid, {columns} FROM {table}"
+        f" WHERE {' AND '.join(page_where)}"
+        f" ORDER BY {sort} {direction}, rowid {direction} LIMIT ?",
+        page_params + [limit + 1],
+    ).fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = _encode_cursor(last[sort], last["_rowid"])
+
+    items = []
+    for row in rows:
+        item = dict(row)
+        del item["_rowid"]
+        items.append(item)
+    return {"items": items, "next_cursor": next_cursor, "total": total}
+
+
+def _check_sort(sort, allowed):
+    if sort not in allowed:
+        raise ValueError(f"sort must be one of: {', '.join(allowed)}")
+
+
+def capture_id(db_path, pcap_file):
+    """Return the id of a stored capture, or None"""
+    conn = connect(db_path)
+    try:
+        row = conn.execute(
+            "SELECT id FROM captures WHERE path = ?", (str(Path(pcap_file).resolve()),)
+        ).fetchone()
+        return row["id"] if row else None
+    finally:
+        conn.close()
+
+
+def timeline_id(db_path, pcap_files):
+    """Return the id of a stored timeline for these captures, or None"""
+    files = ";".join(str(Path(f).resolve()) for f in pcap_files)
+    conn = connect(db_path)
+    try:
+        row = conn.execute(
+            "SELECT id FROM timelines WHERE files = ? ORDER BY id DESC", (files,)
+        ).fetchone()
+        return row["id"] if row else None
+    finally:
+        conn.close()
+
+
+def capture_summary(db_path, capture):
+    """Return totals and the protocol mix of a stored capture, or None"""
+    conn = connect(db_path)
+    try:
+        row = conn.execute(
+            "SELECT id, path, name, first_time, last_time, total_packets, total_bytes,"
+            " analyzed_at FROM captures WHERE id = ?",
+            (capture,),
+        ).fetchone()
+        if row is None:
+            return None
+        summary = dict(row)
+        summary["conversations"] = conn.execute(
+            "SELECT COUNT(*) FROM conversations WHERE capture_id = ?", (capture,)
+        ).fetchone()[0]
+        summary["protocols"] = [
+            dict(r)
+            for r in conn.execute(
+                "SELECT protocol, count FROM protocols WHERE capture_id = ?"
+                " ORDER BY count DESC",
+                (capture,),
+            )
+        ]
+        return summary
+    finally:
+        conn.close()
+
+
+def page_conversations(
+    db_path,
+    capture,
+    sort="packets",
+    order="desc",
+    ip=None,
+    port=None,
+    protocol=None,
+    limit=100,
+    cursor=None,
+):
+    """One page of a capture's conversations, sorted and filtered"""
+    _check_sort(sort, CONVERSATION_SORTS)
+    where = ["capture_id = ?"]
+    params = [capture]
+    if ip:
+        where.append("(src = ? OR dst = ?)")
+        params.extend([ip, ip])
+    if port is not None:
+        where.append("(src_port = ? OR dst_port = ?)")
+        params.extend([int(port), int(port)])
+    if protocol:
+        where.append("protocols LIKE ?")
+        params.append(f"%{protocol}%")
+
+    conn = connect(db_path)
+    try:
+        return _page(
+            conn,
+            "conversations",
+            "src, src_port, dst, dst_port, packets, bytes, protocols,"
+            " first_time, last_time",
+            where,
+            params,
+            sort,
+            order,
+            limit,
+            cursor,
+        )
+    finally:
+        conn.close()
+
+
+def page_ports(db_path, capture, sort="count", order="desc", limit=100, cursor=None):
+    """One page of a capture's destination port counts"""
+    _check_sort(sort, PORT_SORTS)
+    conn = connect(db_path)
+    try:
+        return _page(
+            conn,
+            "ports",
+            "port, protocol, count",
+            ["capture_id = ?"],
+            [capture],
+            sort,
+            order,
+            limit,
+            cursor,
+        )
+    finally:
+        conn.close()
+
+
+def timeline_summary(db_path, timeline):
+    """Return the get_timeline_summary() totals of a stored timeline, or None"""
+    conn = connect(db_path)
+    try:
+        row = conn.execute(
+            "SELECT id, files, created_at FROM timelines WHERE id = ?", (timeline,)
+        ).fetchone()
+        if row is None:
+            return None
+        summary = dict(row)
+        summary["files"] = summary["files"].split(";")
+        totals = conn.execute(
+            "SELECT COUNT(*) AS total_conversations,"
+            " COALESCE(SUM(packet_count), 0) AS total_packets,"
+            " COALESCE(SUM(total_bytes), 0) AS total_bytes,"
+            " COALESCE(SUM(turns), 0) AS total_turns"
+            " FROM timeline_pairs WHERE timeline_id = ?",
+            (timeline,),
+        ).fetchone()
+        summary.update(dict(totals))
+        n = summary["total_conversations"]
+        summary["avg_packets_per_convo"] = summary["total_packets"] / n if n else 0
+        summary["avg_turns_per_convo"] = summary["total_turns"] / n if n else 0
+        return summary
+    finally:
+        conn.close()
+
+
+def page_timeline_pairs(
+    db_path,
+    timeline,
+    sort="first_time",
+    order="asc",
+    ip=None,
+    limit=100,
+    cursor=None,
+):
+    """One page of a timeline's per-pair metrics, sorted and filtered"""
+    _check_sort(sort, PAIR_SORTS)
+    where = ["timeline_id = ?"]
+    params = [timeline]
+    if ip:
+        where.append("(ip_a = ? OR ip_b = ?)")
+        params.extend([ip, ip])
+
+    conn = connect(db_path)
+    try:
+        return _page(
+            conn,
+            "timeline_pairs",
+            "ip_a, ip_b, src, dst, packet_count, total_bytes, avg_packet_size,"
+            " turns, chattiness, first_time, last_time, files",
+            where,
+            params,
+            sort,
+            order,
+            limit,
+            cursor,
+        )
+    finally:
+        conn.close()
@@ -0,0 +1,210 @@
+import base64
+import json
+import os
+import struct
+import sys
+from array import array
+from pathlib import Path
+
+from scapy.all import PcapReader
+from scapy.utils import PcapNgReader
+
+from .analyzer import extract_packets, new_stats, stats_aggregators
+from .compressed import compression_of
+from .profiling import stage
+from .rollups import Rollups
+
+CHECKPOINT_VERSION = 2
+PCAP_HEADER_LEN = 24
+RECORD_HEADER_LEN = 16
+
+
+def default_checkpoint(output_file):
+    """Checkpoint path used when --checkpoint is not given"""
+    return str(Path(output_file).with_suffix(".follow.json"))
+
+
+class AppendedRecords:
+    """Iterate the complete pcap records between ``offset`` and end of file
+
+    The file size is taken once when iteration starts, and a trailing record
+    the writer has not finished yet is left for the next pass. ``offset`` is
+    advanced past every record yielded.
+    """
+
+    def __init__(self, reader, offset, size):
+        self.reader = reader
+        self.offset = offset
+        self.size = size
+
+    def __iter__(self):
+        fh = self.reader.f
+        while self.offset + RECORD_HEADER_LEN <= self.size:
+            fh.seek(self.offset)
+            hdr = fh.read(RECORD_HEADER_LEN)
+            caplen = struct.unpack(self.reader.endian + "IIII", hdr)[2]
+            end = self.offset + RECORD_HEADER_LEN + caplen
+            if end > self.size:
+                break
+            fh.seek(self.offset)
+            packet = self.reader.read_packet()
+            self.offset = end
+            yield packet
+
+
+def encode_stats(stats):
+    """A JSON-safe form of a new_stats() dict, for checkpoints and shards"""
+    return {
+        "total_packets": stats["total_packets"],
+        "total_bytes": stats["total_bytes"],
+        "first_time": stats["first_time"],
+        "last_time": stats["last_time"],
+        "protocols": dict(stats["protocols"]),
+        "lengths": base64.b64encode(array("I", stats["lengths"]).tobytes()).decode(),
+        "port_stats": [
+            [port, data["count"], data["protocol"]]
+            for port, data in stats["port_stats"].items()
+        ],
+        "conversations": [
+            [key, {**conv, "protocols": sorted(conv["protocols"])}]
+            for key, conv in stats["conversations"].items()
+        ],
+        "throughput": stats["throughput"].encode(),
+        "interfaces": dict(stats["interfaces"]),
+        "app_flows": stats["app_flows"],
+    }
+
+
+def decode_stats(raw):
+    """The new_stats() dict of an encode_stats() result"""
+    lengths = array("I")
+    lengths.frombytes(base64.b64decode(raw["lengths"]))
+    return {
+        "total_packets": raw["total_packets"],
+        "total_bytes": raw["total_bytes"],
+        "first_time": raw["first_time"],
+        "last_time": raw["last_time"],
+        "protocols": raw["protocols"],
+        "lengths": lengths,
+        "port_stats": {
+            port: {"count": count, "protocol": protocol}
+            for port, count, protocol in raw["port_stats"]
+        },
+        "conversations": {
+            key: {**conv, "protocols": set(conv["protocols"])}
+            for key, conv in raw["conversations"]
+        },
+        "throughput": Rollups.decode(raw["throughput"]),
+        # Checkpoints written before these were tracked lack the keys
+        "interfaces": {
+            name: dict(data) for name, data in raw.get("interfaces", {}).items()
+        },
+        "app_flows": raw.get("app_flows", {}),
+    }
+
+
+def merge_stats(stats, delta):
+    """Fold the stats of later packets into ``stats``
+
+    The result equals analyzing both packet ranges in one pass, including
+    the first-seen order of protocols, ports and conversations.
+    """
+    for aggregator, later in zip(stats_aggregators(stats), stats_aggregators(delta)):
+        aggregator.merge(later)
+    return stats
+
+
+def _load_checkpoint(checkpoint_file):
+    path = Path(checkpoint_file)
+    if not path.exists():
+        return None
+    try:
+        raw = json.loads(path.read_text())
+    except ValueError as e:
+        print(f"Error reading checkpoint '{checkpoint_file}': {e}", file=sys.stderr)
+        sys.exit(1)
+    if raw.get("version") != CHECKPOINT_VERSION:
+        print(
+            f"Error: unsupported checkpoint version in '{checkpoint_file}'",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+    return raw
+
+
+def _save_checkpoint(checkpoint_file, raw):
+    path = Path(checkpoint_file)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(raw))
+    os.replace(tmp, path)
+
+
+def follow_pcap(pcap_file, checkpoint_file):
+    """Analyze only the records appended to a pcap since the last checkpoint
+
+    The checkpoint holds the byte offset of the first unprocessed record,
+    the capture's file header and the stats so far. If the file shrank or
+    its header changed (e.g. a ring buffer reused the name), it is analyzed
+    from the start. Returns the merged stats and the number of new packets.
+    """
+    with stage("read"):
+        if compression_of(pcap_file):
+            # Offsets into a compressed stream cannot be resumed.
+            print(
+                "Error: --follow supports uncompressed pcap files only",
+                file=sys.stderr,
+            )
+            sys.exit(1)
+        try:
+            reader = PcapReader(str(pcap_file))
+        except Exception as e:
+            print(f"Error opening pcap file: {e}", file=sys.stderr)
+            sys.exit(1)
+        if isinstance(reader, PcapNgReader):
+            reader.close()
+            print("Error: --follow supports classic pcap files only", file=sys.stderr)
+            sys.exit(1)
+
+        fh = reader.f
+        fh.seek(0)
+        header = fh.read(PCAP_HEADER_LEN).hex()
+        size = os.path.getsize(pcap_file)
+
+        checkpoint = _load_checkpoint(checkpoint_file)
+        if (
+            checkpoint is None
+            or checkpoint["input"] != str(pcap_file)
+            or checkpoint["header"] != header
+            or checkpoint["offset"] > size
+        ):
+            stats = new_stats()
+            stats["lengths"] = array("I")
+            offset = PCAP_HEADER_LEN
+        else:
+            stats = decode_stats(checkpoint["stats"])
+            offset = checkpoint["offset"]
+
+    with stage("extract", hot=True) as extract:
+        records = AppendedRecords(reader, offset, size)
+        delta = new_stats()
+        with reader:
+            extract_packets(records, delta)
+        merge_stats(stats, delta)
+        extract.packets = delta["total_packets"]
+
+    stats["protocols"] = dict(stats["protocols"])
+    stats["port_stats"] = dict(stats["port_stats"])
+    stats["conversations"] = dict(stats["conversations"])
+    stats["interfaces"] = dict(stats["interfaces"])
+
+    _save_checkpoint(
+        checkpoint_file,
+        {
+            "version": CHECKPOINT_VERSION,
+            "input": str(pcap_file),
+            "header": header,
+            "offset": records.offset,
+            "stats": encode_stats(stats),
+        },
+    )
+    return stats, delta["total_packets"]
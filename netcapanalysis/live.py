@@ -0,0 +1,298 @@
+import asyncio
+import heapq
+import json
+import os
+import re
+import signal
+import subprocess
+import threading
+import time
+from collections import defaultdict, deque
+
+from scapy.all import ICMP, IP, TCP, UDP, PcapReader
+
+from . import metrics
+from .follow import PCAP_HEADER_LEN, AppendedRecords
+
+# How often the capture file is checked for new packets
+POLL_INTERVAL = 0.2
+# Seconds of traffic the packets/s and bytes/s rates are averaged over
+RATE_WINDOW = 5
+TOP_TALKERS = 10
+
+LIVE_VIEWERS = metrics.Gauge(
+    "netcap_live_viewers", "Clients streaming live capture statistics"
+)
+
+
+class LiveStats:
+    """Rolling statistics over packets as they are captured
+
+    Rates cover the last RATE_WINDOW seconds; top talkers and the protocol
+    mix cover the whole session. Packets are added from the tail thread and
+    snapshots taken from the event loop, so both go through a lock.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.ended = None
+        self.packets = 0
+        self.bytes = 0
+        self.protocols = defaultdict(int)
+        self.talkers = defaultdict(lambda: [0, 0])
+        self._seconds = deque()
+
+    def add(self, packet):
+        length = len(packet)
+        second = int(packet.time)
+        protocol = "Non-IP"
+        src = None
+        if IP in packet:
+            src = packet[IP].src
+            if TCP in packet:
+                protocol = "TCP"
+            elif UDP in packet:
+                protocol = "UDP"
+            elif ICMP in packet:
+                protocol = "ICMP"
+            else:
+                protocol = "IP"
+
+        with self.lock:
+            self.packets += 1
+            self.bytes += length
+            self.protocols[protocol] += 1
+            if src is not None:
+                talker = self.talkers[src]
+                talker[0] += 1
+                talker[1] += length
+            if self._seconds and self._seconds[-1][0] == second:
+                self._seconds[-1][1] += 1
+                self._seconds[-1][2] += length
+            else:
+                self._seconds.append([second, 1, length])
+                while len(self._seconds) > RATE_WINDOW * 4:
+                    self._seconds.popleft()
+
+    def snapshot(self, now=None):
+        if now is None:
+            now = self.ended or time.time()
+        with self.lock:
+            cutoff = now - RATE_WINDOW
+            recent = [s for s in self._seconds if s[0] >= cutoff]
+            span = max(min(RATE_WINDOW, now - self.started), 1)
+            top = heapq.nlargest(
+                TOP_TALKERS, self.talkers.items(), key=lambda item: item[1][1]
+            )
+            return {
+                "elapsed": round(now - self.started, 1),
+                "packets": self.packets,
+                "bytes": self.bytes,
+                "packets_per_sec": round(sum(s[1] for s in recent) / span, 1),
+                "bytes_per_sec": round(sum(s[2] for s in recent) / span, 1),
+                "protocols": dict(self.protocols),
+                "top_talkers": [
+                    {"ip": ip, "packets": packets, "bytes": nbytes}
+                    for ip, (packets, nbytes) in top
+                ],
+            }
+
+
+class CaptureSession:
+    """A capture subprocess plus a thread that tails the file it writes
+
+    The subprocess is ``netcapanalysis capture``, which writes the pcap as
+    packets arrive. ``on_finish(session)`` runs once the capture has exited
+    and may move the file, updating ``output``.
+    """
+
+    def __init__(self, session_id, cmd, output, on_finish=None):
+        self.id = session_id
+        self.cmd = cmd
+        self.output = output
+        self.name = os.path.basename(output)
+        self.on_finish = on_finish
+        self.status = "starting"
+        self.error = None
+        self.stats = LiveStats()
+        self.proc = None
+        self.finished = threading.Event()
+        self._frame = None
+        self._frame_tick = None
+
+    def start(self):
+        self.proc = subprocess.Popen(
+            self.cmd,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+            start_new_session=True,
+        )
+        self.status = "running"
+        threading.Thread(target=self._tail, daemon=True).start()
+
+    def stop(self):
+        """Ask the capture to stop; it still flushes and closes the file"""
+        if self.status == "running":
+            self.status = "stopping"
+            try:
+                os.killpg(self.proc.pid, signal.SIGINT)
+            except ProcessLookupError:
+                pass
+
+    def _tail(self):
+        reader = None
+        offset = PCAP_HEADER_LEN
+        try:
+            while True:
+                done = self.proc.poll() is not None
+                size = (
+                    os.path.getsize(self.output) if os.path.exists(self.output) else 0
+                )
+                if reader is None and size >= PCAP_HEADER_LEN:
+                    reader = PcapReader(self.output)
+                if reader is not None:
+                    records = AppendedRecords(reader, offset, size)
+                    for packet in records:
+                        self.stats.add(packet)
+                    offset = records.offset
+                if done:
+                    break
+                time.sleep(POLL_INTERVAL)
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            if reader is not None:
+                reader.close()
+            self.proc.wait()
+            stderr = self.proc.stderr.read()
+            if self.proc.returncode != 0 and self.status != "stopping":
+                self.error = self.error or stderr.strip() or "capture failed"
+            if self.on_finish and os.path.exists(self.output):
+                try:
+                    self.on_finish(self)
+                except Exception as e:
+                    self.error = self.error or str(e)
+            self.stats.ended = time.time()
+            self.status = "failed" if self.error else "finished"
+            self.finished.set()
+
+    def info(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "error": self.error,
+            "filename": self.name,
+            "filepath": self.output,
+            **self.stats.snapshot(),
+        }
+
+    def frame(self, tick):
+        """The SSE frame for this tick, built once however many clients watch"""
+        if self._frame_tick != tick:
+            self._frame = f"data: {json.dumps(self.info())}\n\n".encode()
+            self._frame_tick = tick
+        return self._frame
+
+
+class EventStream:
+    """Serve session statistics as Server-Sent Events from one asyncio loop
+
+    Every client is a coroutine on a single thread rather than a Flask
+    worker, so the number of viewers is not bounded by the WSGI server's
+    thread pool. Clients get a frame every ``interval`` seconds; a client
+    that cannot keep up skips frames instead of buffering them.
+    """
+
+    PATH = re.compile(r"^/api/live/([\w-]+)/events$")
+
+    def __init__(self, sessions, host, port, interval=0.25):
+        self.sessions = sessions
+        self.host = host
+        self.port = port
+        self.interval = interval
+        self._ready = threading.Event()
+        self._error = None
+        self._tick = 0
+        self._thread = None
+
+    def start(self):
+        """Start the loop in a daemon thread and wait until it is listening"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+            self._ready.wait()
+        if self._error:
+            raise self._error
+
+    def _run(self):
+        try:
+            asyncio.run(self._serve())
+        except OSError as e:
+            self._error = e
+            self._ready.set()
+
+    async def _serve(self):
+        self._changed = asyncio.Condition()
+        server = await asyncio.start_server(self._handle, self.host, self.port)
+        self._ready.set()
+        async with server:
+            while True:
+                await asyncio.sleep(self.interval)
+                self._tick += 1
+                async with self._changed:
+                    self._changed.notify_all()
+
+    async def _respond(self, writer, status, headers, body=b""):
+        lines = [f"HTTP/1.1 {status}"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        lines.append("Access-Control-Allow-Origin: *")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + body)
+        await writer.drain()
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.decode("latin-1").split()
+            match = self.PATH.match(parts[1].split("?")[0]) if len(parts) > 1 else None
+            session = self.sessions.get(match.group(1)) if match else None
+            if session is None:
+                await self._respond(
+                    writer,
+                    "404 Not Found",
+                    {"Content-Type": "text/plain", "Connection": "close"},
+                    b"Session not found",
+                )
+                return
+
+            await self._respond(
+                writer,
+                "200 OK",
+                {
+                    "Content-Type": "text/event-stream",
+                    "Cache-Control": "no-cache",
+                    "Connection": "keep-alive",
+                },
+                b"retry: 2000\n\n",
+            )
+            LIVE_VIEWERS.inc()
+            try:
+                while True:
+                    done = session.finished.is_set()
+                    writer.write(session.frame(None if done else self._tick))
+                    if done:
+                        writer.write(b"event: end\ndata: {}\n\n")
+                        await writer.drain()
+                        return
+                    await writer.drain()
+                    async with self._changed:
+                        await self._changed.wait()
+            finally:
+                LIVE_VIEWERS.dec()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
@@ -0,0 +1,191 @@
+import threading
+import weakref
+
+# Each thread writes only to its own shard, so the hot path takes no lock.
+# Shards are summed when the registry is rendered; a thread's shard is
+# folded into the base shard when the thread exits.
+_base = {}
+_shards = [_base]
+# Reentrant: a shard can be retired by whichever thread drops the last
+# reference to its owner
+_shards_lock = threading.RLock()
+_local = threading.local()
+
+REGISTRY = []
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+class _ShardOwner:
+    """Kept in thread-local storage only, so it dies with its thread"""
+
+
+def _retire(shard):
+    with _shards_lock:
+        metrics = {metric.name: metric for metric in REGISTRY}
+        for name, values in shard.items():
+            metric = metrics[name]
+            base = _base.setdefault(name, {})
+            for key, value in values.items():
+                if key in base:
+                    base[key] = metric._add(base[key], value)
+                else:
+                    base[key] = metric._copy(value)
+        # By identity: another shard may hold equal counts
+        _shards[:] = [other for other in _shards if other is not shard]
+
+
+def _shard():
+    shard = getattr(_local, "shard", None)
+    if shard is None:
+        shard = {}
+        with _shards_lock:
+            _shards.append(shard)
+        _local.shard = shard
+        _local.owner = _ShardOwner()
+        weakref.finalize(_local.owner, _retire, shard)
+    return shard
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_key(names, labels):
+    return tuple(str(labels.get(name, "")) for name in names)
+
+
+def _format_labels(names, key, extra=None):
+    pairs = [(n, v) for n, v in zip(names, key)]
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    body = ",".join(f'{n}="{_escape(v)}"' for n, v in pairs)
+    return "{" + body + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        REGISTRY.append(self)
+
+    def _collect(self):
+        totals = {}
+        # Held while summing, so a shard being retired is counted once
+        with _shards_lock:
+            for shard in _shards:
+                for key, value in list(shard.get(self.name, {}).items()):
+                    if key in totals:
+                        totals[key] = self._add(totals[key], value)
+                    else:
+                        totals[key] = self._copy(value)
+        return totals
+
+    def _add(self, a, b):
+        return a + b
+
+    def _copy(self, value):
+        return value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in sorted(self._collect().items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, key)} {value}")
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonic counter"""
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        values = _shard().setdefault(self.name, {})
+        key = _label_key(self.labels, labels)
+        values[key] = values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Value that goes up and down; per-thread deltas are summed"""
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labels=(), callback=None):
+        super().__init__(name, help_text, labels)
+        self.callback = callback
+
+    def inc(self, amount=1, **labels):
+        values = _shard().setdefault(self.name, {})
+        key = _label_key(self.labels, labels)
+        values[key] = values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def _collect(self):
+        if self.callback:
+            return {(): self.callback()}
+        return super()._collect()
+
+
+class Histogram(_Metric):
+    """Cumulative histogram with fixed buckets"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        values = _shard().setdefault(self.name, {})
+        key = _label_key(self.labels, labels)
+        entry = values.get(key)
+        if entry is None:
+            # [bucket counts..., +Inf count, sum]
+            entry = values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                entry[i] += 1
+                break
+        else:
+            entry[len(self.buckets)] += 1
+        entry[-1] += value
+
+    def _add(self, a, b):
+        return [x + y for x, y in zip(a, b)]
+
+    def _copy(self, value):
+        return list(value)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, entry in sorted(self._collect().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry):
+                cumulative += count
+                labels = _format_labels(self.labels, key, ("le", repr(float(bound))))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            cumulative += entry[len(self.buckets)]
+            labels = _format_labels(self.labels, key, ("le", "+Inf"))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(
+                f"{self.name}_sum{_format_labels(self.labels, key)} {entry[-1]}"
+            )
+            lines.append(
+                f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}"
+            )
+        return lines
+
+
+def render():
+    """Render every registered metric in Prometheus text format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -1,167 +1,626 @@
+import heapq
+import json
+import math
+import os
 import sys
-from collections import defaultdict
+from collections import defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
 
-from scapy.all import rdpcap, IP, TCP, UDP, ICMP
-
-
-PORT_SERVICES = {
-    20: "FTP-DATA",
-    21: "FTP",
-    22: "SSH",
-    23: "TELNET",
-    25: "SMTP",
-    53: "DNS",
-    67: "DHCP",
-    68: "DHCP",
-    80: "HTTP",
-    110: "POP3",
-    143: "IMAP",
-    443: "HTTPS",
-    465: "SMTPS",
-    587: "SMTP",
-    993: "IMAPS",
-    995: "POP3S",
-    3306: "MySQL",
-    5432: "PostgreSQL",
-    6379: "Redis",
-    8080: "HTTP-ALT",
-    8443: "HTTPS-ALT",
-    27017: "MongoDB",
-}
-
-
-def get_service_name(port):
-    return PORT_SERVICES.get(port, "Unknown")
+from .columnar import SharedDir, SharedTable, write_table
+from .dedup import dedup_key
+from .pcapng import open_packets
+from .pipeline import PORT_SERVICES, Aggregator, Analyzer, PacketInfo, get_service_name
+from .profiling import clear_profiler, stage
+from .spill import SpillDir, SpillTable, SpilledRows, budget_entries, external_sort
+
+STATE_VERSION = 1
+
+# Per-pair accumulator fields that are plain numbers or strings
+PAIR_SCALARS = (
+    "packet_count",
+    "total_bytes",
+    "turns",
+    "first_src",
+    "last_src",
+    "first_idx",
+    "last_idx",
+    "first_time",
+    "last_time",
+)
+# Pair table columns written by pool workers, in row tuple order
+PAIR_COLUMNS = [
+    ("ip_a", "string"),
+    ("ip_b", "string"),
+    ("packet_count", "int64"),
+    ("total_bytes", "int64"),
+    ("turns", "int64"),
+    ("first_src", "string"),
+    ("last_src", "string"),
+    ("first_idx", "int64"),
+    ("last_idx", "int64"),
+    ("first_time", "float64"),
+    ("last_time", "float64"),
+    ("src_0", "string"),
+    ("src_0_count", "int64"),
+    ("src_1", "string"),
+    ("src_1_count", "int64"),
+    ("dst_0", "string"),
+    ("dst_0_count", "int64"),
+    ("dst_1", "string"),
+    ("dst_1_count", "int64"),
+    ("files", "string"),
+]
+PairRow = namedtuple("PairRow", [name for name, _ in PAIR_COLUMNS])
+# Rows copied out of a mapped pair table at a time
+SLICE_ROWS = 65536
+
+
+def _timeline_packet(info, idx):
+    """Return the timeline packet dict for the PacketInfo of an IP packet"""
+    return {
+        "idx": idx,
+        "src": info.src,
+        "dst": info.dst,
+        "src_port": info.src_port,
+        "dst_port": info.dst_port,
+        "protocol": info.protocol,
+        "length": info.length,
+        "time": info.time,
+        "file": info.file,
+    }
+
+
+def _deduplicated_packets(pcap_files, dedup):
+    """Yield PacketInfo of the IP packets of several captures in time order
+
+    Packets that ``dedup`` has already seen in another capture are dropped.
+    """
+    readers = []
+    for pcap_file in pcap_files:
+        try:
+            readers.append((open_packets(pcap_file), Path(pcap_file).name))
+        except Exception as e:
+            print(f"Error opening pcap file: {e}", file=sys.stderr)
+            sys.exit(1)
+
+    def ip_packets(reader, name, source):
+        with reader:
+            for packet in reader:
+                info = PacketInfo(packet, name)
+                if info.src is not None:
+                    yield source, info
+
+    # Sources are input positions: taps may share a file name
+    streams = [
+        ip_packets(reader, name, source)
+        for source, (reader, name) in enumerate(readers)
+    ]
+    for source, info in heapq.merge(*streams, key=lambda item: item[1].time):
+        if not dedup.is_duplicate(dedup_key(info.packet), info.time, source):
+            yield info
+
+
+class TimelineAggregator(Aggregator):
+    """Per IP pair timeline entries, as the timeline command reports them
+
+    IP packets are numbered from ``base_idx`` + 1 across everything fed and
+    folded into per-pair accumulators in ``pairs`` (a SpillTable; pass one
+    with a budget to spill). With ``keep_packets`` the packet dicts are kept
+    too, in ``packets`` and in each entry's ``packets`` list.
+    """
+
+    def __init__(self, pairs=None, base_idx=0, keep_packets=False):
+        if pairs is None:
+            pairs = SpillTable(math.inf, merge_pair, None)
+        self.pairs = pairs
+        self.base_idx = base_idx
+        self.next_idx = base_idx
+        self.packets = [] if keep_packets else None
+        self._pair_packets = defaultdict(list)
+
+    @property
+    def count(self):
+        """IP packets folded in"""
+        return self.next_idx - self.base_idx
+
+    def update(self, info):
+        if info.src is None:
+            return
+        self.next_idx += 1
+        pkt = _timeline_packet(info, self.next_idx)
+        key = _fold_packet(pkt, self.pairs)
+        if self.packets is not None:
+            self.packets.append(pkt)
+            self._pair_packets[key].append(pkt)
+
+    def merge(self, other):
+        """Fold in an aggregator of later packets, renumbering them"""
+        shift = self.next_idx - other.base_idx
+        live = self.pairs.live
+        for key, data in other.pairs.merged():
+            data["first_idx"] += shift
+            data["last_idx"] += shift
+            current = live.get(key)
+            if current is None:
+                self.pairs.check()
+                live[key] = data
+            else:
+                merge_pair(current, data)
+        if self.packets is not None and other.packets is not None:
+            for pkt in other.packets:
+                pkt["idx"] += shift
+            self.packets.extend(other.packets)
+            for key, packets in other._pair_packets.items():
+                self._pair_packets[key].extend(packets)
+        self.next_idx += other.count
+
+    def finalize(self, result):
+        timeline = (finish_pair(key, data) for key, data in self.pairs.merged())
+        spill_dir = self.pairs.spill_dir
+        if spill_dir is not None:
+            result["timeline"] = SpilledRows(
+                external_sort(
+                    timeline, key=lambda x: x["first_idx"], spill_dir=spill_dir
+                ),
+                spill_dir,
+            )
+            return
+
+        timeline = sorted(timeline, key=lambda x: x["first_idx"])
+        if self.packets is not None:
+            for entry in timeline:
+                entry["packets"] = self._pair_packets[entry["ip_pair"]]
+        result["timeline"] = timeline
 
 
 def analyze_pcap_timeline(pcap_file, base_idx=0):
     """Analyze pcap file with timeline data"""
-    conversations = []
+    timeline = TimelineAggregator(base_idx=base_idx, keep_packets=True)
+    Analyzer([timeline]).run([pcap_file])
+    return timeline.packets, timeline.next_idx
+
+
+def _run_timeline(pcap_files, timeline, dedup=None):
+    """Feed captures (merged and deduplicated with ``dedup``) to a timeline"""
+    analyzer = Analyzer([timeline])
+    if dedup is None:
+        analyzer.run(pcap_files)
+        return
+    with stage("extract", hot=True) as extract:
+        analyzer.feed_decoded(_deduplicated_packets(pcap_files, dedup))
+        extract.packets = timeline.count
+
+
+def analyze_multi_capture(pcap_files, memory_budget=None, dedup=None, jobs=None):
+    """Analyze multiple pcap files and build timeline
+
+    With ``memory_budget`` (MB) see analyze_multi_capture_budgeted(), and
+    with ``jobs`` > 1 (and no ``dedup``) analyze_multi_capture_parallel().
+
+    With a ``dedup`` Deduplicator the captures are treated as overlapping
+    taps: packets are merged across files in time order and copies seen in
+    another capture within the dedup window are dropped.
+    """
+    if memory_budget is not None:
+        return analyze_multi_capture_budgeted(pcap_files, memory_budget, dedup)
+    if jobs is not None and jobs > 1 and len(pcap_files) > 1 and dedup is None:
+        return analyze_multi_capture_parallel(pcap_files, jobs)
+
+    timeline = TimelineAggregator(keep_packets=True)
+    _run_timeline(pcap_files, timeline, dedup)
+    with stage("aggregate") as aggregate:
+        result = {}
+        timeline.finalize(result)
+        aggregate.packets = timeline.count
+    return result["timeline"], timeline.packets
+
+
+def _new_pair(pkt):
+    return {
+        "packet_count": 0,
+        "total_bytes": 0,
+        "src_counts": {},
+        "dst_counts": {},
+        "turns": 1,
+        "first_src": pkt["src"],
+        "last_src": pkt["src"],
+        "first_idx": pkt["idx"],
+        "last_idx": pkt["idx"],
+        "first_time": pkt["time"],
+        "last_time": pkt["time"],
+        "files": set(),
+    }
 
-    try:
-        packets = rdpcap(str(pcap_file))
-    except Exception as e:
-        print(f"Error opening pcap file: {e}", file=sys.stderr)
-        sys.exit(1)
 
-    packet_idx = base_idx
-    for packet in packets:
-        if IP not in packet:
-            continue
-
-        packet_idx += 1
-        length = len(packet)
-        src_ip = packet[IP].src
-        dst_ip = packet[IP].dst
-
-        src_port = 0
-        dst_port = 0
-        protocol = "IP"
-
-        if TCP in packet:
-            src_port = packet[TCP].sport
-            dst_port = packet[TCP].dport
-            protocol = "TCP"
-        elif UDP in packet:
-            src_port = packet[UDP].sport
-            dst_port = packet[UDP].dport
-            protocol = "UDP"
-        elif ICMP in packet:
-            protocol = "ICMP"
-
-        conversations.append(
-            {
-                "idx": packet_idx,
-                "src": src_ip,
-                "dst": dst_ip,
-                "src_port": src_port,
-                "dst_port": dst_port,
-                "protocol": protocol,
-                "length": length,
-                "file": Path(pcap_file).name,
-            }
-        )
+def merge_pair(a, b):
+    """Combine partial pair accumulators, ``a`` covering earlier packets
+
+    Used to merge shards here and in distributed.py.
+    """
+    a["packet_count"] += b["packet_count"]
+    a["total_bytes"] += b["total_bytes"]
+    for counts in ("src_counts", "dst_counts"):
+        for ip, count in b[counts].items():
+            a[counts][ip] = a[counts].get(ip, 0) + count
+    # Both partials count their first packet as a turn; that is only a
+    # direction change if the sender differs across the boundary.
+    a["turns"] += b["turns"] - (1 if a["last_src"] == b["first_src"] else 0)
+    a["last_src"] = b["last_src"]
+    a["last_idx"] = b["last_idx"]
+    a["last_time"] = b["last_time"]
+    a["files"] |= b["files"]
+    return a
+
+
+def _pair_entry(
+    pair_key,
+    src,
+    dst,
+    count,
+    total_bytes,
+    turns,
+    first_idx,
+    last_idx,
+    first_time,
+    last_time,
+    files,
+):
+    """The timeline entry of a pair from its final accumulator values"""
+    if count > 1:
+        duration = last_idx - first_idx if last_idx > first_idx else 1
+        chattiness = count / duration
+    else:
+        chattiness = 1.0
 
-    return conversations, packet_idx
+    return {
+        "ip_pair": pair_key,
+        "src": src,
+        "dst": dst,
+        "packet_count": count,
+        "total_bytes": total_bytes,
+        "avg_packet_size": total_bytes / count if count > 0 else 0,
+        "turns": turns,
+        "chattiness": chattiness,
+        "first_idx": first_idx,
+        "last_idx": last_idx,
+        "first_time": first_time,
+        "last_time": last_time,
+        "packets": [],
+        "files": files,
+    }
 
 
-def analyze_multi_capture(pcap_files):
-    """Analyze multiple pcap files and build timeline"""
-    all_packets = []
-    base_idx = 0
+def finish_pair(pair_key, data):
+    """The timeline entry of a pair from its (merged) accumulator"""
+    src_counts = data["src_counts"]
+    dst_counts = data["dst_counts"]
+    return _pair_entry(
+        pair_key,
+        max(src_counts.keys(), key=lambda k: src_counts[k]),
+        max(dst_counts.keys(), key=lambda k: dst_counts[k]),
+        data["packet_count"],
+        data["total_bytes"],
+        data["turns"],
+        data["first_idx"],
+        data["last_idx"],
+        data["first_time"],
+        data["last_time"],
+        list(data["files"]),
+    )
+
+
+def analyze_multi_capture_budgeted(pcap_files, memory_budget, dedup=None):
+    """Build the timeline of analyze_multi_capture within a memory budget (MB)
+
+    Packets are streamed and folded into per-pair accumulators instead of
+    being kept, and the pair table spills to disk when it outgrows the
+    budget. Metrics match the in-memory path; timeline entries carry no
+    ``packets`` list and the returned timeline is a read-only sequence
+    backed by a temporary file.
+    """
+    pairs = SpillTable(budget_entries(memory_budget), merge_pair, SpillDir())
+    timeline = TimelineAggregator(pairs)
+    _run_timeline(pcap_files, timeline, dedup)
+
+    with stage("aggregate") as aggregate:
+        result = {}
+        timeline.finalize(result)
+        aggregate.packets = timeline.count
+
+    return result["timeline"], []
+
+
+def _slot_count(counts, ip):
+    return counts.get(ip, 0)
+
+
+def _pair_columns(pairs):
+    """Columns for write_table() from a list of (key, accumulator) pairs
+
+    Each pair has two addresses, so its src/dst counts are at most two
+    (address, count) slots, kept in insertion order; an unused slot is "".
+    """
+    values = {
+        "ip_a": [ip_a for (ip_a, _), _ in pairs],
+        "ip_b": [ip_b for (_, ip_b), _ in pairs],
+        "files": [";".join(sorted(data["files"])) for _, data in pairs],
+    }
+    for field in PAIR_SCALARS:
+        values[field] = [data[field] for _, data in pairs]
+    for counts in ("src", "dst"):
+        tables = [data[f"{counts}_counts"] for _, data in pairs]
+        for slot in (0, 1):
+            ips = [[*table, "", ""][slot] for table in tables]
+            values[f"{counts}_{slot}"] = ips
+            values[f"{counts}_{slot}_count"] = list(map(_slot_count, tables, ips))
+    return {name: (dtype, values[name]) for name, dtype in PAIR_COLUMNS}
 
-    for pcap_file in pcap_files:
-        packets, base_idx = analyze_pcap_timeline(pcap_file, base_idx)
-        all_packets.extend(packets)
-
-    ip_pairs = {}
-
-    for pkt in all_packets:
-        sorted_key = tuple(sorted([pkt["src"], pkt["dst"]]))
-        if sorted_key not in ip_pairs:
-            ip_pairs[sorted_key] = {
-                "packets": [],
-                "total_bytes": 0,
-                "packet_count": 0,
-                "src_counts": {},
-                "dst_counts": {},
-            }
-        ip_pairs[sorted_key]["packets"].append(pkt)
-        ip_pairs[sorted_key]["total_bytes"] += pkt["length"]
-        ip_pairs[sorted_key]["packet_count"] += 1
-
-        src_counts = ip_pairs[sorted_key]["src_counts"]
-        src_counts[pkt["src"]] = src_counts.get(pkt["src"], 0) + 1
-
-        dst_counts = ip_pairs[sorted_key]["dst_counts"]
-        dst_counts[pkt["dst"]] = dst_counts.get(pkt["dst"], 0) + 1
-
-    timeline = []
-    for pair_key, data in ip_pairs.items():
-        packets = sorted(data["packets"], key=lambda x: x["idx"])
-
-        turns = calculate_turns(packets)
-        avg_packet_size = (
-            data["total_bytes"] / data["packet_count"]
-            if data["packet_count"] > 0
-            else 0
-        )
 
-        if len(packets) > 1:
-            first_idx = packets[0]["idx"]
-            last_idx = packets[-1]["idx"]
-            duration = last_idx - first_idx if last_idx > first_idx else 1
-            chattiness = data["packet_count"] / duration
-        else:
-            chattiness = 1.0
-
-        src_counts = data["src_counts"]
-        dst_counts = data["dst_counts"]
-
-        primary_src = max(src_counts.keys(), key=lambda k: src_counts[k])
-        primary_dst = max(dst_counts.keys(), key=lambda k: dst_counts[k])
-
-        timeline.append(
-            {
-                "ip_pair": pair_key,
-                "src": primary_src,
-                "dst": primary_dst,
-                "packet_count": data["packet_count"],
-                "total_bytes": data["total_bytes"],
-                "avg_packet_size": avg_packet_size,
-                "turns": turns,
-                "chattiness": chattiness,
-                "first_idx": packets[0]["idx"],
-                "last_idx": packets[-1]["idx"],
-                "packets": packets,
-                "files": list(set(p["file"] for p in packets)),
-            }
-        )
+def _table_slices(table, names):
+    """Columns ``names`` of a table as Python lists, SLICE_ROWS rows at a time
+
+    Only one slice is copied out of the mapped file at once.
+    """
+    for start in range(0, len(table), SLICE_ROWS):
+        stop = start + SLICE_ROWS
+        columns = []
+        for name in names:
+            values = table.column(name, start, stop)
+            columns.append(values if isinstance(values, list) else values.tolist())
+        yield columns
+
+
+def _table_keys(table):
+    """Pair keys of a _pair_columns() table, in row order"""
+    for ip_a, ip_b in _table_slices(table, ("ip_a", "ip_b")):
+        yield from zip(ip_a, ip_b)
 
+
+def _table_rows(table):
+    """Rows of a _pair_columns() table as PairRow tuples, in row order"""
+    for columns in _table_slices(table, PairRow._fields):
+        yield from map(PairRow._make, zip(*columns))
+
+
+def _slots(ip_0, count_0, ip_1, count_1):
+    return {ip_0: count_0, ip_1: count_1} if ip_1 else {ip_0: count_0}
+
+
+def _row_pair(row, shift):
+    """The accumulator of a table row, its packet indices shifted"""
+    return {
+        "packet_count": row.packet_count,
+        "total_bytes": row.total_bytes,
+        "src_counts": _slots(row.src_0, row.src_0_count, row.src_1, row.src_1_count),
+        "dst_counts": _slots(row.dst_0, row.dst_0_count, row.dst_1, row.dst_1_count),
+        "turns": row.turns,
+        "first_src": row.first_src,
+        "last_src": row.last_src,
+        "first_idx": row.first_idx + shift,
+        "last_idx": row.last_idx + shift,
+        "first_time": row.first_time,
+        "last_time": row.last_time,
+        "files": set(row.files.split(";")) if row.files else set(),
+    }
+
+
+def _row_entry(row, shift):
+    """The timeline entry of a pair seen in a single table row"""
+    return _pair_entry(
+        (row.ip_a, row.ip_b),
+        # max() over the counts keeps the first address on a tie
+        row.src_0 if row.src_0_count >= row.src_1_count else row.src_1,
+        row.dst_0 if row.dst_0_count >= row.dst_1_count else row.dst_1,
+        row.packet_count,
+        row.total_bytes,
+        row.turns,
+        row.first_idx + shift,
+        row.last_idx + shift,
+        row.first_time,
+        row.last_time,
+        row.files.split(";") if row.files else [],
+    )
+
+
+def _merge_pair_tables(results):
+    """Hash join the pair tables of consecutive shards into a timeline
+
+    A first pass over the key columns finds the pairs seen in several
+    shards. The second pass reads whole rows a slice at a time: a pair found
+    in one shard becomes its entry straight from the row, and only pairs in
+    several shards are rebuilt as accumulators and combined with
+    merge_pair(), in shard order.
+    """
+    tables = [SharedTable(descriptor) for descriptor, _ in results]
+    try:
+        seen = set()
+        shared = set()
+        for table in tables:
+            for key in _table_keys(table):
+                if key in seen:
+                    shared.add(key)
+                else:
+                    seen.add(key)
+        del seen
+
+        timeline = []
+        merged = {}
+        next_idx = 0
+        for table, (_, count) in zip(tables, results):
+            for row in _table_rows(table):
+                key = (row.ip_a, row.ip_b)
+                if key not in shared:
+                    timeline.append(_row_entry(row, next_idx))
+                elif key in merged:
+                    merge_pair(merged[key], _row_pair(row, next_idx))
+                else:
+                    merged[key] = _row_pair(row, next_idx)
+            next_idx += count
+    finally:
+        for table in tables:
+            table.close()
+
+    timeline.extend(finish_pair(key, data) for key, data in merged.items())
     timeline.sort(key=lambda x: x["first_idx"])
+    return timeline
+
+
+def _timeline_shard(pcap_file, directory, name):
+    """Pool worker: fold one capture and write its pair table to ``directory``
+
+    Returns the table's descriptor and the number of IP packets folded, so
+    only a few offsets are pickled back to the parent.
+    """
+    timeline = TimelineAggregator()
+    Analyzer([timeline]).run([pcap_file])
+    table = write_table(directory, name, _pair_columns(list(timeline.pairs.merged())))
+    return table, timeline.count
+
+
+def analyze_multi_capture_parallel(pcap_files, jobs):
+    """Build the timeline of analyze_multi_capture in ``jobs`` processes
+
+    Each capture is folded in a pool process, which writes its per-pair
+    accumulators as a columnar table in a shared memory directory owned by
+    this process. The tables are mapped in place and merged in capture
+    order, shifting packet indices by the captures before, so metrics match
+    the in-memory path; timeline entries carry no ``packets`` list.
+    """
+    with SharedDir() as shared:
+        # Not hot: this process only waits, and forked workers must not
+        # start under its cProfile
+        with stage("extract") as extract:
+            try:
+                with ProcessPoolExecutor(
+                    max_workers=jobs, initializer=clear_profiler
+                ) as pool:
+                    futures = [
+                        pool.submit(_timeline_shard, pcap_file, shared.path, f"{i}")
+                        for i, pcap_file in enumerate(pcap_files)
+                    ]
+                    results = [future.result() for future in futures]
+            except BrokenProcessPool:
+                print("Error: a timeline worker process died", file=sys.stderr)
+                sys.exit(1)
+            extract.packets = sum(count for _, count in results)
+
+        with stage("aggregate") as aggregate:
+            timeline = _merge_pair_tables(results)
+            aggregate.packets = extract.packets
+
+    return timeline, []
+
+
+def _fold_packet(pkt, pairs):
+    """Fold a timeline packet dict into its pair's accumulator; return the key"""
+    src = pkt["src"]
+    dst = pkt["dst"]
+    sorted_key = (src, dst) if src <= dst else (dst, src)
+    data = pairs.live.get(sorted_key)
+    if data is None:
+        pairs.check()
+        data = pairs.live[sorted_key] = _new_pair(pkt)
+    elif src != data["last_src"]:
+        data["turns"] += 1
+        data["last_src"] = src
+
+    data["packet_count"] += 1
+    data["total_bytes"] += pkt["length"]
+    data["src_counts"][src] = data["src_counts"].get(src, 0) + 1
+    data["dst_counts"][dst] = data["dst_counts"].get(dst, 0) + 1
+    data["last_idx"] = pkt["idx"]
+    data["last_time"] = pkt["time"]
+    data["files"].add(pkt["file"])
+    return sorted_key
+
+
+def load_timeline_state(state_file):
+    """Load timeline state saved by append_timeline(), or None if missing"""
+    path = Path(state_file)
+    if not path.exists():
+        return None
+    try:
+        raw = json.loads(path.read_text())
+    except ValueError as e:
+        print(f"Error reading timeline state '{state_file}': {e}", file=sys.stderr)
+        sys.exit(1)
+    if raw.get("version") != STATE_VERSION:
+        print(
+            f"Error: unsupported timeline state version in '{state_file}'",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
+    pairs = {}
+    for entry in raw["pairs"]:
+        data = dict(entry)
+        key = tuple(data.pop("ip_pair"))
+        data["files"] = set(data["files"])
+        pairs[key] = data
+    return {"files": raw["files"], "next_idx": raw["next_idx"], "pairs": pairs}
+
+
+def save_timeline_state(state_file, state):
+    """Write timeline state atomically"""
+    raw = {
+        "version": STATE_VERSION,
+        "files": state["files"],
+        "next_idx": state["next_idx"],
+        "pairs": [
+            {"ip_pair": list(key), **data, "files": sorted(data["files"])}
+            for key, data in state["pairs"].items()
+        ],
+    }
+    path = Path(state_file)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(raw))
+    os.replace(tmp, path)
 
-    return timeline, all_packets
+
+def append_timeline(state_file, pcap_files, reset=False, memory_budget=None):
+    """Fold new captures into a saved timeline state and return the timeline
+
+    The state holds the per-pair accumulators (counts, turn state at the
+    last packet, first/last index and time) and the next packet index, so
+    the result is identical to analyze_multi_capture() over every capture
+    folded in so far. With ``reset`` any existing state is discarded.
+
+    Returns the timeline and the list of every capture in the state.
+    """
+    state = None if reset else load_timeline_state(state_file)
+    if state is None:
+        state = {"files": [], "next_idx": 0, "pairs": {}}
+
+    seen = {Path(f).resolve() for f in state["files"]}
+    for pcap_file in pcap_files:
+        if Path(pcap_file).resolve() in seen:
+            print(
+                f"Error: '{pcap_file}' is already in timeline state '{state_file}'",
+                file=sys.stderr,
+            )
+            sys.exit(1)
+
+    new_pairs = None
+    if memory_budget is not None:
+        new_pairs = SpillTable(budget_entries(memory_budget), merge_pair, SpillDir())
+    new = TimelineAggregator(new_pairs, base_idx=state["next_idx"])
+    Analyzer([new]).run(pcap_files)
+
+    with stage("aggregate") as aggregate:
+        pairs = state["pairs"]
+        for key, data in new.pairs.merged():
+            pairs[key] = merge_pair(pairs[key], data) if key in pairs else data
+        state["next_idx"] = new.next_idx
+        state["files"].extend(str(f) for f in pcap_files)
+
+        timeline = [finish_pair(key, data) for key, data in pairs.items()]
+        timeline.sort(key=lambda x: x["first_idx"])
+        aggregate.packets = new.count
+
+    save_timeline_state(state_file, state)
+    return timeline, state["files"]
 
 
 def calculate_turns(packets):
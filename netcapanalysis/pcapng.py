@@ -0,0 +1,218 @@
+import struct
+from collections import namedtuple
+
+from scapy.all import PcapReader, conf
+from scapy.utils import EDecimal, RawPcapReader
+
+from .compressed import open_capture
+
+SHB = 0x0A0D0D0A
+IDB = 0x00000001
+OBSOLETE_PB = 0x00000002
+SPB = 0x00000003
+EPB = 0x00000006
+BYTE_ORDER_MAGIC = 0x1A2B3C4D
+PCAPNG_MAGIC = struct.pack("<I", SHB)
+
+OPT_END = 0
+OPT_IF_NAME = 2
+OPT_IF_TSRESOL = 9
+OPT_IF_TSOFFSET = 14
+
+Interface = namedtuple("Interface", "name linktype snaplen tsresol tsoffset")
+# ``interface`` is the Interface itself, so records stay valid after a new
+# section replaces the interface table.
+Record = namedtuple("Record", "interface time wirelen")
+
+
+def _options(body, endian):
+    """Yield (code, value) TLV options"""
+    offset = 0
+    while offset + 4 <= len(body):
+        code, length = struct.unpack_from(endian + "HH", body, offset)
+        if code == OPT_END:
+            return
+        offset += 4
+        yield code, body[offset : offset + length]
+        offset += length + (-length) % 4
+
+
+class PcapngReader:
+    """Native reader for pcapng streams
+
+    Only section headers, interface descriptions and packet blocks are
+    decoded; name resolution, statistics, comment-only and custom blocks
+    are skipped by length, and packet block options are never parsed.
+    Every section keeps its own byte order and interface table, and each
+    interface its own link type and timestamp resolution.
+
+    records() yields (data, Record) without dissecting anything; iterating
+    the reader yields scapy packets dissected by the interface's link type,
+    with ``sniffed_on`` set to the interface name.
+    """
+
+    def __init__(self, fh):
+        self.f = fh
+        self.endian = "<"
+        self.interfaces = []
+        # Every interface seen, across sections, in first-seen order
+        self.interface_names = []
+        self.skipped_blocks = 0
+        self._last_time = None
+        self._seek = fh.seekable()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self.f.close()
+
+    def _skip(self, size):
+        if self._seek:
+            self.f.seek(size, 1)
+        else:
+            self.f.read(size)
+
+    def _section(self, header):
+        magic = header[8:12]
+        if magic == struct.pack("<I", BYTE_ORDER_MAGIC):
+            self.endian = "<"
+        elif magic == struct.pack(">I", BYTE_ORDER_MAGIC):
+            self.endian = ">"
+        else:
+            raise ValueError("invalid pcapng section header")
+        self.interfaces = []
+        (total,) = struct.unpack(self.endian + "I", header[4:8])
+        return total
+
+    def _interface(self, body):
+        linktype, snaplen = struct.unpack_from(self.endian + "HxxI", body)
+        name = None
+        tsresol = 10**6
+        tsoffset = 0
+        for code, value in _options(body[8:], self.endian):
+            if code == OPT_IF_NAME:
+                name = value.rstrip(b"\0").decode("utf-8", "backslashreplace")
+            elif code == OPT_IF_TSRESOL and value:
+                tsresol = (2 if value[0] & 0x80 else 10) ** (value[0] & 0x7F)
+            elif code == OPT_IF_TSOFFSET and len(value) == 8:
+                (tsoffset,) = struct.unpack(self.endian + "q", value)
+        if name is None:
+            name = f"if{len(self.interfaces)}"
+        if name not in self.interface_names:
+            self.interface_names.append(name)
+        self.interfaces.append(Interface(name, linktype, snaplen, tsresol, tsoffset))
+
+    def records(self):
+        """Yield (data, Record) for every packet block"""
+        read = self.f.read
+        while True:
+            header = read(8)
+            if len(header) < 8:
+                return
+            if header[:4] == PCAPNG_MAGIC:
+                header += read(4)
+                total = self._section(header)
+                self._skip(total - 12)
+                continue
+
+            block_type, total = struct.unpack(self.endian + "II", header)
+            if total < 12:
+                raise ValueError(f"invalid pcapng block length {total}")
+            if block_type not in (IDB, EPB, SPB, OBSOLETE_PB):
+                self.skipped_blocks += 1
+                self._skip(total - 8)
+                continue
+
+            body = read(total - 8)
+            if len(body) < total - 8:
+                return
+            if block_type == EPB:
+                interface, high, low, caplen, wirelen = struct.unpack_from(
+                    self.endian + "IIIII", body
+                )
+                data = body[20 : 20 + caplen]
+            elif block_type == OBSOLETE_PB:
+                interface, _, high, low, caplen, wirelen = struct.unpack_from(
+                    self.endian + "HHIIII", body
+                )
+                data = body[20 : 20 + caplen]
+            elif block_type == SPB:
+                # No interface id or timestamp: interface 0, stamped with the
+                # time of the packet before it.
+                (wirelen,) = struct.unpack_from(self.endian + "I", body)
+                iface = self._iface(0)
+                caplen = min(wirelen, iface.snaplen or wirelen, total - 16)
+                yield body[4 : 4 + caplen], Record(iface, self._last_time, wirelen)
+                continue
+            else:
+                self._interface(body)
+                continue
+
+            iface = self._iface(interface)
+            self._last_time = EDecimal((high << 32) | low) / iface.tsresol
+            if iface.tsoffset:
+                self._last_time += iface.tsoffset
+            yield data, Record(iface, self._last_time, wirelen)
+
+    def _iface(self, index):
+        if index >= len(self.interfaces):
+            raise ValueError(f"pcapng packet for unknown interface {index}")
+        return self.interfaces[index]
+
+    def decode(self, data, record):
+        """Dissect one record the way scapy's PcapNgReader would"""
+        try:
+            packet = conf.l2types.num2layer[record.interface.linktype](data)
+        except Exception:
+            packet = conf.raw_layer(data)
+        if record.time is not None:
+            packet.time = record.time
+        packet.wirelen = record.wirelen
+        packet.sniffed_on = record.interface.name
+        return packet
+
+    def __iter__(self):
+        for data, record in self.records():
+            yield self.decode(data, record)
+
+
+def is_pcapng(fh):
+    """Check (without consuming) whether a buffered stream is pcapng"""
+    return fh.peek(4)[:4] == PCAPNG_MAGIC
+
+
+def open_packets(pcap_file):
+    """Open a capture as an iterable of scapy packets
+
+    pcapng goes through the native PcapngReader; classic pcap through
+    scapy's PcapReader. Either can be used as a context manager.
+    """
+    fh = open_capture(pcap_file)
+    try:
+        if is_pcapng(fh):
+            return PcapngReader(fh)
+        return PcapReader(fh)
+    except Exception:
+        fh.close()
+        raise
+
+
+def open_records(pcap_file):
+    """Open a capture for reading its records without dissecting them
+
+    pcapng goes through PcapngReader, whose records() yields (data, Record);
+    classic pcap through scapy's RawPcapReader, which iterates (data,
+    metadata). Either can be used as a context manager.
+    """
+    fh = open_capture(pcap_file)
+    try:
+        if is_pcapng(fh):
+            return PcapngReader(fh)
+        return RawPcapReader(fh)
+    except Exception:
+        fh.close()
+        raise
@@ -0,0 +1,161 @@
+import sys
+from pathlib import Path
+
+from scapy.all import IP, TCP, UDP, ICMP
+
+from .pcapng import open_packets
+from .profiling import stage
+
+PORT_SERVICES = {
+    20: "FTP-DATA",
+    21: "FTP",
+    22: "SSH",
+    23: "TELNET",
+    25: "SMTP",
+    53: "DNS",
+    67: "DHCP",
+    68: "DHCP",
+    80: "HTTP",
+    110: "POP3",
+    143: "IMAP",
+    443: "HTTPS",
+    465: "SMTPS",
+    587: "SMTP",
+    993: "IMAPS",
+    995: "POP3S",
+    3306: "MySQL",
+    5432: "PostgreSQL",
+    6379: "Redis",
+    8080: "HTTP-ALT",
+    8443: "HTTPS-ALT",
+    27017: "MongoDB",
+}
+
+
+def get_service_name(port):
+    return PORT_SERVICES.get(port, "Unknown")
+
+
+class PacketInfo:
+    """The fields aggregators use, decoded once per packet
+
+    Non-IP packets have ``src``/``dst`` None and protocol ``Non-IP``.
+    ``packet`` is the scapy packet, for aggregators that need more.
+    """
+
+    __slots__ = (
+        "packet",
+        "file",
+        "time",
+        "length",
+        "interface",
+        "src",
+        "dst",
+        "src_port",
+        "dst_port",
+        "protocol",
+        "tcp_flags",
+    )
+
+    def __init__(self, packet, file=None):
+        self.packet = packet
+        self.file = file
+        self.time = float(packet.time)
+        self.length = len(packet)
+        self.interface = packet.sniffed_on
+        self.src_port = 0
+        self.dst_port = 0
+        self.tcp_flags = 0
+
+        if IP not in packet:
+            self.src = self.dst = None
+            self.protocol = "Non-IP"
+            return
+
+        ip = packet[IP]
+        self.src = ip.src
+        self.dst = ip.dst
+        self.protocol = "IP"
+        if TCP in packet:
+            tcp = packet[TCP]
+            self.src_port = tcp.sport
+            self.dst_port = tcp.dport
+            self.tcp_flags = int(tcp.flags)
+            self.protocol = "TCP"
+        elif UDP in packet:
+            udp = packet[UDP]
+            self.src_port = udp.sport
+            self.dst_port = udp.dport
+            self.protocol = "UDP"
+        elif ICMP in packet:
+            self.protocol = "ICMP"
+
+
+class Aggregator:
+    """One metric computed in an Analyzer's packet loop
+
+    update() sees every packet in capture order. merge() folds in an
+    aggregator of the same kind that saw the packets after this one's (a
+    shard, or the new records of a followed file). finalize() adds the
+    results to the dict Analyzer.results() returns.
+    """
+
+    def update(self, info):
+        raise NotImplementedError
+
+    def merge(self, other):
+        raise NotImplementedError(f"{type(self).__name__} cannot be merged")
+
+    def finalize(self, result):
+        raise NotImplementedError
+
+
+class Analyzer:
+    """Read packets once and feed each to every registered aggregator
+
+    Each packet is dissected and decoded into a PacketInfo a single time,
+    however many aggregators run, so any set of metrics costs one scan.
+    """
+
+    def __init__(self, aggregators=()):
+        self.aggregators = list(aggregators)
+        self.packets = 0
+
+    def add(self, aggregator):
+        self.aggregators.append(aggregator)
+        return aggregator
+
+    def feed(self, packets, file=None):
+        """Aggregate scapy packets; returns how many there were"""
+        return self.feed_decoded(PacketInfo(packet, file) for packet in packets)
+
+    def feed_decoded(self, infos):
+        """Aggregate already decoded PacketInfo objects"""
+        updates = [aggregator.update for aggregator in self.aggregators]
+        count = 0
+        for info in infos:
+            count += 1
+            for update in updates:
+                update(info)
+        self.packets += count
+        return count
+
+    def run(self, pcap_files):
+        """Stream every capture, in order, through the aggregators"""
+        for pcap_file in pcap_files:
+            name = Path(pcap_file).name
+            with stage(f"extract:{name}", hot=True) as extract:
+                try:
+                    reader = open_packets(pcap_file)
+                except Exception as e:
+                    print(f"Error opening pcap file: {e}", file=sys.stderr)
+                    sys.exit(1)
+                with reader:
+                    extract.packets = self.feed(reader, name)
+        return self.results()
+
+    def results(self):
+        result = {}
+        for aggregator in self.aggregators:
+            aggregator.finalize(result)
+        return result
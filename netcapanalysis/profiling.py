@@ -0,0 +1,142 @@
+import cProfile
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+_active = None
+
+
+def peak_rss_mb():
+    """Return the process peak resident set size in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class _Stage:
+    """Mutable handle yielded by stage(); set ``packets`` for throughput"""
+
+    __slots__ = ("packets",)
+
+    def __init__(self):
+        self.packets = None
+
+
+class Profiler:
+    """Collect wall time, CPU time and peak memory per analysis stage
+
+    ``suffix`` is appended to every stage name, e.g. ``:<file>`` for the
+    profile of one capture analyzed in a pool worker.
+    """
+
+    def __init__(self, dump_dir=None, suffix=""):
+        self.dump_dir = Path(dump_dir) if dump_dir else None
+        self.suffix = suffix
+        self.stages = []
+
+    def __enter__(self):
+        global _active
+        self._previous = _active
+        _active = self
+        if self.dump_dir:
+            self.dump_dir.mkdir(parents=True, exist_ok=True)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        global _active
+        _active = self._previous
+
+    @contextmanager
+    def stage(self, name, hot=False):
+        name += self.suffix
+        handle = _Stage()
+        profile = None
+        if hot and self.dump_dir:
+            profile = cProfile.Profile()
+
+        start_rss = peak_rss_mb()
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        if profile:
+            profile.enable()
+        try:
+            yield handle
+        finally:
+            if profile:
+                profile.disable()
+            wall = time.perf_counter() - start_wall
+            cpu = time.process_time() - start_cpu
+            end_rss = peak_rss_mb()
+
+            entry = {
+                "stage": name,
+                "wall_s": wall,
+                "cpu_s": cpu,
+                "peak_rss_mb": end_rss,
+                "rss_growth_mb": end_rss - start_rss,
+                "packets": handle.packets,
+                "packets_per_s": (
+                    handle.packets / wall if handle.packets and wall > 0 else None
+                ),
+            }
+            if profile:
+                dump = self.dump_dir / f"{_safe_name(name)}.pstats"
+                profile.dump_stats(str(dump))
+                entry["pstats"] = str(dump)
+            self.stages.append(entry)
+
+    def summary(self):
+        """Return the recorded stages plus process-wide totals"""
+        return {"stages": self.stages, "peak_rss_mb": peak_rss_mb()}
+
+    def merge(self, summary):
+        """Add the stages of another process's summary()"""
+        self.stages.extend(summary["stages"])
+
+    def format_table(self):
+        lines = [
+            f"{'Stage':<32} {'Wall (s)':>10} {'CPU (s)':>10} {'Packets/s':>12} {'Peak RSS (MB)':>14}"
+        ]
+        for entry in self.stages:
+            pps = f"{entry['packets_per_s']:,.0f}" if entry["packets_per_s"] else "-"
+            lines.append(
+                f"{entry['stage']:<32} {entry['wall_s']:>10.3f} {entry['cpu_s']:>10.3f} {pps:>12} {entry['peak_rss_mb']:>14.1f}"
+            )
+        return "\n".join(lines)
+
+
+def _safe_name(name):
+    return "".join(c if c.isalnum() or c in "-_." else "_" for c in name)
+
+
+@contextmanager
+def _null_stage():
+    yield _Stage()
+
+
+def current_profiler():
+    """The active Profiler, or None"""
+    return _active
+
+
+def clear_profiler():
+    """Pool initializer: drop the profiler a forked worker inherited
+
+    Stages the worker would time on it never reach the parent, and hot ones
+    would dump over the parent's files; workers that profile start their own.
+    """
+    global _active
+    _active = None
+
+
+def stage(name, hot=False):
+    """Time a stage on the active profiler; a no-op when none is active
+
+    Stages marked ``hot`` are also run under cProfile when the profiler
+    has a dump directory.
+    """
+    if _active is None:
+        return _null_stage()
+    return _active.stage(name, hot)
@@ -1,38 +1,428 @@
+import csv
+from datetime import datetime
 from pathlib import Path
 
 from .analyzer import (
     analyze_pcap,
     get_length_distribution,
     get_top_ports,
-    get_service_name,
 )
 from .charts import (
+    DIAGRAM_MAX_PAIRS,
+    DIAGRAM_MAX_PARTICIPANTS,
     generate_length_chart,
     generate_port_chart,
     generate_conversation_diagram,
     generate_length_mermaid,
     generate_port_mermaid,
+    generate_timeline_chart,
+    generate_timeline_sequence,
+    generate_chattiness_chart,
+    generate_throughput_chart,
+    generate_throughput_mermaid,
     mermaid_to_png,
 )
+from .classify import application_summary, port_applications, service_name
+from .multianalyze import get_timeline_summary
+from .profiling import stage
+from .rollups import peak_rate
+from .sampling import describe, estimate
+from .spill import SpilledRows, external_sort
+
+CONVERSATION_COLUMNS = ["Source", "Destination", "Packets", "Bytes", "Protocols"]
+CONVERSATION_CSV_COLUMNS = [
+    "src",
+    "src_port",
+    "dst",
+    "dst_port",
+    "packets",
+    "bytes",
+    "protocols",
+]
+
+TIMELINE_COLUMNS = [
+    "Source IP",
+    "Dest IP",
+    "Packets",
+    "Bytes",
+    "Avg Size",
+    "Turns",
+    "Chattiness",
+]
+TIMELINE_CSV_COLUMNS = [
+    "src",
+    "dst",
+    "packet_count",
+    "total_bytes",
+    "avg_packet_size",
+    "turns",
+    "chattiness",
+    "first_idx",
+    "last_idx",
+]
+
+
+class ReportWriter:
+    """Stream a markdown report to disk section by section.
+
+    Tables are written row by row. Rows beyond ``max_rows`` are either
+    dropped from the markdown or, when ``page_size`` is set, written to
+    linked part files next to the report. A CSV copy of every row can be
+    written in the same pass.
+    """
+
+    def __init__(self, output_file, page_size=None):
+        self.output_path = Path(output_file)
+        self.page_size = page_size
+        self._fh = None
+
+    def __enter__(self):
+        self._fh = open(self.output_path, "w")
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._fh.close()
+        self._fh = None
+
+    def write(self, text):
+        self._fh.write(text)
+
+    def _part_path(self, name, part):
+        return self.output_path.with_name(
+            f"{self.output_path.stem}_{name}_part{part}.md"
+        )
 
+    def _open_part(self, name, part, columns):
+        fh = open(self._part_path(name, part), "w")
+        fh.write(f"# {self.output_path.name}: {name} (part {part})\n\n")
+        nav = f"[Back to report]({self.output_path.name})"
+        if part > 1:
+            nav += f" | [Previous]({self._part_path(name, part - 1).name})"
+        fh.write(f"{nav}\n\n")
+        fh.write(_table_header(columns))
+        return fh
+
+    def _close_part(self, fh, name, part, has_next):
+        if has_next:
+            fh.write(f"\n[Next]({self._part_path(name, part + 1).name})\n")
+        fh.close()
+
+    def table(self, name, columns, rows, fmt, max_rows=None, csv_columns=None):
+        """Write a table and return the number of rows seen.
+
+        ``rows`` is an iterable of raw rows and ``fmt`` turns a raw row into
+        the markdown cells. When ``csv_columns`` is given the raw rows are
+        also written to ``<report>_<name>.csv``.
+        """
+        self.write(_table_header(columns))
+        rows = iter(rows)
+
+        csv_fh = None
+        csv_out = None
+        if csv_columns:
+            csv_fh = open(
+                self.output_path.with_name(f"{self.output_path.stem}_{name}.csv"),
+                "w",
+                newline="",
+            )
+            csv_out = csv.writer(csv_fh)
+            csv_out.writerow(csv_columns)
+
+        total = 0
+        part = 0
+        part_rows = 0
+        part_fh = None
+        try:
+            for row in rows:
+                total += 1
+                if csv_out:
+                    csv_out.writerow(row)
+
+                if max_rows is None or total <= max_rows:
+                    self.write(_table_row(fmt(row)))
+                    continue
+
+                if not self.page_size:
+                    if not csv_out:
+                        # Nothing else consumes the overflow, stop early.
+                        total += sum(1 for _ in rows)
+                        break
+                    continue
+
+                if part_fh is None or part_rows >= self.page_size:
+                    if part_fh is not None:
+                        self._close_part(part_fh, name, part, True)
+                    part += 1
+                    part_rows = 0
+                    part_fh = self._open_part(name, part, columns)
+                part_fh.write(_table_row(fmt(row)))
+                part_rows += 1
+        finally:
+            if part_fh is not None:
+                self._close_part(part_fh, name, part, False)
+            if csv_fh is not None:
+                csv_fh.close()
+
+        hidden = total - max_rows if max_rows is not None and total > max_rows else 0
+        if hidden:
+            self.write(f"\n*{hidden:,} more rows not shown.*\n")
+            if part:
+                links = ", ".join(
+                    f"[Part {p}]({self._part_path(name, p).name})"
+                    for p in range(1, part + 1)
+                )
+                self.write(f"\nContinued in: {links}\n")
+        if csv_columns:
+            self.write(
+                f"\nFull table: [{self.output_path.stem}_{name}.csv]({self.output_path.stem}_{name}.csv)\n"
+            )
+
+        return total
+
+
+def _table_header(columns):
+    header = "| " + " | ".join(columns) + " |\n"
+    divider = "|" + "|".join("-" * (len(c) + 2) for c in columns) + "|\n"
+    return header + divider
+
+
+def _table_row(cells):
+    return "| " + " | ".join(str(c) for c in cells) + " |\n"
+
+
+def _src_port(data):
+    """Source port cell; flow rollups collapse initiator ports into *"""
+    return "*" if data.get("any_src_port") else data.get("src_port", 0)
+
+
+def _conversation_rows(conversations):
+    for data in conversations:
+        yield (
+            data["src"],
+            _src_port(data),
+            data["dst"],
+            data.get("dst_port", 0),
+            data["packets"],
+            data["bytes"],
+            ", ".join(data.get("protocols", set())),
+        )
 
-def generate_report(stats, input_file, output_file, generate_png=True):
-    """Generate markdown report with analysis results"""
 
-    output_path = Path(output_file)
-    base_path = output_path.stem
-    output_dir = output_path.parent
+def _sampled_conversation_rows(conversations, sample):
+    """Conversation rows scaled to the capture, with 95% CI half-widths"""
+    for row in _conversation_rows(conversations):
+        packets, bytes_ = row[4], row[5]
+        est, half = estimate(sample, packets)
+        scale = est / packets if packets else 0.0
+        yield row[:4] + (
+            round(est),
+            round(bytes_ * scale),
+            row[6],
+            round(half),
+            round(half * bytes_ / packets) if packets else 0,
+        )
+
+
+def _format_conversation(row):
+    src, src_port, dst, dst_port, packets, bytes_, protocols = row[:7]
+    if len(row) > 7:
+        packets_ci, bytes_ci = row[7:]
+        return (
+            f"{src}:{src_port}",
+            f"{dst}:{dst_port}",
+            f"≈{packets:,} ± {packets_ci:,}",
+            f"≈{bytes_:,} ± {bytes_ci:,}",
+            protocols,
+        )
+    return (
+        f"{src}:{src_port}",
+        f"{dst}:{dst_port}",
+        f"{packets:,}",
+        f"{bytes_:,}",
+        protocols,
+    )
+
+
+def _count_cell(stats, count, kind=None, key=None):
+    """Format a packet count, scaled with a 95% CI when stats are sampled"""
+    sample = stats.get("sample")
+    if not sample:
+        return f"{count:,}"
+    est, half = estimate(sample, count, kind, key)
+    return f"≈{est:,.0f} ± {half:,.0f}"
+
+
+def _sampling_section(sample):
+    if sample["mode"] == "flow":
+        conversations = (
+            "Conversations are sampled whole: listed counts are exact, but only"
+            " about 1 in {:,} conversations is listed.".format(sample["rate"])
+        )
+    else:
+        conversations = (
+            "Conversation packets and bytes are scaled estimates; small"
+            " conversations may be missing."
+        )
+    return f"""## Sampling
+
+| Metric | Value |
+|--------|-------|
+| Mode | {describe(sample)} |
+
+Totals above are exact. Protocol, port and conversation counts are scaled
+from the sample and shown as estimate ± 95% confidence interval. Length
+charts show the distribution within the sample.
+
+{conversations}
+
+---
+
+"""
 
-    if stats.get("lengths"):
-        generate_length_chart(stats, str(output_dir / f"{base_path}_length.png"))
 
-    if stats.get("port_stats"):
-        generate_port_chart(stats, str(output_dir / f"{base_path}_port.png"))
+def _interfaces_section(interfaces):
+    rows = "".join(
+        f"| {name} | {data['packets']:,} | {data['bytes']:,} |\n"
+        for name, data in sorted(
+            interfaces.items(), key=lambda x: x[1]["bytes"], reverse=True
+        )
+    )
+    return f"""## Capture Interfaces
+
+| Interface | Packets | Bytes |
+|-----------|---------|-------|
+{rows}
+---
+
+"""
 
-    if stats.get("conversations"):
-        generate_conversation_diagram(
-            stats, str(output_dir / f"{base_path}_conversation.png")
+
+def _top_names(names, n):
+    return sorted(names.items(), key=lambda x: (-x[1], x[0]))[:n]
+
+
+def _applications_section(applications):
+    rows = []
+    for app, data in applications:
+        names = ", ".join(
+            f"{name} ({count:,})" for name, count in _top_names(data["names"], 3)
         )
+        rows.append(
+            f"| {app} | {data['flows']:,} | {data['packets']:,} | {data['bytes']:,}"
+            f" | {names or '-'} |\n"
+        )
+    return f"""## Applications
+
+Flows classified from the first payloads of each flow (TLS SNI, HTTP
+Host, DNS query name, SSH banner).
+
+| Application | Flows | Packets | Bytes | Top Names |
+|-------------|-------|---------|-------|-----------|
+{"".join(rows)}
+---
+
+"""
+
+
+def _throughput_section(stats, pyramid, base_path):
+    busiest, peak_bytes, peak_packets = peak_rate(pyramid)
+    duration = pyramid["last"] - pyramid["first"] + 1
+    total_bytes = stats.get("total_bytes", 0)
+    total_packets = stats.get("total_packets", 0)
+    peak_time = datetime.fromtimestamp(busiest).strftime("%Y-%m-%d %H:%M:%S")
+    return f"""## Throughput
+
+![Throughput]({base_path}_throughput.png)
+
+| Metric | Value |
+|--------|-------|
+| Duration | {duration:,} s |
+| Average | {total_bytes / duration:,.1f} bytes/s ({total_packets / duration:,.1f} packets/s) |
+| Peak (1 s) | {peak_bytes:,} bytes/s ({peak_packets:,} packets/s) at {peak_time} |
+
+```mermaid
+{generate_throughput_mermaid(pyramid)}
+```
+
+---
+
+"""
+
+
+def _timeline_rows(timeline):
+    for conv in timeline:
+        yield (
+            conv["src"],
+            conv["dst"],
+            conv["packet_count"],
+            conv["total_bytes"],
+            conv["avg_packet_size"],
+            conv["turns"],
+            conv["chattiness"],
+            conv["first_idx"],
+            conv["last_idx"],
+        )
+
+
+def _format_timeline(row):
+    src, dst, packets, bytes_, avg_size, turns, chattiness = row[:7]
+    return (
+        src,
+        dst,
+        f"{packets:,}",
+        f"{bytes_:,}",
+        f"{avg_size:.1f}",
+        turns,
+        f"{chattiness:.2f}",
+    )
+
+
+def generate_report(
+    stats,
+    input_file,
+    output_file,
+    generate_png=True,
+    max_rows=20,
+    page_size=None,
+    write_csv=False,
+    pyramid=None,
+):
+    """Generate markdown report with analysis results
+
+    ``pyramid`` is the throughput pyramid if the caller already built it.
+    """
+
+    output_path = Path(output_file)
+    base_path = output_path.stem
+    output_dir = output_path.parent
+
+    if pyramid is None and stats.get("throughput"):
+        with stage("rollup"):
+            pyramid = stats["throughput"].pyramid()
+    if pyramid is not None and pyramid["first"] is None:
+        pyramid = None
+
+    if generate_png:
+        if pyramid:
+            with stage("chart:throughput"):
+                generate_throughput_chart(
+                    pyramid, str(output_dir / f"{base_path}_throughput.png")
+                )
+
+        if stats.get("lengths"):
+            with stage("chart:length"):
+                generate_length_chart(
+                    stats, str(output_dir / f"{base_path}_length.png")
+                )
+
+        if stats.get("port_stats"):
+            with stage("chart:port"):
+                generate_port_chart(stats, str(output_dir / f"{base_path}_port.png"))
+
+        if stats.get("conversations"):
+            generate_conversation_diagram(
+                stats, str(output_dir / f"{base_path}_conversation.png")
+            )
 
     mermaid_conv = generate_conversation_diagram(stats, None)
     mermaid_length = generate_length_mermaid(stats)
@@ -40,7 +430,8 @@ def generate_report(stats, input_file, output_file, generate_png=True):
 
     avg_len = stats.get("total_bytes", 0) / max(stats.get("total_packets", 1), 1)
 
-    markdown = f"""# Network Capture Analysis Report
+    with stage("report"), ReportWriter(output_file, page_size=page_size) as report:
+        report.write(f"""# Network Capture Analysis Report
 
 **Input File**: {input_file}
 **Generated**: {Path(output_file).name}
@@ -57,22 +448,56 @@ def generate_report(stats, input_file, output_file, generate_png=True):
 
 ---
 
-## Protocol Distribution
+""")
+
+        if stats.get("sample"):
+            report.write(_sampling_section(stats["sample"]))
+
+        interfaces = stats.get("interfaces")
+        if interfaces:
+            report.write(_interfaces_section(interfaces))
+
+        flows = stats.get("flows")
+        if flows:
+            report.write(f"""## Flow Table
+
+| Metric | Value |
+|--------|-------|
+| Flows | {flows["flows"]:,} |
+| Closed (FIN/RST) | {flows["closed"]:,} |
+| Expired (idle) | {flows["expired_idle"]:,} |
+| Open at End of Capture | {flows["flushed"]:,} |
+| Peak Live Flows | {flows["peak_live"]:,} |
+
+Conversations below are per-service rollups of these flows.
+
+---
+
+""")
+
+        report.write(f"""## Protocol Distribution
 
 | Protocol | Packet Count |
 |----------|---------------|
-"""
+""")
 
-    for proto, count in sorted(
-        stats.get("protocols", {}).items(), key=lambda x: x[1], reverse=True
-    ):
-        markdown += f"| {proto} | {count:,} |\n"
+        for proto, count in sorted(
+            stats.get("protocols", {}).items(), key=lambda x: x[1], reverse=True
+        ):
+            report.write(
+                f"| {proto} | {_count_cell(stats, count, 'protocols', proto)} |\n"
+            )
 
-    markdown += f"""
+        report.write("""
 
 ---
 
-## Packet Length Distribution
+""")
+
+        if pyramid:
+            report.write(_throughput_section(stats, pyramid, base_path))
+
+        report.write(f"""## Packet Length Distribution
 
 ![Packet Length Distribution]({base_path}_length.png)
 
@@ -88,12 +513,14 @@ def generate_report(stats, input_file, output_file, generate_png=True):
 
 | Port | Service | Count |
 |------|---------|-------|
-"""
+""")
 
-    for port, data in get_top_ports(stats, 10):
-        markdown += f"| {port} | {get_service_name(port)} | {data['count']:,} |\n"
+        port_apps = port_applications(stats)
+        for port, data in get_top_ports(stats, 10):
+            count = _count_cell(stats, data["count"], "port_stats", port)
+            report.write(f"| {port} | {service_name(port, port_apps)} | {count} |\n")
 
-    markdown += f"""
+        report.write(f"""
 
 ```mermaid
 {mermaid_port}
@@ -101,7 +528,13 @@ def generate_report(stats, input_file, output_file, generate_png=True):
 
 ---
 
-## Conversation Pairs
+""")
+
+        applications = application_summary(stats)
+        if applications:
+            report.write(_applications_section(applications))
+
+        report.write(f"""## Conversation Pairs
 
 ![Conversations]({base_path}_conversation.png)
 
@@ -115,24 +548,359 @@ def generate_report(stats, input_file, output_file, generate_png=True):
 
 ## Conversation Details
 
-| Source | Destination | Packets | Bytes | Protocols |
-|--------|-------------|---------|-------|-----------|
-"""
+""")
+
+        conversations = stats.get("conversations", {})
+        if isinstance(conversations, SpilledRows):
+            # Stable on the negated count, so ties keep the same order as
+            # sorted(..., reverse=True).
+            sorted_convs = external_sort(
+                conversations.values(),
+                key=lambda x: -x["packets"],
+                spill_dir=conversations.spill_dir,
+            )
+        else:
+            sorted_convs = sorted(
+                conversations.values(), key=lambda x: x["packets"], reverse=True
+            )
+
+        sample = stats.get("sample")
+        if sample and sample["mode"] != "flow":
+            rows = _sampled_conversation_rows(sorted_convs, sample)
+            csv_columns = CONVERSATION_CSV_COLUMNS + ["packets_ci", "bytes_ci"]
+        else:
+            rows = _conversation_rows(sorted_convs)
+            csv_columns = CONVERSATION_CSV_COLUMNS
+
+        report.table(
+            "conversations",
+            CONVERSATION_COLUMNS,
+            rows,
+            _format_conversation,
+            max_rows=max_rows,
+            csv_columns=csv_columns if write_csv else None,
+        )
+
+        report.write("""
+
+---
 
-    conversations = stats.get("conversations", {})
-    sorted_convs = sorted(
-        conversations.items(), key=lambda x: x[1]["packets"], reverse=True
-    )[:20]
+*Report generated by NetCap Analysis Tool*
+""")
+
+
+def generate_timeline_report(
+    timeline,
+    input_files,
+    output_file,
+    generate_png=True,
+    max_rows=None,
+    page_size=None,
+    write_csv=False,
+    grouper=None,
+    max_pairs=DIAGRAM_MAX_PAIRS,
+    max_participants=DIAGRAM_MAX_PARTICIPANTS,
+):
+    """Generate markdown report for a multi-capture timeline
+
+    ``grouper``, ``max_pairs`` and ``max_participants`` bound the diagrams
+    (see diagram_edges()); the conversation table lists every pair.
+    """
+    diagram = {
+        "grouper": grouper,
+        "max_pairs": max_pairs,
+        "max_participants": max_participants,
+    }
+    summary = get_timeline_summary(timeline)
+
+    output_path = Path(output_file)
+    output_dir = output_path.parent
+    base_name = output_path.stem
+
+    if generate_png:
+        with stage("chart:chattiness"):
+            generate_chattiness_chart(
+                timeline, str(output_dir / f"{base_name}_chattiness.png")
+            )
+        generate_timeline_chart(
+            timeline, str(output_dir / f"{base_name}_timeline.png"), **diagram
+        )
+        generate_timeline_sequence(
+            timeline, str(output_dir / f"{base_name}_sequence.png"), **diagram
+        )
+
+    mermaid_timeline = generate_timeline_chart(timeline, None, **diagram)
+    mermaid_sequence = generate_timeline_sequence(timeline, None, **diagram)
 
-    for key, data in sorted_convs:
-        protocols = ", ".join(data.get("protocols", set()))
-        markdown += f"| {data['src']}:{data.get('src_port', 0)} | {data['dst']}:{data.get('dst_port', 0)} | {data['packets']:,} | {data['bytes']:,} | {protocols} |\n"
+    with stage("report"), ReportWriter(output_file, page_size=page_size) as report:
+        report.write(f"""# Multi-Capture Timeline Analysis
 
-    markdown += """
+**Input Files**: {", ".join(input_files)}
+**Generated**: {output_path.name}
 
 ---
 
-*Report generated by NetCap Analysis Tool*
-"""
+## Summary
+
+| Metric | Value |
+|--------|-------|
+| Total Conversations | {summary["total_conversations"]:,} |
+| Total Packets | {summary["total_packets"]:,} |
+| Total Bytes | {summary["total_bytes"]:,} |
+| Total Turns | {summary["total_turns"]:,} |
+| Avg Packets/Conversation | {summary["avg_packets_per_convo"]:.1f} |
+| Avg Turns/Conversation | {summary["avg_turns_per_convo"]:.1f} |
+
+---
+
+## Timeline Chart (Past -> Present)
+
+![Timeline]({base_name}_timeline.png)
+
+```mermaid
+{mermaid_timeline}
+```
+
+---
+
+## Conversation Flow Sequence
+
+![Sequence]({base_name}_sequence.png)
+
+```mermaid
+{mermaid_sequence}
+```
+
+---
+
+## Chattiness Analysis
+
+![Chattiness]({base_name}_chattiness.png)
+
+---
+
+## Conversation Details
+
+""")
+
+        report.table(
+            "timeline",
+            TIMELINE_COLUMNS,
+            _timeline_rows(timeline),
+            _format_timeline,
+            max_rows=max_rows,
+            csv_columns=TIMELINE_CSV_COLUMNS if write_csv else None,
+        )
+
+        report.write("""
+
+---
+
+*Timeline generated by NetCap Analysis Tool*
+""")
+
+
+DIFF_PORT_COLUMNS = ["Port", "Service", "Base", "New", "Shift"]
+DIFF_CHANGED_COLUMNS = ["Source", "Destination", "Packets", "Bytes", "Bytes Ratio"]
+DIFF_PAIR_COLUMNS = [
+    "IP Pair",
+    "Packets",
+    "Bytes",
+    "Turns",
+    "Chattiness",
+    "Change",
+]
+DIFF_SOURCES = {
+    "analyzed": "analyzed",
+    "store": "flow store",
+    "export": "export directory",
+}
+
+
+def _ratio(base, new):
+    if not base:
+        return "new" if new else "-"
+    if not new:
+        return "gone"
+    return f"×{new / base:.2f}"
+
+
+def _change(base, new, fmt="{:,}"):
+    """``base → new`` cell; a missing side shows as -"""
+    base = "-" if base is None else fmt.format(base)
+    new = "-" if new is None else fmt.format(new)
+    return f"{base} → {new}"
+
+
+def _shift_cells(row):
+    return (
+        f"{row['base']:,} ({row['base_share']:.1%})",
+        f"{row['new']:,} ({row['new_share']:.1%})",
+        f"{row['shift'] * 100:+.1f} pp",
+    )
+
+
+def _format_port_shift(row):
+    return (row["key"], row["service"]) + _shift_cells(row)
+
+
+def _format_changed_conversation(row):
+    base, new = row["base"], row["new"]
+    return (
+        f"{new['src']}:{_src_port(new)}",
+        f"{new['dst']}:{new.get('dst_port', 0)}",
+        _change(base["packets"], new["packets"]),
+        _change(base["bytes"], new["bytes"]),
+        _ratio(base["bytes"], new["bytes"]),
+    )
+
+
+def _format_pair_change(row):
+    base, new = row["base"], row["new"]
+
+    def cell(field, fmt="{:,}"):
+        return _change(base[field] if base else None, new[field] if new else None, fmt)
+
+    if base is None:
+        change = "new"
+    elif new is None:
+        change = "vanished"
+    else:
+        change = f"turns {new['turns'] - base['turns']:+,}"
+    return (
+        " ↔ ".join(row["ip_pair"]),
+        cell("packet_count"),
+        cell("total_bytes"),
+        cell("turns"),
+        cell("chattiness", "{:.3f}"),
+        change,
+    )
+
+
+def generate_diff_report(diff, base_file, new_file, output_file, max_rows=20):
+    """Generate markdown report of the differences between two captures"""
+    base_source, new_source = diff["sources"]
+    totals = "".join(
+        f"| {metric} | {base:,} | {new:,} | {_ratio(base, new)} |\n"
+        for metric, base, new in diff["totals"]
+    )
+    protocols = "".join(
+        _table_row((row["key"],) + _shift_cells(row)) for row in diff["protocols"]
+    )
+
+    with stage("report"), ReportWriter(output_file) as report:
+        report.write(f"""# Capture Diff Report
+
+**Base**: {base_file} ({DIFF_SOURCES[base_source]})
+**New**: {new_file} ({DIFF_SOURCES[new_source]})
+**Generated**: {Path(output_file).name}
+
+---
+
+## Summary
+
+| Metric | Base | New | Change |
+|--------|------|-----|--------|
+{totals}
+---
+
+## Protocol Mix
+
+Packets per protocol and their share of each capture; rows are ordered by
+the shift in share, in percentage points.
+
+| Protocol | Base | New | Shift |
+|----------|------|-----|-------|
+{protocols}
+---
+
+## Destination Port Mix
+
+""")
+        report.table(
+            "ports",
+            DIFF_PORT_COLUMNS,
+            diff["ports"],
+            _format_port_shift,
+            max_rows=max_rows,
+        )
+
+        report.write("""
+
+---
+
+## New Conversations
+
+""")
+        report.table(
+            "new_conversations",
+            CONVERSATION_COLUMNS,
+            _conversation_rows(diff["new_conversations"]),
+            _format_conversation,
+            max_rows=max_rows,
+        )
+
+        report.write("""
+
+---
+
+## Vanished Conversations
+
+""")
+        report.table(
+            "vanished_conversations",
+            CONVERSATION_COLUMNS,
+            _conversation_rows(diff["vanished_conversations"]),
+            _format_conversation,
+            max_rows=max_rows,
+        )
+
+        report.write("""
+
+---
+
+## Changed Conversations
+
+Conversations in both captures whose packets or bytes changed, largest
+relative change in bytes first.
+
+""")
+        report.table(
+            "changed_conversations",
+            DIFF_CHANGED_COLUMNS,
+            diff["changed_conversations"],
+            _format_changed_conversation,
+            max_rows=max_rows,
+        )
+
+        report.write("""
+
+---
+
+## IP Pair Behaviour
+
+""")
+        if diff["pairs"] is None:
+            report.write(
+                "Not available: an export directory without a timeline table"
+                " has no per-pair turns or chattiness.\n"
+            )
+        else:
+            report.write(
+                "New and vanished IP pairs first, then pairs by the combined"
+                " relative change\nin turns and bytes.\n\n"
+            )
+            report.table(
+                "pairs",
+                DIFF_PAIR_COLUMNS,
+                diff["pairs"],
+                _format_pair_change,
+                max_rows=max_rows,
+            )
+
+        report.write("""
+
+---
 
-    Path(output_file).write_text(markdown)
+*Diff generated by NetCap Analysis Tool*
+""")
@@ -0,0 +1,387 @@
+import base64
+import json
+import os
+from array import array
+from pathlib import Path
+
+import numpy as np
+
+ROLLUP_VERSION = 1
+# Bin widths in seconds, finest first
+LEVELS = (1, 10, 60, 3600)
+TOP_TALKERS = 10
+# Source IPs with a 1 s series; past twice this many the lightest are
+# dropped down to it, so the table keeps the heavy hitters only
+TALKER_CAPACITY = 1000
+# Packets buffered before they are binned with numpy
+CHUNK = 65536
+# Charts pick the finest level that shows at most this many bins
+MAX_POINTS = 2000
+
+NO_SERIES = 0xFFFFFFFF
+SECOND_MASK = 0xFFFFFFFF
+
+
+def _pack(values):
+    return base64.b64encode(values.astype(np.int64).tobytes()).decode()
+
+
+def _unpack(text):
+    return np.frombuffer(base64.b64decode(text), dtype=np.int64).copy()
+
+
+def _binned(keys, packets, nbytes):
+    """Sum packets and bytes over equal keys; returns sorted unique keys"""
+    if not len(keys):
+        return keys, packets, nbytes
+    uniq, inverse = np.unique(keys, return_inverse=True)
+    return (
+        uniq,
+        np.bincount(inverse, weights=packets).astype(np.int64),
+        np.bincount(inverse, weights=nbytes).astype(np.int64),
+    )
+
+
+class Rollups:
+    """Packets and bytes per second for every protocol and the top talkers
+
+    add() only appends to flat arrays; every CHUNK packets they are binned
+    with numpy into a table keyed by (series, second). Tables from different
+    packet ranges merge by summing, so shards and follow checkpoints can
+    carry them. pyramid() derives the coarser levels for charts.
+
+    Source IPs are tracked Space-Saving style: each has a byte weight, and
+    one first seen starts at the largest weight dropped so far. Once more
+    than 2 * ``talker_capacity`` are tracked, all but the heaviest
+    ``talker_capacity`` are dropped with their series.
+    """
+
+    def __init__(self, talker_capacity=TALKER_CAPACITY):
+        self.series = []
+        self.talker_capacity = talker_capacity
+        self._protocol_codes = {}
+        self._talker_codes = {}
+        self._weights = {}
+        self._floor = 0
+        self.keys = np.empty(0, dtype=np.int64)
+        self.packets = np.empty(0, dtype=np.int64)
+        self.bytes = np.empty(0, dtype=np.int64)
+        self._parts = []
+        self._pyramid = None
+        self._reset_buffer()
+
+    def _reset_buffer(self):
+        self._times = array("d")
+        self._lengths = array("I")
+        self._protocols = array("I")
+        self._talkers = array("I")
+
+    def _code(self, kind, name):
+        if kind == "protocol":
+            code = self._protocol_codes.get(name)
+            if code is None:
+                code = self._protocol_codes[name] = len(self.series)
+                self.series.append([kind, name])
+            return code
+        code = self._talker_codes.get(name)
+        if code is None:
+            code = self._talker_codes[name] = len(self.series)
+            self.series.append([kind, name])
+            self._weights[code] = self._floor
+        return code
+
+    def add(self, ts, length, protocol, src=None):
+        code = self._protocol_codes.get(protocol)
+        if code is None:
+            code = self._code("protocol", protocol)
+        self._protocols.append(code)
+        if src is None:
+            self._talkers.append(NO_SERIES)
+        else:
+            code = self._talker_codes.get(src)
+            if code is None:
+                code = self._code("talker", src)
+            self._talkers.append(code)
+        self._times.append(ts)
+        self._lengths.append(length)
+        if len(self._times) >= CHUNK:
+            self._flush()
+
+    def _flush(self):
+        if not self._times:
+            return
+        seconds = np.floor(np.frombuffer(self._times, dtype=np.float64)).astype(
+            np.int64
+        )
+        lengths = np.frombuffer(self._lengths, dtype=np.uint32).astype(np.int64)
+        protocols = np.frombuffer(self._protocols, dtype=np.uint32).astype(np.int64)
+        talkers = np.frombuffer(self._talkers, dtype=np.uint32).astype(np.int64)
+        has_talker = talkers != NO_SERIES
+
+        keys = np.concatenate(
+            [
+                (protocols << 32) | seconds,
+                (talkers[has_talker] << 32) | seconds[has_talker],
+            ]
+        )
+        nbytes = np.concatenate([lengths, lengths[has_talker]])
+        self._parts.append(_binned(keys, np.ones(len(keys), dtype=np.int64), nbytes))
+        self._reset_buffer()
+
+        talker_bytes = np.bincount(talkers[has_talker], weights=lengths[has_talker])
+        for code in np.flatnonzero(talker_bytes).tolist():
+            self._weights[code] += int(talker_bytes[code])
+        self._bound()
+        if sum(len(part[0]) for part in self._parts) > max(len(self.keys), CHUNK):
+            self._compact()
+
+    def _bound(self):
+        """Keep only the heaviest talkers once there are too many
+
+        Called with an empty buffer; the remaining series are renumbered in
+        their order, so the table stays sorted.
+        """
+        if len(self._talker_codes) <= 2 * self.talker_capacity:
+            return
+        ranked = sorted(self._weights, key=lambda code: -self._weights[code])
+        self._floor = max(self._floor, self._weights[ranked[self.talker_capacity]])
+        kept = set(ranked[: self.talker_capacity])
+        live = [
+            code
+            for code, (kind, _) in enumerate(self.series)
+            if kind == "protocol" or code in kept
+        ]
+        remap = np.full(len(self.series), -1, dtype=np.int64)
+        remap[live] = np.arange(len(live))
+
+        def renumbered(keys, packets, nbytes):
+            codes = remap[keys >> 32]
+            keep = codes >= 0
+            keys = (codes[keep] << 32) | (keys[keep] & SECOND_MASK)
+            return keys, packets[keep], nbytes[keep]
+
+        self._parts = [renumbered(*part) for part in self._parts]
+        self.keys, self.packets, self.bytes = renumbered(
+            self.keys, self.packets, self.bytes
+        )
+        weights = self._weights
+        self.series = [self.series[code] for code in live]
+        self._protocol_codes, self._talker_codes, self._weights = {}, {}, {}
+        for code, (kind, name) in enumerate(self.series):
+            if kind == "protocol":
+                self._protocol_codes[name] = code
+            else:
+                self._talker_codes[name] = code
+                self._weights[code] = weights[live[code]]
+        self._pyramid = None
+
+    def _compact(self):
+        self._flush()
+        if not self._parts:
+            return
+        parts = [(self.keys, self.packets, self.bytes)] + self._parts
+        self._parts = []
+        self._pyramid = None
+        self.keys, self.packets, self.bytes = _binned(
+            *(np.concatenate([part[i] for part in parts]) for i in range(3))
+        )
+
+    def merge(self, other):
+        """Add another Rollups (e.g. of a later packet range) into this one"""
+        other._compact()
+        if not len(other.keys):
+            return self
+        self._flush()
+        remap = np.array(
+            [self._code(kind, name) for kind, name in other.series], dtype=np.int64
+        )
+        for code, weight in other._weights.items():
+            self._weights[int(remap[code])] += weight
+        keys = (remap[other.keys >> 32] << 32) | (other.keys & SECOND_MASK)
+        self._parts.append((keys, other.packets, other.bytes))
+        self._bound()
+        self._compact()
+        return self
+
+    def encode(self):
+        """JSON-serializable form, for checkpoints and worker results"""
+        self._compact()
+        return {
+            "series": self.series,
+            "floor": self._floor,
+            "keys": _pack(self.keys),
+            "packets": _pack(self.packets),
+            "bytes": _pack(self.bytes),
+        }
+
+    @classmethod
+    def decode(cls, raw):
+        rollups = cls()
+        for kind, name in raw["series"]:
+            rollups._code(kind, name)
+        rollups.keys = _unpack(raw["keys"])
+        rollups.packets = _unpack(raw["packets"])
+        rollups.bytes = _unpack(raw["bytes"])
+        # Weights are rebuilt from the table, on top of the dropped floor
+        rollups._floor = raw.get("floor", 0)
+        totals = np.bincount(rollups.keys >> 32, weights=rollups.bytes)
+        for code in rollups._talker_codes.values():
+            weight = int(totals[code]) if code < len(totals) else 0
+            rollups._weights[code] = rollups._floor + weight
+        return rollups
+
+    def pyramid(self, top_talkers=TOP_TALKERS):
+        """Bin the 1 s table at every level, keeping protocols and top talkers
+
+        Series are ordered by total bytes, protocols first. Returns a dict
+        with ``series`` ([kind, name] pairs), ``first``/``last`` second and
+        ``levels``: per bin width, parallel arrays of series index, bin
+        start, packets and bytes.
+        """
+        self._compact()
+        if self._pyramid is not None and self._pyramid[0] == top_talkers:
+            return self._pyramid[1]
+        codes = self.keys >> 32
+        seconds = self.keys & SECOND_MASK
+        totals = np.bincount(codes, weights=self.bytes, minlength=len(self.series))
+
+        def by_bytes(codes):
+            return sorted(sorted(codes.values()), key=lambda i: -totals[i])
+
+        keep = (
+            by_bytes(self._protocol_codes) + by_bytes(self._talker_codes)[:top_talkers]
+        )
+        remap = np.full(len(self.series), -1, dtype=np.int64)
+        remap[keep] = np.arange(len(keep))
+        index = remap[codes]
+        mask = index >= 0
+        index, seconds = index[mask], seconds[mask]
+        packets, nbytes = self.packets[mask], self.bytes[mask]
+
+        levels = {}
+        for level in LEVELS:
+            keys, level_packets, level_bytes = _binned(
+                (index << 32) | (seconds // level * level), packets, nbytes
+            )
+            levels[level] = {
+                "series": keys >> 32,
+                "start": keys & SECOND_MASK,
+                "packets": level_packets,
+                "bytes": level_bytes,
+            }
+
+        pyramid = {
+            "series": [self.series[i] for i in keep],
+            "first": int(seconds.min()) if len(seconds) else None,
+            "last": int(seconds.max()) if len(seconds) else None,
+            "levels": levels,
+        }
+        self._pyramid = (top_talkers, pyramid)
+        return pyramid
+
+
+def choose_level(pyramid, start=None, end=None, max_points=MAX_POINTS):
+    """Finest level with at most ``max_points`` bins between start and end"""
+    start = pyramid["first"] if start is None else start
+    end = pyramid["last"] if end is None else end
+    span = max(end - start + 1, 1)
+    for level in LEVELS:
+        if span / level <= max_points:
+            return level
+    return LEVELS[-1]
+
+
+def peak_rate(pyramid):
+    """Busiest second: (start, bytes, packets), or None if there is no data"""
+    if pyramid["first"] is None:
+        return None
+    data = pyramid["levels"][1]
+    protocols = [
+        i for i, (kind, _) in enumerate(pyramid["series"]) if kind == "protocol"
+    ]
+    mask = np.isin(data["series"], protocols)
+    seconds, packets, nbytes = _binned(
+        data["start"][mask], data["packets"][mask], data["bytes"][mask]
+    )
+    busiest = int(np.argmax(nbytes))
+    return int(seconds[busiest]), int(nbytes[busiest]), int(packets[busiest])
+
+
+def series_matrix(pyramid, level, start=None, end=None):
+    """Dense (series x bin) packet and byte matrices for a time window
+
+    Returns the bin start times and the two matrices; bins without packets
+    are zero.
+    """
+    start = pyramid["first"] if start is None else int(start)
+    end = pyramid["last"] if end is None else int(end)
+    first_bin = start // level * level
+    bins = max((end - first_bin) // level + 1, 0)
+    times = first_bin + np.arange(bins, dtype=np.int64) * level
+
+    data = pyramid["levels"][level]
+    mask = (data["start"] >= first_bin) & (data["start"] <= end)
+    rows = data["series"][mask]
+    cols = (data["start"][mask] - first_bin) // level
+    shape = (len(pyramid["series"]), bins)
+    packets = np.zeros(shape, dtype=np.int64)
+    nbytes = np.zeros(shape, dtype=np.int64)
+    packets[rows, cols] = data["packets"][mask]
+    nbytes[rows, cols] = data["bytes"][mask]
+    return times, packets, nbytes
+
+
+def rollup_path(pcap_file):
+    """Where the rollups of a capture are persisted"""
+    return f"{pcap_file}.rollup.npz"
+
+
+def save_pyramid(path, pyramid, pcap_file):
+    """Write a pyramid atomically, tagged with the capture's size and mtime"""
+    st = os.stat(pcap_file)
+    meta = {
+        "version": ROLLUP_VERSION,
+        "size": st.st_size,
+        "mtime": st.st_mtime,
+        "series": pyramid["series"],
+        "first": pyramid["first"],
+        "last": pyramid["last"],
+        "levels": list(pyramid["levels"]),
+    }
+    arrays = {"meta": np.array(json.dumps(meta))}
+    for level, data in pyramid["levels"].items():
+        for field, values in data.items():
+            arrays[f"l{level}_{field}"] = values
+
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        np.savez_compressed(f, **arrays)
+    os.replace(tmp, path)
+
+
+def load_pyramid(path, pcap_file=None):
+    """Load a saved pyramid, or None if missing or older than ``pcap_file``"""
+    if not os.path.exists(path):
+        return None
+    with np.load(path, allow_pickle=False) as data:
+        meta = json.loads(str(data["meta"]))
+        if meta.get("version") != ROLLUP_VERSION:
+            return None
+        if pcap_file is not None:
+            st = os.stat(pcap_file)
+            if (meta["size"], meta["mtime"]) != (st.st_size, st.st_mtime):
+                return None
+        levels = {
+            level: {
+                field: data[f"l{level}_{field}"]
+                for field in ("series", "start", "packets", "bytes")
+            }
+            for level in meta["levels"]
+        }
+    return {
+        "series": meta["series"],
+        "first": meta["first"],
+        "last": meta["last"],
+        "levels": levels,
+    }
@@ -0,0 +1,300 @@
+import math
+import random
+import struct
+import sys
+import zlib
+from collections import defaultdict
+
+from scapy.all import IP, TCP, UDP, conf
+from scapy.utils import EDecimal
+
+from .analyzer import extract_packets, new_stats
+from .pcapng import PcapngReader, open_records
+from .profiling import stage
+
+SAMPLE_MODES = ("nth", "flow", "reservoir")
+
+# Two-sided 95% normal quantile
+Z_95 = 1.96
+
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = (101, 228)
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_VLAN = 0x8100
+
+
+def parse_sample(spec):
+    """Parse a ``MODE:N`` sample spec such as ``nth:100``"""
+    mode, sep, value = spec.partition(":")
+    if mode not in SAMPLE_MODES or not sep:
+        raise ValueError(
+            f"invalid sample '{spec}', expected one of "
+            + ", ".join(f"{m}:N" for m in SAMPLE_MODES)
+        )
+    try:
+        rate = int(value)
+    except ValueError:
+        raise ValueError(f"invalid sample size in '{spec}'") from None
+    if rate < 1:
+        raise ValueError(f"sample size must be at least 1 in '{spec}'")
+    return mode, rate
+
+
+def _raw_records(reader):
+    """(data, metadata) for every record of an open_records() reader"""
+    if isinstance(reader, PcapngReader):
+        return reader.records()
+    return iter(reader)
+
+
+def _record_time(reader, meta):
+    if isinstance(reader, PcapngReader):
+        return meta.time
+    power = EDecimal(10) ** EDecimal(-9 if reader.nano else -6)
+    return EDecimal(meta.sec + power * meta.usec)
+
+
+def _linktype(reader, meta):
+    if isinstance(reader, PcapngReader):
+        return meta.interface.linktype
+    return reader.linktype
+
+
+def _decode(reader, data, meta):
+    """Dissect a raw record the same way the capture's reader would"""
+    if isinstance(reader, PcapngReader):
+        return reader.decode(data, meta)
+    try:
+        packet = conf.l2types.num2layer[_linktype(reader, meta)](data)
+    except Exception:
+        packet = conf.raw_layer(data)
+    packet.time = _record_time(reader, meta)
+    packet.wirelen = meta.wirelen
+    return packet
+
+
+def _raw_flow_key(data, linktype):
+    """Return a direction-independent flow key from raw bytes
+
+    Returns b"" for records that are not IPv4, and None when the link type
+    is not parsed here and the record has to be dissected instead.
+    """
+    if linktype == LINKTYPE_ETHERNET:
+        if len(data) < 14:
+            return b""
+        ethertype = struct.unpack_from("!H", data, 12)[0]
+        offset = 14
+        if ethertype == ETHERTYPE_VLAN and len(data) >= 18:
+            ethertype = struct.unpack_from("!H", data, 16)[0]
+            offset = 18
+        if ethertype != ETHERTYPE_IPV4:
+            return b""
+    elif linktype in LINKTYPE_RAW:
+        offset = 0
+    else:
+        return None
+
+    if len(data) < offset + 20 or data[offset] >> 4 != 4:
+        return b""
+    ihl = (data[offset] & 0x0F) * 4
+    proto = data[offset + 9]
+    src = data[offset + 12 : offset + 16]
+    dst = data[offset + 16 : offset + 20]
+    sport = dport = 0
+    if proto in (6, 17) and len(data) >= offset + ihl + 4:
+        sport, dport = struct.unpack_from("!HH", data, offset + ihl)
+    a = src + struct.pack("!H", sport)
+    b = dst + struct.pack("!H", dport)
+    return bytes([proto]) + (a + b if a <= b else b + a)
+
+
+def _dissected_flow_key(reader, data, meta):
+    packet = _decode(reader, data, meta)
+    if IP not in packet:
+        return b""
+    ip = packet[IP]
+    sport = dport = 0
+    if TCP in packet:
+        sport, dport = packet[TCP].sport, packet[TCP].dport
+    elif UDP in packet:
+        sport, dport = packet[UDP].sport, packet[UDP].dport
+    a = f"{ip.src}:{sport}"
+    b = f"{ip.dst}:{dport}"
+    return f"{ip.proto} {min(a, b)} {max(a, b)}".encode()
+
+
+def _cluster_squares(stats, non_ip):
+    """Sum of squared per-flow packet counts, per protocol and per port
+
+    Flow sampling keeps or drops whole flows, so each flow is one sampling
+    unit and the variance of a scaled count depends on how its packets are
+    spread over flows.
+    """
+    flows = defaultdict(lambda: defaultdict(int))
+    for conv in stats["conversations"].values():
+        a = (conv["src"], conv["src_port"])
+        b = (conv["dst"], conv["dst_port"])
+        protocol = next(iter(conv["protocols"]))
+        key = (protocol, min(a, b), max(a, b))
+        flows[key][("protocols", protocol)] += conv["packets"]
+        if conv["dst_port"] > 0:
+            flows[key][("port_stats", conv["dst_port"])] += conv["packets"]
+
+    squares = {"protocols": defaultdict(int), "port_stats": defaultdict(int)}
+    for counts in flows.values():
+        for (kind, key), packets in counts.items():
+            squares[kind][key] += packets * packets
+    if non_ip:
+        # Non-IP records are sampled one by one.
+        squares["protocols"]["Non-IP"] += non_ip
+    return {kind: dict(values) for kind, values in squares.items()}
+
+
+def _reservoir(records, rate, rng):
+    """Uniform sample of ``rate`` records, back in capture order"""
+    kept = []
+    for record in records:
+        if len(kept) < rate:
+            kept.append(record)
+        else:
+            slot = rng.randrange(record[0] + 1)
+            if slot < rate:
+                kept[slot] = record
+    # Restore capture order, which conversation first/last times rely on.
+    kept.sort(key=lambda record: record[0])
+    return kept
+
+
+def sample_pcap(pcap_file, mode, rate, seed=0):
+    """Analyze a sample of a pcap and return stats with estimation metadata
+
+    ``mode`` is ``nth`` (every N-th record), ``flow`` (flows whose hash
+    falls in 1/N of the hash space, kept whole) or ``reservoir`` (a uniform
+    sample of N records). Records that are not sampled are never dissected,
+    and only the reservoir holds records in memory.
+
+    Total packets, bytes, first/last time and pcapng interface counts are
+    exact, since every record header is read anyway. Protocols, ports,
+    lengths and conversations are computed over the sample;
+    ``stats["sample"]`` holds what estimate() needs to scale them.
+    """
+    try:
+        reader = open_records(pcap_file)
+    except Exception as e:
+        print(f"Error opening pcap file: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    records = 0
+    total_bytes = 0
+    first = None
+    last = None
+    non_ip = 0
+    # pcapng records name their interface, so its counts are exact too
+    interfaces = defaultdict(lambda: {"packets": 0, "bytes": 0})
+    native = isinstance(reader, PcapngReader)
+
+    def scan():
+        """Count every record; yield (index, data, meta) of the kept ones"""
+        nonlocal records, total_bytes, first, last, non_ip
+        for data, meta in _raw_records(reader):
+            index = records
+            records += 1
+            total_bytes += len(data)
+            if first is None:
+                first = meta
+            last = meta
+            if native:
+                interface = interfaces[meta.interface.name]
+                interface["packets"] += 1
+                interface["bytes"] += len(data)
+
+            if mode == "nth":
+                keep = index % rate == 0
+            elif mode == "flow":
+                key = _raw_flow_key(data, _linktype(reader, meta))
+                if key is None:
+                    key = _dissected_flow_key(reader, data, meta)
+                if key:
+                    keep = zlib.crc32(key) % rate == 0
+                else:
+                    keep = index % rate == 0
+                    non_ip += keep
+            else:
+                # The reservoir only knows what it keeps at the end
+                keep = True
+            if keep:
+                yield index, data, meta
+
+    stats = new_stats()
+    with reader:
+        kept = scan()
+        if mode == "reservoir":
+            with stage("sample", hot=True) as sample_stage:
+                kept = _reservoir(kept, rate, random.Random(seed))
+                sample_stage.packets = records
+        # nth and flow samples stream straight from the scan, unbuffered
+        with stage("extract", hot=True) as extract:
+            extract_packets((_decode(reader, d, m) for _, d, m in kept), stats)
+            extract.packets = stats["total_packets"]
+
+    stats["protocols"] = dict(stats["protocols"])
+    stats["port_stats"] = dict(stats["port_stats"])
+    stats["conversations"] = dict(stats["conversations"])
+    stats["interfaces"] = dict(interfaces)
+    # Rollups of the sampled packets alone would understate throughput, and
+    # nth/reservoir samples rarely hold the first packets of a flow.
+    del stats["throughput"]
+    del stats["app_flows"]
+
+    sample = {
+        "mode": mode,
+        "rate": rate,
+        "records": records,
+        "sampled_packets": stats["total_packets"],
+        "sampled_bytes": stats["total_bytes"],
+    }
+    if mode == "flow":
+        sample["squares"] = _cluster_squares(stats, non_ip)
+
+    stats["sample"] = sample
+    stats["total_packets"] = records
+    stats["total_bytes"] = total_bytes
+    stats["first_time"] = float(_record_time(reader, first)) if first else None
+    stats["last_time"] = float(_record_time(reader, last)) if last else None
+    return stats
+
+
+def estimate(sample, count, kind=None, key=None):
+    """Scale a count over the sampled packets to the whole capture
+
+    Returns the estimate and the half-width of its 95% confidence interval.
+    For flow sampling ``kind`` and ``key`` (e.g. ``"protocols", "TCP"``)
+    select the per-flow variance term.
+    """
+    if sample["mode"] == "flow":
+        q = 1 / sample["rate"]
+        squares = sample["squares"].get(kind, {}).get(key, count)
+        return count / q, Z_95 * math.sqrt((1 - q) / (q * q) * squares)
+
+    n = sample["sampled_packets"]
+    total = sample["records"]
+    if n == 0:
+        return 0.0, 0.0
+    p = count / n
+    fpc = (total - n) / (total - 1) if total > 1 else 0.0
+    return p * total, Z_95 * total * math.sqrt(p * (1 - p) / n * fpc)
+
+
+def describe(sample):
+    """One-line description of the sampling mode for reports"""
+    mode, rate = sample["mode"], sample["rate"]
+    if mode == "nth":
+        text = f"every {rate:,}th packet"
+    elif mode == "flow":
+        text = f"1 in {rate:,} flows (by flow hash)"
+    else:
+        text = f"reservoir of {rate:,} packets"
+    return (
+        f"{text}; {sample['sampled_packets']:,} of {sample['records']:,} "
+        "packets dissected"
+    )
@@ -0,0 +1,174 @@
+import heapq
+import os
+import pickle
+import shutil
+import tempfile
+import weakref
+from itertools import islice
+
+# Rough in-memory cost of one aggregation entry (dict, key string, set),
+# used to turn a --memory-budget in MB into a number of live entries.
+ENTRY_BYTES = 1024
+
+DEFAULT_CHUNK = 100000
+
+
+def budget_entries(memory_budget_mb, entry_bytes=ENTRY_BYTES):
+    """Return how many table entries fit in a memory budget given in MB"""
+    return max(1000, int(memory_budget_mb * 1024 * 1024 // entry_bytes))
+
+
+def _write_run(path, items):
+    # One pickle per item: a shared Pickler would memoize every object it
+    # writes and keep the whole run alive.
+    with open(path, "wb") as fh:
+        for item in items:
+            pickle.dump(item, fh, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _read_run(path):
+    with open(path, "rb") as fh:
+        while True:
+            try:
+                yield pickle.load(fh)
+            except EOFError:
+                return
+
+
+class SpillDir:
+    """Temporary directory for run files, removed on close"""
+
+    def __init__(self, tmpdir=None):
+        self.path = tempfile.mkdtemp(prefix="netcap_spill_", dir=tmpdir)
+        self._count = 0
+        self._cleanup = weakref.finalize(self, shutil.rmtree, self.path, True)
+
+    def new_file(self):
+        self._count += 1
+        return os.path.join(self.path, f"run{self._count:06d}.pkl")
+
+    def close(self):
+        self._cleanup()
+
+
+def external_sort(items, key, spill_dir, chunk_size=DEFAULT_CHUNK):
+    """Stable sort of an iterable that may not fit in memory
+
+    Items are sorted in chunks of ``chunk_size`` written to run files and
+    merged back. Equal keys keep their input order, like ``sorted``.
+    """
+    items = iter(items)
+    runs = []
+    chunk = list(islice(items, chunk_size))
+    while chunk:
+        chunk.sort(key=key)
+        next_chunk = list(islice(items, chunk_size))
+        if not runs and not next_chunk:
+            yield from chunk
+            return
+        path = spill_dir.new_file()
+        _write_run(path, chunk)
+        runs.append(path)
+        chunk = next_chunk
+
+    yield from heapq.merge(*(_read_run(p) for p in runs), key=key)
+
+
+class SpillTable:
+    """Keyed aggregation table that spills sorted runs when it grows too big
+
+    ``merge(a, b)`` combines two partial entries for the same key, where
+    ``a`` was built from earlier input than ``b``.
+    """
+
+    def __init__(self, max_entries, merge, spill_dir):
+        self.max_entries = max_entries
+        self.merge = merge
+        self.spill_dir = spill_dir
+        self.live = {}
+        self.runs = []
+
+    def __len__(self):
+        return len(self.live)
+
+    def check(self):
+        """Spill the live table if it is over budget"""
+        if len(self.live) > self.max_entries:
+            self.spill()
+
+    def spill(self):
+        path = self.spill_dir.new_file()
+        _write_run(path, sorted(self.live.items(), key=lambda kv: kv[0]))
+        self.runs.append(path)
+        self.live = {}
+
+    def merged(self):
+        """Yield (key, entry) for every key, combining partial entries"""
+        if not self.runs:
+            yield from self.live.items()
+            return
+
+        sources = [_read_run(p) for p in self.runs]
+        sources.append(iter(sorted(self.live.items(), key=lambda kv: kv[0])))
+        self.live = {}
+
+        # heapq.merge keeps equal keys in source order, i.e. input order.
+        current_key = None
+        current = None
+        for key, entry in heapq.merge(*sources, key=lambda kv: kv[0]):
+            if current is not None and key == current_key:
+                current = self.merge(current, entry)
+                continue
+            if current is not None:
+                yield current_key, current
+            current_key, current = key, entry
+        if current is not None:
+            yield current_key, current
+
+
+class SpilledRows:
+    """Read-only sequence stored on disk that can be iterated repeatedly"""
+
+    def __init__(self, items, spill_dir):
+        # Keep the directory alive for as long as the rows are readable.
+        self.spill_dir = spill_dir
+        self.path = spill_dir.new_file()
+        self._len = 0
+
+        def counted():
+            for item in items:
+                self._len += 1
+                yield item
+
+        _write_run(self.path, counted())
+
+    def __iter__(self):
+        return _read_run(self.path)
+
+    def __len__(self):
+        return self._len
+
+    def __bool__(self):
+        return self._len > 0
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(islice(iter(self), index.start, index.stop, index.step))
+        if index < 0:
+            index += self._len
+        for item in islice(iter(self), index, None):
+            return item
+        raise IndexError(index)
+
+
+class SpilledMapping(SpilledRows):
+    """SpilledRows of (key, value) pairs with a read-only mapping interface"""
+
+    def items(self):
+        return iter(self)
+
+    def keys(self):
+        return (key for key, _ in self)
+
+    def values(self):
+        return (value for _, value in self)
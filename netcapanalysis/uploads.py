@@ -0,0 +1,394 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+from .compressed import CAPTURE_NAMES, strip_compression
+
+CHUNK_SIZE = 1 << 20
+# Files saved by the old uuid_filename layout
+LEGACY_NAME = re.compile(r"^[0-9a-f]{8}(-[0-9a-f]{4}){3}-[0-9a-f]{12}_(.+)$")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    sha256 TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    refs INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_blobs_path ON blobs(path);
+
+CREATE TABLE IF NOT EXISTS files (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    sha256 TEXT NOT NULL REFERENCES blobs(sha256) ON DELETE CASCADE,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_files_sha256 ON files(sha256);
+
+CREATE TABLE IF NOT EXISTS artifacts (
+    path TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL REFERENCES blobs(sha256) ON DELETE CASCADE,
+    kind TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_artifacts_blob ON artifacts(sha256, kind);
+"""
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class UploadStore:
+    """Content-addressed capture storage with a SQLite metadata index
+
+    Captures are stored once per sha256 under ``objects/``; every upload of
+    the same content adds a file entry that references the blob, and the
+    blob is removed with its last reference. Derived artifacts (reports,
+    charts, rollups) belong to a blob and go with it.
+
+    Blobs and artifacts not accessed for ``ttl`` seconds are evicted, and
+    once the store holds more than ``quota`` bytes the least recently used
+    are evicted, artifacts before captures. Blobs pinned by a running
+    analysis are never evicted.
+    """
+
+    def __init__(self, root, quota=None, ttl=None):
+        self.root = Path(root)
+        self.quota = quota or None
+        self.ttl = ttl or None
+        self.objects = self.root / "objects"
+        self.artifacts = self.root / "artifacts"
+        self.incoming = self.root / "incoming"
+        for path in (self.objects, self.artifacts, self.incoming):
+            path.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.root / "index.db"
+        self.lock = threading.RLock()
+        self._pins = {}
+        # One connection, set up once and shared by the API's threads under
+        # self.lock
+        self._conn = sqlite3.connect(
+            str(self.db_path), timeout=30, check_same_thread=False
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(SCHEMA)
+
+        # Partial uploads from a previous run are never completed.
+        for path in self.incoming.glob("*.part"):
+            _remove(path)
+        self._adopt_loose_files()
+
+    @contextmanager
+    def _db(self):
+        """The shared connection, locked, in a transaction"""
+        with self.lock, self._conn:
+            yield self._conn
+
+    def close(self):
+        with self.lock:
+            self._conn.close()
+
+    def _adopt_loose_files(self):
+        """Move captures saved directly in the root into the store"""
+        for path in sorted(self.root.iterdir()):
+            if path.is_file() and path.name.endswith(CAPTURE_NAMES):
+                match = LEGACY_NAME.match(path.name)
+                try:
+                    self.add_file(path, match.group(2) if match else path.name)
+                except ValueError:
+                    # Over the quota on its own; leave it where it is.
+                    pass
+
+    def _blob_path(self, digest, suffix):
+        return self.objects / digest[:2] / f"{digest}{suffix}"
+
+    def save_stream(self, stream, name):
+        """Store an upload, hashing it while it is written to disk"""
+        tmp = self.incoming / f"{uuid.uuid4()}.part"
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp, "wb") as f:
+                for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+            return self._add(tmp, digest.hexdigest(), size, name)
+        finally:
+            _remove(tmp)
+
+    def add_file(self, path, name):
+        """Move an existing capture (e.g. a finished capture) into the store"""
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+        entry = self._add(Path(path), digest.hexdigest(), os.path.getsize(path), name)
+        # Already gone if it became the blob; a duplicate is dropped.
+        _remove(path)
+        return entry
+
+    def _add(self, tmp, digest, size, name):
+        if self.quota and size > self.quota:
+            raise ValueError(
+                f"capture is {size:,} bytes, larger than the {self.quota:,} byte quota"
+            )
+        now = time.time()
+        entry_id = str(uuid.uuid4())
+        with self._db() as conn:
+            row = conn.execute(
+                "SELECT path FROM blobs WHERE sha256 = ?", (digest,)
+            ).fetchone()
+            if row is not None and os.path.exists(row["path"]):
+                path = row["path"]
+            else:
+                # Keep .pcap.gz/.pcap.zst as a whole
+                compression = name[len(strip_compression(name)) :]
+                suffix = Path(strip_compression(name)).suffix or ".pcap"
+                path = self._blob_path(digest, suffix + compression)
+                path.parent.mkdir(exist_ok=True)
+                os.replace(tmp, path)
+            if row is None:
+                conn.execute(
+                    "INSERT INTO blobs"
+                    " (sha256, path, size, refs, created_at, accessed_at)"
+                    " VALUES (?, ?, ?, 1, ?, ?)",
+                    (digest, str(path), size, now, now),
+                )
+            else:
+                conn.execute(
+                    "UPDATE blobs SET path = ?, refs = refs + 1, accessed_at = ?"
+                    " WHERE sha256 = ?",
+                    (str(path), now, digest),
+                )
+            conn.execute(
+                "INSERT INTO files (id, name, sha256, created_at) VALUES (?, ?, ?, ?)",
+                (entry_id, name, digest, now),
+            )
+        self.evict(keep=digest)
+        return self.get_file(entry_id)
+
+    def get_file(self, entry_id):
+        with self._db() as conn:
+            row = conn.execute(
+                "SELECT f.id, f.name, f.sha256, f.created_at, b.path, b.size"
+                " FROM files f JOIN blobs b ON b.sha256 = f.sha256 WHERE f.id = ?",
+                (entry_id,),
+            ).fetchone()
+        return self._file_entry(row) if row else None
+
+    def _file_entry(self, row):
+        return {
+            "id": row["id"],
+            "name": row["name"],
+            "sha256": row["sha256"],
+            "filepath": row["path"],
+            "size": row["size"],
+            "modified": row["created_at"],
+        }
+
+    def list_files(self):
+        """File entries, newest first, from the index alone"""
+        self.evict()
+        with self._db() as conn:
+            rows = conn.execute(
+                "SELECT f.id, f.name, f.sha256, f.created_at, b.path, b.size"
+                " FROM files f JOIN blobs b ON b.sha256 = f.sha256"
+                " ORDER BY f.created_at DESC"
+            ).fetchall()
+        return [self._file_entry(row) for row in rows]
+
+    def delete_file(self, entry_id):
+        """Drop a file entry; the blob goes when nothing references it"""
+        with self._db() as conn:
+            row = conn.execute(
+                "SELECT sha256 FROM files WHERE id = ?", (entry_id,)
+            ).fetchone()
+            if row is None:
+                return False
+            conn.execute("DELETE FROM files WHERE id = ?", (entry_id,))
+            conn.execute(
+                "UPDATE blobs SET refs = refs - 1 WHERE sha256 = ?", (row["sha256"],)
+            )
+            refs = conn.execute(
+                "SELECT refs FROM blobs WHERE sha256 = ?", (row["sha256"],)
+            ).fetchone()["refs"]
+            if refs <= 0 and not self._pins.get(row["sha256"]):
+                self._drop_blob(conn, row["sha256"])
+        # A pinned blob is dropped by evict() once it is released.
+        return True
+
+    def lookup(self, path):
+        """The sha256 of a stored capture path (marking it used), or None"""
+        with self._db() as conn:
+            row = conn.execute(
+                "SELECT sha256 FROM blobs WHERE path = ?", (str(path),)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE blobs SET accessed_at = ? WHERE sha256 = ?",
+                (time.time(), row["sha256"]),
+            )
+        return row["sha256"]
+
+    @contextmanager
+    def pinned(self, digests):
+        """Keep blobs from being evicted while they are in use"""
+        digests = [d for d in digests if d]
+        with self.lock:
+            for digest in digests:
+                self._pins[digest] = self._pins.get(digest, 0) + 1
+        try:
+            yield
+        finally:
+            with self.lock:
+                for digest in digests:
+                    self._pins[digest] -= 1
+                    if not self._pins[digest]:
+                        del self._pins[digest]
+
+    def artifact_path(self, digest, kind, suffix):
+        return self.artifacts / f"{digest}.{kind}{suffix}"
+
+    def find_artifact(self, digest, kind):
+        """Path of a derived artifact of a blob (marking it used), or None"""
+        with self._db() as conn:
+            row = conn.execute(
+                "SELECT path FROM artifacts WHERE sha256 = ? AND kind = ?",
+                (digest, kind),
+            ).fetchone()
+            if row is None:
+                return None
+            if not os.path.exists(row["path"]):
+                conn.execute("DELETE FROM artifacts WHERE path = ?", (row["path"],))
+                return None
+            conn.execute(
+                "UPDATE artifacts SET accessed_at = ? WHERE path = ?",
+                (time.time(), row["path"]),
+            )
+        return row["path"]
+
+    def add_artifact(self, digest, kind, path):
+        """Record a file derived from a blob so it is counted and evicted"""
+        now = time.time()
+        with self._db() as conn:
+            if (
+                conn.execute(
+                    "SELECT 1 FROM blobs WHERE sha256 = ?", (digest,)
+                ).fetchone()
+                is None
+            ):
+                _remove(path)
+                return
+            conn.execute(
+                "INSERT OR REPLACE INTO artifacts"
+                " (path, sha256, kind, size, created_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (str(path), digest, kind, os.path.getsize(path), now, now),
+            )
+        self.evict(keep=digest)
+
+    def _total(self, conn):
+        return conn.execute(
+            "SELECT (SELECT COALESCE(SUM(size), 0) FROM blobs)"
+            " + (SELECT COALESCE(SUM(size), 0) FROM artifacts)"
+        ).fetchone()[0]
+
+    def total_bytes(self):
+        """Bytes held by captures and artifacts, from the index"""
+        with self._db() as conn:
+            return self._total(conn)
+
+    def _drop_blob(self, conn, digest):
+        for row in conn.execute(
+            "SELECT path FROM artifacts WHERE sha256 = ?", (digest,)
+        ).fetchall():
+            _remove(row["path"])
+        row = conn.execute(
+            "SELECT path FROM blobs WHERE sha256 = ?", (digest,)
+        ).fetchone()
+        if row is not None:
+            _remove(row["path"])
+        # Cascades to the file entries and artifact rows.
+        conn.execute("DELETE FROM blobs WHERE sha256 = ?", (digest,))
+
+    def evict(self, keep=None, now=None):
+        """Apply the TTL and the quota; returns the number of files evicted"""
+        now = time.time() if now is None else now
+        evicted = 0
+        with self._db() as conn:
+            protected = set(self._pins) | {keep}
+
+            for row in conn.execute(
+                "SELECT sha256 FROM blobs WHERE refs <= 0"
+            ).fetchall():
+                if row["sha256"] not in protected:
+                    self._drop_blob(conn, row["sha256"])
+                    evicted += 1
+
+            if self.ttl:
+                cutoff = now - self.ttl
+                for row in conn.execute(
+                    "SELECT path, sha256 FROM artifacts WHERE accessed_at < ?",
+                    (cutoff,),
+                ).fetchall():
+                    if row["sha256"] not in protected:
+                        _remove(row["path"])
+                        conn.execute(
+                            "DELETE FROM artifacts WHERE path = ?", (row["path"],)
+                        )
+                        evicted += 1
+                for row in conn.execute(
+                    "SELECT sha256 FROM blobs WHERE accessed_at < ?", (cutoff,)
+                ).fetchall():
+                    if row["sha256"] not in protected:
+                        self._drop_blob(conn, row["sha256"])
+                        evicted += 1
+
+            if self.quota:
+                total = self._total(conn)
+                if total > self.quota:
+                    # Derived artifacts can be rebuilt, so they go first.
+                    candidates = conn.execute(
+                        "SELECT 'artifact' AS type, path, sha256, size, accessed_at"
+                        " FROM artifacts UNION ALL"
+                        " SELECT 'blob', path, sha256, size, accessed_at FROM blobs"
+                        " ORDER BY type, accessed_at"
+                    ).fetchall()
+                    for row in candidates:
+                        if total <= self.quota:
+                            break
+                        if row["sha256"] in protected:
+                            continue
+                        if row["type"] == "artifact":
+                            _remove(row["path"])
+                            conn.execute(
+                                "DELETE FROM artifacts WHERE path = ?", (row["path"],)
+                            )
+                            total -= row["size"]
+                        else:
+                            total -= conn.execute(
+                                "SELECT COALESCE(SUM(size), 0) FROM artifacts"
+                                " WHERE sha256 = ?",
+                                (row["sha256"],),
+                            ).fetchone()[0]
+                            self._drop_blob(conn, row["sha256"])
+                            total -= row["size"]
+                        evicted += 1
+        return evicted
@@ -9,7 +9,6 @@ import {
   useToast,
   Progress,
   Text,
-  Code,
   Table,
   Thead,
   Tbody,
@@ -17,13 +16,36 @@ import {
   Th,
   Td,
   Badge,
+  Input,
+  HStack,
+  SimpleGrid,
+  Stat,
+  StatLabel,
+  StatNumber,
 } from '@chakra-ui/react';
+import VirtualTable from './VirtualTable';
+
+const CONVERSATION_COLUMNS = [
+  { key: 'src', label: 'Source', sortable: true, flex: 2, render: (r) => `${r.src}:${r.src_port}` },
+  { key: 'dst', label: 'Destination', sortable: true, flex: 2, render: (r) => `${r.dst}:${r.dst_port}` },
+  { key: 'packets', label: 'Packets', sortable: true, isNumeric: true, render: (r) => r.packets.toLocaleString() },
+  { key: 'bytes', label: 'Bytes', sortable: true, isNumeric: true, render: (r) => r.bytes.toLocaleString() },
+  { key: 'protocols', label: 'Protocols' },
+];
+
+const PORT_COLUMNS = [
+  { key: 'port', label: 'Port', sortable: true },
+  { key: 'protocol', label: 'Protocol' },
+  { key: 'count', label: 'Count', sortable: true, isNumeric: true, render: (r) => r.count.toLocaleString() },
+];
 
 function AnalyzePanel() {
   const [files, setFiles] = useState([]);
   const [selectedFile, setSelectedFile] = useState('');
   const [analyzing, setAnalyzing] = useState(false);
-  const [report, setReport] = useState(null);
+  const [captureId, setCaptureId] = useState(null);
+  const [summary, setSummary] = useState(null);
+  const [filters, setFilters] = useState({ ip: '', port: '', protocol: '' });
   const toast = useToast();
 
   useEffect(() => {
@@ -32,7 +54,7 @@ function AnalyzePanel() {
       .then(data => {
         setFiles(data.files || []);
         if (data.files && data.files.length > 0) {
-          setSelectedFile(data.files[0].name);
+          setSelectedFile(data.files[0].filepath);
         }
       })
       .catch(err => console.error(err));
@@ -49,20 +71,23 @@ function AnalyzePanel() {
     }
 
     setAnalyzing(true);
-    setReport(null);
+    setCaptureId(null);
+    setSummary(null);
 
     try {
-      const filepath = `/tmp/netcap_uploads/${selectedFile}`;
+      const filepath = selectedFile;
       const response = await fetch('/api/analyze', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ filepath }),
+        body: JSON.stringify({ filepath, report: false }),
       });
       
       const data = await response.json();
       
       if (response.ok) {
-        setReport(data.report);
+        const summaryRes = await fetch(`/api/captures/${data.capture_id}/summary`);
+        setSummary(await summaryRes.json());
+        setCaptureId(data.capture_id);
         toast({
           title: 'Analysis Complete',
           status: 'success',
@@ -88,25 +113,7 @@ function AnalyzePanel() {
     }
   };
 
-  const parseSummary = (reportText) => {
-    const lines = reportText.split('\n');
-    const summary = {};
-    
-    lines.forEach(line => {
-      if (line.includes('|') && !line.includes('---')) {
-        const parts = line.split('|').filter(p => p.trim());
-        if (parts.length >= 2) {
-          const key = parts[0].trim();
-          const value = parts[1].trim();
-          if (key && value && !key.includes('Metric')) {
-            summary[key] = value;
-          }
-        }
-      }
-    });
-    
-    return summary;
-  };
+  const setFilter = (key) => (e) => setFilters({ ...filters, [key]: e.target.value });
 
   return (
     <Box p={6} bg="white" borderRadius="md" boxShadow="sm">
@@ -115,7 +122,7 @@ function AnalyzePanel() {
           <FormLabel>Select PCAP File</FormLabel>
           <Select value={selectedFile} onChange={(e) => setSelectedFile(e.target.value)}>
             {files.map((file) => (
-              <option key={file.name} value={file.name}>{file.name}</option>
+              <option key={file.id} value={file.filepath}>{file.name}</option>
             ))}
           </Select>
         </FormControl>
@@ -132,12 +139,63 @@ function AnalyzePanel() {
           Analyze
         </Button>
         
-        {report && (
+        {summary && (
           <Box>
-            <Text fontWeight="bold" mb={2}>Analysis Report:</Text>
-            <Code whiteSpace="pre-wrap" p={4} borderRadius="md" bg="gray.100" display="block" maxH="500px" overflowY="auto">
-              {report}
-            </Code>
+            <SimpleGrid columns={3} spacing={4} mb={4}>
+              <Stat>
+                <StatLabel>Total Packets</StatLabel>
+                <StatNumber>{summary.total_packets.toLocaleString()}</StatNumber>
+              </Stat>
+              <Stat>
+                <StatLabel>Total Bytes</StatLabel>
+                <StatNumber>{summary.total_bytes.toLocaleString()}</StatNumber>
+              </Stat>
+              <Stat>
+                <StatLabel>Conversations</StatLabel>
+                <StatNumber>{summary.conversations.toLocaleString()}</StatNumber>
+              </Stat>
+            </SimpleGrid>
+
+            <Text fontWeight="bold" mb={2}>Protocol Distribution</Text>
+            <Table size="sm" mb={4}>
+              <Thead>
+                <Tr>
+                  <Th>Protocol</Th>
+                  <Th isNumeric>Packets</Th>
+                </Tr>
+              </Thead>
+              <Tbody>
+                {summary.protocols.map((p) => (
+                  <Tr key={p.protocol}>
+                    <Td><Badge>{p.protocol}</Badge></Td>
+                    <Td isNumeric>{p.count.toLocaleString()}</Td>
+                  </Tr>
+                ))}
+              </Tbody>
+            </Table>
+
+            <Text fontWeight="bold" mb={2}>Destination Ports</Text>
+            <Box mb={4}>
+              <VirtualTable
+                url={`/api/captures/${captureId}/ports`}
+                columns={PORT_COLUMNS}
+                defaultSort="count"
+                height={200}
+              />
+            </Box>
+
+            <Text fontWeight="bold" mb={2}>Conversations</Text>
+            <HStack mb={2}>
+              <Input size="sm" placeholder="IP address" value={filters.ip} onChange={setFilter('ip')} />
+              <Input size="sm" placeholder="Port" value={filters.port} onChange={setFilter('port')} />
+              <Input size="sm" placeholder="Protocol" value={filters.protocol} onChange={setFilter('protocol')} />
+            </HStack>
+            <VirtualTable
+              url={`/api/captures/${captureId}/conversations`}
+              columns={CONVERSATION_COLUMNS}
+              filters={filters}
+              defaultSort="packets"
+            />
           </Box>
         )}
       </VStack>
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import {
   Box,
   Button,
@@ -8,21 +8,66 @@ import {
   Select,
   VStack,
   useToast,
-  Progress,
   Alert,
   AlertIcon,
   HStack,
+  SimpleGrid,
+  Stat,
+  StatLabel,
+  StatNumber,
+  Table,
+  Thead,
+  Tbody,
+  Tr,
+  Th,
+  Td,
+  Badge,
+  Text,
+  Wrap,
+  WrapItem,
 } from '@chakra-ui/react';
 
+const eventsUrl = (session) =>
+  `${window.location.protocol}//${window.location.hostname}:${session.events_port}${session.events_path}`;
+
 function CapturePanel() {
   const [interface_, setInterface] = useState('');
   const [count, setCount] = useState('');
   const [filter, setFilter] = useState('');
-  const [duration, setDuration] = useState('10');
-  const [capturing, setCapturing] = useState(false);
+  const [duration, setDuration] = useState('60');
+  const [starting, setStarting] = useState(false);
   const [interfaces, setInterfaces] = useState([]);
+  const [sessions, setSessions] = useState([]);
+  const [live, setLive] = useState(null);
+  const source = useRef(null);
   const toast = useToast();
 
+  const refreshSessions = () => {
+    fetch('/api/live')
+      .then(res => res.json())
+      .then(data => setSessions(data.sessions || []))
+      .catch(err => console.error(err));
+  };
+
+  const watch = (session) => {
+    if (source.current) {
+      source.current.close();
+    }
+    setLive(session);
+    const events = new EventSource(eventsUrl(session));
+    events.onmessage = (e) => setLive(JSON.parse(e.data));
+    events.addEventListener('end', () => {
+      events.close();
+      refreshSessions();
+    });
+    source.current = events;
+  };
+
+  useEffect(() => {
+    refreshSessions();
+    return () => source.current && source.current.close();
+  }, []);
+
   useEffect(() => {
     fetch('/api/interfaces')
       .then(res => res.json())
@@ -37,30 +82,26 @@ function CapturePanel() {
       });
   }, []);
 
-  const handleCapture = async () => {
-    setCapturing(true);
+  const handleStart = async () => {
+    setStarting(true);
     
     try {
-      const response = await fetch('/api/capture', {
+      const response = await fetch('/api/live', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
           interface: interface_,
           count: count ? parseInt(count) : null,
           filter: filter,
-          duration: duration ? parseInt(duration) : 10,
+          duration: duration ? parseInt(duration) : 60,
         }),
       });
       
       const data = await response.json();
       
       if (response.ok) {
-        toast({
-          title: 'Capture Complete',
-          description: `Saved ${data.message} (${data.duration}s)`,
-          status: 'success',
-          duration: 5000,
-        });
+        watch(data);
+        refreshSessions();
       } else {
         toast({
           title: 'Capture Failed',
@@ -77,16 +118,21 @@ function CapturePanel() {
         duration: 5000,
       });
     } finally {
-      setCapturing(false);
+      setStarting(false);
     }
   };
 
+  const handleStop = async (session) => {
+    await fetch(`/api/live/${session.id}/stop`, { method: 'POST' });
+    refreshSessions();
+  };
+
   return (
     <Box p={6} bg="white" borderRadius="md" boxShadow="sm">
       <VStack spacing={4} align="stretch">
         <Alert status="info" borderRadius="md">
           <AlertIcon />
-          Live capture runs for 10 seconds by default. Uses tshark with root privileges.
+          Live capture runs until stopped or for the given duration. Uses tshark with root privileges.
         </Alert>
         
         <FormControl>
@@ -105,7 +151,7 @@ function CapturePanel() {
               type="number"
               value={duration}
               onChange={(e) => setDuration(e.target.value)}
-              placeholder="10"
+              placeholder="60"
             />
           </FormControl>
           
@@ -129,16 +175,97 @@ function CapturePanel() {
           />
         </FormControl>
         
-        {capturing && <Progress isIndeterminate colorScheme="blue" />}
-        
         <Button
           colorScheme="blue"
-          onClick={handleCapture}
-          isLoading={capturing}
-          loadingText="Capturing..."
+          onClick={handleStart}
+          isLoading={starting}
+          loadingText="Starting..."
         >
           Start Capture
         </Button>
+
+        {sessions.length > 0 && (
+          <Wrap spacing={2}>
+            {sessions.map((session) => (
+              <WrapItem key={session.id}>
+                <Button
+                  size="xs"
+                  variant={live && live.id === session.id ? 'solid' : 'outline'}
+                  onClick={() => watch(session)}
+                >
+                  {session.filename} ({session.status})
+                </Button>
+              </WrapItem>
+            ))}
+          </Wrap>
+        )}
+
+        {live && (
+          <Box>
+            <HStack justify="space-between" mb={2}>
+              <Text fontWeight="bold">
+                {live.filename} <Badge>{live.status}</Badge>
+              </Text>
+              {live.status === 'running' && (
+                <Button size="sm" colorScheme="red" onClick={() => handleStop(live)}>
+                  Stop
+                </Button>
+              )}
+            </HStack>
+            {live.error && (
+              <Alert status="error" borderRadius="md" mb={2}>
+                <AlertIcon />
+                {live.error}
+              </Alert>
+            )}
+            <SimpleGrid columns={4} spacing={4} mb={4}>
+              <Stat>
+                <StatLabel>Packets/s</StatLabel>
+                <StatNumber>{live.packets_per_sec.toLocaleString()}</StatNumber>
+              </Stat>
+              <Stat>
+                <StatLabel>Bytes/s</StatLabel>
+                <StatNumber>{live.bytes_per_sec.toLocaleString()}</StatNumber>
+              </Stat>
+              <Stat>
+                <StatLabel>Packets</StatLabel>
+                <StatNumber>{live.packets.toLocaleString()}</StatNumber>
+              </Stat>
+              <Stat>
+                <StatLabel>Elapsed</StatLabel>
+                <StatNumber>{live.elapsed}s</StatNumber>
+              </Stat>
+            </SimpleGrid>
+
+            <Wrap spacing={2} mb={4}>
+              {Object.entries(live.protocols).map(([protocol, n]) => (
+                <WrapItem key={protocol}>
+                  <Badge>{protocol}: {n.toLocaleString()}</Badge>
+                </WrapItem>
+              ))}
+            </Wrap>
+
+            <Text fontWeight="bold" mb={2}>Top Talkers</Text>
+            <Table size="sm">
+              <Thead>
+                <Tr>
+                  <Th>IP</Th>
+                  <Th isNumeric>Packets</Th>
+                  <Th isNumeric>Bytes</Th>
+                </Tr>
+              </Thead>
+              <Tbody>
+                {live.top_talkers.map((t) => (
+                  <Tr key={t.ip}>
+                    <Td>{t.ip}</Td>
+                    <Td isNumeric>{t.packets.toLocaleString()}</Td>
+                    <Td isNumeric>{t.bytes.toLocaleString()}</Td>
+                  </Tr>
+                ))}
+              </Tbody>
+            </Table>
+          </Box>
+        )}
       </VStack>
     </Box>
   );
@@ -77,9 +77,9 @@ function FilesPanel() {
     }
   };
 
-  const handleDelete = async (filename) => {
+  const handleDelete = async (id) => {
     try {
-      const response = await fetch(`/api/files/${filename}`, {
+      const response = await fetch(`/api/files/${id}`, {
         method: 'DELETE',
       });
       
@@ -113,7 +113,7 @@ function FilesPanel() {
         <HStack>
           <Input
             type="file"
-            accept=".pcap,.pcapng,.cap"
+            accept=".pcap,.pcapng,.cap,.gz,.zst"
             onChange={handleUpload}
             display="none"
             id="pcap-upload"
@@ -144,7 +144,7 @@ function FilesPanel() {
               </Tr>
             ) : (
               files.map((file) => (
-                <Tr key={file.name}>
+                <Tr key={file.id}>
                   <Td>
                     <Badge colorScheme="blue">{file.name.split('.')[1]}</Badge>
                     {' '}
@@ -157,7 +157,7 @@ function FilesPanel() {
                       size="sm"
                       colorScheme="red"
                       variant="ghost"
-                      onClick={() => handleDelete(file.name)}
+                      onClick={() => handleDelete(file.id)}
                       aria-label="Delete"
                     />
                   </Td>
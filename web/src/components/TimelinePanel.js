@@ -7,18 +7,36 @@ import {
   VStack,
   useToast,
   Progress,
-  Code,
   Checkbox,
   CheckboxGroup,
   Wrap,
   WrapItem,
+  Input,
+  SimpleGrid,
+  Stat,
+  StatLabel,
+  StatNumber,
 } from '@chakra-ui/react';
+import VirtualTable from './VirtualTable';
+
+const PAIR_COLUMNS = [
+  { key: 'first_time', label: 'First Seen', sortable: true, flex: 2, render: (r) => new Date(r.first_time * 1000).toLocaleString() },
+  { key: 'src', label: 'Source IP', flex: 2 },
+  { key: 'dst', label: 'Dest IP', flex: 2 },
+  { key: 'packet_count', label: 'Packets', sortable: true, isNumeric: true, render: (r) => r.packet_count.toLocaleString() },
+  { key: 'total_bytes', label: 'Bytes', sortable: true, isNumeric: true, render: (r) => r.total_bytes.toLocaleString() },
+  { key: 'avg_packet_size', label: 'Avg Size', sortable: true, isNumeric: true, render: (r) => r.avg_packet_size.toFixed(1) },
+  { key: 'turns', label: 'Turns', sortable: true, isNumeric: true },
+  { key: 'chattiness', label: 'Chattiness', sortable: true, isNumeric: true, render: (r) => r.chattiness.toFixed(2) },
+];
 
 function TimelinePanel() {
   const [files, setFiles] = useState([]);
   const [selectedFiles, setSelectedFiles] = useState([]);
   const [analyzing, setAnalyzing] = useState(false);
-  const [report, setReport] = useState(null);
+  const [timelineId, setTimelineId] = useState(null);
+  const [summary, setSummary] = useState(null);
+  const [ipFilter, setIpFilter] = useState('');
   const toast = useToast();
 
   useEffect(() => {
@@ -48,21 +66,25 @@ function TimelinePanel() {
     }
 
     setAnalyzing(true);
-    setReport(null);
+    setTimelineId(null);
+    setSummary(null);
 
     try {
-      const filepaths = selectedFiles.map(f => `/tmp/netcap_uploads/${f}`);
-      
+      // Duplicate uploads share one stored capture
+      const filepaths = [...new Set(selectedFiles.map(id => files.find(f => f.id === id).filepath))];
+
       const response = await fetch('/api/timeline', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ filepaths }),
+        body: JSON.stringify({ filepaths, report: false }),
       });
       
       const data = await response.json();
       
       if (response.ok) {
-        setReport(data.report);
+        const summaryRes = await fetch(`/api/timelines/${data.timeline_id}/summary`);
+        setSummary(await summaryRes.json());
+        setTimelineId(data.timeline_id);
         toast({
           title: 'Timeline Analysis Complete',
           status: 'success',
@@ -99,10 +121,10 @@ function TimelinePanel() {
                 <WrapItem>No files available. Upload files first.</WrapItem>
               ) : (
                 files.map((file) => (
-                  <WrapItem key={file.name}>
+                  <WrapItem key={file.id}>
                     <Checkbox
-                      value={file.name}
-                      onChange={() => handleFileToggle(file.name)}
+                      value={file.id}
+                      onChange={() => handleFileToggle(file.id)}
                     >
                       {file.name}
                     </Checkbox>
@@ -125,11 +147,41 @@ function TimelinePanel() {
           Generate Timeline
         </Button>
         
-        {report && (
+        {summary && (
           <Box>
-            <Code whiteSpace="pre-wrap" p={4} borderRadius="md" bg="gray.100" display="block" maxH="500px" overflowY="auto">
-              {report}
-            </Code>
+            <SimpleGrid columns={4} spacing={4} mb={4}>
+              <Stat>
+                <StatLabel>Conversations</StatLabel>
+                <StatNumber>{summary.total_conversations.toLocaleString()}</StatNumber>
+              </Stat>
+              <Stat>
+                <StatLabel>Packets</StatLabel>
+                <StatNumber>{summary.total_packets.toLocaleString()}</StatNumber>
+              </Stat>
+              <Stat>
+                <StatLabel>Bytes</StatLabel>
+                <StatNumber>{summary.total_bytes.toLocaleString()}</StatNumber>
+              </Stat>
+              <Stat>
+                <StatLabel>Avg Turns</StatLabel>
+                <StatNumber>{summary.avg_turns_per_convo.toFixed(1)}</StatNumber>
+              </Stat>
+            </SimpleGrid>
+
+            <Input
+              size="sm"
+              mb={2}
+              placeholder="Filter by IP address"
+              value={ipFilter}
+              onChange={(e) => setIpFilter(e.target.value)}
+            />
+            <VirtualTable
+              url={`/api/timelines/${timelineId}/pairs`}
+              columns={PAIR_COLUMNS}
+              filters={{ ip: ipFilter }}
+              defaultSort="first_time"
+              defaultOrder="asc"
+            />
           </Box>
         )}
       </VStack>
@@ -0,0 +1,178 @@
+import React, { useState, useEffect, useRef, useCallback } from 'react';
+import { Box, Flex, Text, Spinner } from '@chakra-ui/react';
+import { TriangleDownIcon, TriangleUpIcon } from '@chakra-ui/icons';
+
+const ROW_HEIGHT = 32;
+const OVERSCAN = 10;
+
+// Table that renders only the rows in view and fetches cursor pages from a
+// paginated JSON endpoint as the user scrolls. Sorting and filtering are
+// done server side; changing either restarts from the first page.
+function VirtualTable({
+  url,
+  columns,
+  filters = {},
+  defaultSort,
+  defaultOrder = 'desc',
+  height = 400,
+  pageSize = 200,
+}) {
+  const [rows, setRows] = useState([]);
+  const [total, setTotal] = useState(0);
+  const [cursor, setCursor] = useState(null);
+  const [done, setDone] = useState(false);
+  const [loading, setLoading] = useState(false);
+  const [scrollTop, setScrollTop] = useState(0);
+  const [sort, setSort] = useState(defaultSort);
+  const [order, setOrder] = useState(defaultOrder);
+  const requestId = useRef(0);
+  const containerRef = useRef(null);
+
+  const filterKey = JSON.stringify(filters);
+
+  const fetchPage = useCallback(
+    async (pageCursor, reset) => {
+      const id = reset ? ++requestId.current : requestId.current;
+      setLoading(true);
+
+      const search = new URLSearchParams({ sort, order, limit: pageSize });
+      Object.entries(JSON.parse(filterKey)).forEach(([key, value]) => {
+        if (value !== '' && value !== null && value !== undefined) {
+          search.set(key, value);
+        }
+      });
+      if (pageCursor) {
+        search.set('cursor', pageCursor);
+      }
+
+      try {
+        const res = await fetch(`${url}?${search}`);
+        const data = await res.json();
+        if (id !== requestId.current) return;
+        if (!res.ok) throw new Error(data.error);
+
+        setRows(prev => (reset ? data.items : [...prev, ...data.items]));
+        setTotal(data.total);
+        setCursor(data.next_cursor);
+        setDone(!data.next_cursor);
+      } catch (err) {
+        console.error(err);
+        if (id === requestId.current) setDone(true);
+      } finally {
+        if (id === requestId.current) setLoading(false);
+      }
+    },
+    [url, filterKey, sort, order, pageSize]
+  );
+
+  useEffect(() => {
+    setRows([]);
+    setTotal(0);
+    setCursor(null);
+    setDone(false);
+    setScrollTop(0);
+    if (containerRef.current) {
+      containerRef.current.scrollTop = 0;
+    }
+    fetchPage(null, true);
+  }, [fetchPage]);
+
+  const first = Math.max(0, Math.floor(scrollTop / ROW_HEIGHT) - OVERSCAN);
+  const last = Math.min(
+    total,
+    Math.ceil((scrollTop + height) / ROW_HEIGHT) + OVERSCAN
+  );
+
+  useEffect(() => {
+    if (!loading && !done && rows.length > 0 && last >= rows.length) {
+      fetchPage(cursor, false);
+    }
+  }, [last, rows.length, loading, done, cursor, fetchPage]);
+
+  const handleSort = (column) => {
+    if (!column.sortable) return;
+    if (sort === column.key) {
+      setOrder(order === 'desc' ? 'asc' : 'desc');
+    } else {
+      setSort(column.key);
+      setOrder('desc');
+    }
+  };
+
+  const visible = [];
+  for (let i = first; i < last; i++) {
+    const row = rows[i];
+    visible.push(
+      <Flex
+        key={i}
+        position="absolute"
+        top={`${i * ROW_HEIGHT}px`}
+        left={0}
+        right={0}
+        h={`${ROW_HEIGHT}px`}
+        align="center"
+        borderBottomWidth="1px"
+        borderColor="gray.100"
+        fontSize="sm"
+      >
+        {columns.map((column) => (
+          <Box
+            key={column.key}
+            flex={column.flex || 1}
+            px={2}
+            textAlign={column.isNumeric ? 'right' : 'left'}
+            whiteSpace="nowrap"
+            overflow="hidden"
+            textOverflow="ellipsis"
+          >
+            {row ? (column.render ? column.render(row) : row[column.key]) : '…'}
+          </Box>
+        ))}
+      </Flex>
+    );
+  }
+
+  return (
+    <Box borderWidth="1px" borderRadius="md">
+      <Flex bg="gray.50" borderBottomWidth="1px" fontSize="xs" fontWeight="bold">
+        {columns.map((column) => (
+          <Box
+            key={column.key}
+            flex={column.flex || 1}
+            px={2}
+            py={2}
+            textAlign={column.isNumeric ? 'right' : 'left'}
+            cursor={column.sortable ? 'pointer' : 'default'}
+            onClick={() => handleSort(column)}
+          >
+            {column.label}
+            {sort === column.key &&
+              (order === 'desc' ? (
+                <TriangleDownIcon ml={1} boxSize={2} />
+              ) : (
+                <TriangleUpIcon ml={1} boxSize={2} />
+              ))}
+          </Box>
+        ))}
+      </Flex>
+      <Box
+        ref={containerRef}
+        h={`${height}px`}
+        overflowY="auto"
+        onScroll={(e) => setScrollTop(e.currentTarget.scrollTop)}
+      >
+        <Box position="relative" h={`${total * ROW_HEIGHT}px`}>
+          {visible}
+        </Box>
+      </Box>
+      <Flex px={2} py={1} fontSize="xs" color="gray.500" align="center">
+        <Text>
+          {rows.length.toLocaleString()} of {total.toLocaleString()} rows loaded
+        </Text>
+        {loading && <Spinner size="xs" ml={2} />}
+      </Flex>
+    </Box>
+  );
+}
+
+export default VirtualTable;